@@ -0,0 +1,66 @@
+#
+# Counts the Number, Boolean and Nil objects allocated while running the
+#   programs in benchmark/programs, on the stack VM, the register VM and the
+#   tree walk interpreter. Shows how many allocations the shared values in
+#   loks/types.py save.
+#
+# usage: python benchmark/allocs.py [program.lks ...]
+#
+import argparse
+from collections import Counter
+from typing import Callable, Dict
+
+from util import listPrograms, readProgram, parseProgram, compileProgram, timeit
+
+from loks.types import Number, Boolean, Nil
+from loks.VM.vm import VirtualMachine
+from loks.VM.regvm import RegisterVirtualMachine
+from loks.compiler.compiler import RegisterCompiler
+from loks.interpreter.interpreter import Interpeter
+
+counts: Counter = Counter()
+
+
+# wrap the constructor of cls so every new instance is counted
+def countAllocations(cls) -> None:
+    init = cls.__init__
+
+    def countingInit(self, *args) -> None:
+        counts[cls.__name__] += 1
+        init(self, *args)
+
+    cls.__init__ = countingInit
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Count value allocations of the loks runtimes")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    args = argParser.parse_args()
+
+    for cls in [Number, Boolean, Nil]:
+        countAllocations(cls)
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'runtime':<12}{'Number':>10}{'Boolean':>10}{'Nil':>8}")
+    for name in programs:
+        program = readProgram(name)
+        ast = parseProgram(program)
+        bytecode = compileProgram(program)
+        rc = RegisterCompiler()
+        rc.visit(ast)
+
+        runtimes: Dict[str, Callable[[], None]] = {
+            "stack VM": lambda: VirtualMachine(bytecode).run(),
+            "register VM": lambda: RegisterVirtualMachine(rc.getCode()).run(),
+            "tree walk": lambda: Interpeter().visit(ast),
+        }
+
+        for runtime, fn in runtimes.items():
+            counts.clear()
+            timeit(fn, 1)
+            print(f"{name:<16}{runtime:<12}{counts['Number']:>10}{counts['Boolean']:>10}{counts['Nil']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#
+# Times the Assembler on the textual assembly of generated scripts (see
+#   benchmark/compiletime.py) of about 1K, 10K and 100K lines. Assembling is
+#   linear in the size of the input, so the time per line should stay about
+#   the same.
+#
+# usage: python benchmark/asmtime.py [-r <repeat>] [lines ...]
+#
+import argparse
+
+from util import timeit
+from compiletime import generateProgram, compileAsm
+
+from loks.assembler.asm import Assembler
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the Assembler on inputs of increasing size")
+    argParser.add_argument('lines', nargs='*', type=int, default=[1000, 10000, 100000], help='approximate number of lines of assembly')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    print(f"{'lines':<12}{'bytes':>12}{'assemble (ms)':>15}{'us/line':>10}")
+    for n in args.lines:
+        # about 10 lines of assembly per statement
+        text: str = compileAsm(generateProgram(max(10, n // 10))).getText()
+        lines: int = text.count('\n')
+
+        bytecode = []
+        t, _ = timeit(lambda: bytecode.append(Assembler(text).getBytecode()), args.repeat)
+
+        print(f"{lines:<12}{len(bytecode[-1]):>12}{t * 1000:>15.1f}{t * 1e6 / lines:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#
+# Compares the closure compiling interpreter (-c) with the tree walk
+#   interpreter (-d) and the stack VM on the programs in benchmark/programs.
+#   Parsing and compiling are not timed, and all three have to print the
+#   same output.
+#
+# usage: python benchmark/closures.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+import sys
+
+from util import listPrograms, readProgram, parseProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+from loks.interpreter.interpreter import Interpeter
+from loks.interpreter.closures import ClosureCompiler, Scope
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the closure compiling interpreter against the tree walk interpreter and the VM")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    # both interpreters recurse on the python stack
+    sys.setrecursionlimit(20000)
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'tree (ms)':>11}{'closures (ms)':>15}{'vm (ms)':>10}{'vs tree':>9}{'vs vm':>8}")
+    for name in programs:
+        program = readProgram(name)
+
+        ast = parseProgram(program)
+        tt, outTree = timeit(lambda: Interpeter().visit(ast), args.repeat)
+
+        closure = ClosureCompiler().compile(ast)
+        tc, outClosures = timeit(lambda: closure(Scope()), args.repeat)
+
+        bytecode = compileProgram(program)
+        tv, outVM = timeit(lambda: VirtualMachine(bytecode).run(), args.repeat)
+
+        if outTree != outClosures:
+            raise Exception(f"{name}: the interpreters printed different output")
+        if outClosures != outVM:
+            print(f"{name}: note, the VM printed different output")
+
+        print(f"{name:<16}{tt * 1000:>11.1f}{tc * 1000:>15.1f}{tv * 1000:>10.1f}{tt / tc:>8.2f}x{tv / tc:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#
+# Compares the two ways from compiled code to a Code object the VM can run:
+#   through the textual assembly, the Assembler and the CodeBuilder, or
+#   directly with the BytecodeBuilder. Times only these back ends, on
+#   generated scripts of increasing size. Both have to print the same output.
+#
+# usage: python benchmark/compiletime.py [-r <repeat>] [statements ...]
+#
+import argparse
+from typing import List
+
+from util import parseProgram, timeit
+
+from loks.compiler.compiler import Compiler
+from loks.assembler.asm import Assembler
+from loks.assembler.builder import AsmProgram, BytecodeBuilder
+from loks.optimizer.cfg import ControlFlowOptimizer
+from loks.optimizer.superinstructions import SuperinstructionFuser
+from loks.VM.code.codeBuilder import CodeBuilder
+from loks.VM.vm import VirtualMachine
+
+
+# a script with a function per 10 statements and a loop calling them
+def generateProgram(statements: int) -> str:
+    lines: List[str] = ["var total = 0;"]
+    for i in range(statements // 10):
+        lines.append(f"fun f{i}(a) {{ var b = a * {i}; return b + a; }}")
+
+    lines.append("var i = 0;")
+    lines.append("while (i < 2) {")
+    for k in range(statements):
+        lines.append(f"    total = total + f{k // 10 % max(1, statements // 10)}({k}) - {k};")
+    lines.append("    i = i + 1;")
+    lines.append("}")
+    lines.append("println(total);")
+    return "\n".join(lines) + "\n"
+
+
+def compileAsm(program: str) -> AsmProgram:
+    c = Compiler()
+    c.visit(parseProgram(program))
+    return SuperinstructionFuser(ControlFlowOptimizer(c.getProgram()).getProgram()).getProgram()
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the text round trip against building the Code object directly")
+    argParser.add_argument('statements', nargs='*', type=int, default=[250, 500, 1000, 2000], help='sizes of the generated scripts')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    print(f"{'statements':<12}{'text (ms)':>12}{'direct (ms)':>13}{'speedup':>10}")
+    for n in args.statements:
+        asm = compileAsm(generateProgram(n))
+
+        tt, _ = timeit(lambda: CodeBuilder(Assembler(asm.getText()).getBytecodeList()).getCodeObj(), args.repeat)
+        td, _ = timeit(lambda: BytecodeBuilder(asm).getCodeObj(), args.repeat)
+
+        _, outText = timeit(lambda: VirtualMachine(Assembler(asm.getText()).getBytecodeList()).run(), 1)
+        _, outDirect = timeit(lambda: VirtualMachine(BytecodeBuilder(asm).getCodeObj()).run(), 1)
+        if outText != outDirect:
+            raise Exception(f"{n} statements: the direct build changed the output")
+
+        print(f"{n:<12}{tt * 1000:>12.1f}{td * 1000:>13.1f}{tt / td:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
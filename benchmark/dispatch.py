@@ -0,0 +1,30 @@
+#
+# Micro-benchmark for the VM run loop.
+# Compiles every program in benchmark/programs once, then times only the VM.
+#
+# usage: python benchmark/dispatch.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+
+from util import listPrograms, readProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the loks VM on instruction bound programs")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'time (ms)':>12}")
+    for name in programs:
+        bytecode = compileProgram(readProgram(name))
+        t, _ = timeit(lambda: VirtualMachine(bytecode).run(), args.repeat)
+        print(f"{name:<16}{t * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
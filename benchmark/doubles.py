@@ -0,0 +1,52 @@
+#
+# Loads the bytecode of generated programs full of double constants with
+#   the CodeBuilder, and checks that every constant comes back exactly as
+#   the compiler wrote it.
+#
+# usage: python benchmark/doubles.py [-r <repeat>] [constants ...]
+#
+import argparse
+import random
+from typing import List
+
+from util import timeit
+from compiletime import compileAsm
+
+from loks.assembler.asm import Assembler
+from loks.assembler.builder import AsmProgram
+from loks.VM.code.code import Tag
+from loks.VM.code.codeBuilder import CodeBuilder
+
+
+# a sum of n random doubles with up to 17 significant digits
+def generateProgram(n: int) -> str:
+    rnd = random.Random(n)
+    lines: List[str] = ["var total = 0.5;"]
+    for _ in range(n):
+        lines.append(f"total = total + {rnd.uniform(0, 1000):.{rnd.randint(1, 14)}f};")
+    lines.append("println(total);")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time loading double constants and check that they round-trip")
+    argParser.add_argument('constants', nargs='*', type=int, default=[1000, 10000], help='numbers of constants in the generated programs')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    print(f"{'constants':<12}{'load (ms)':>12}{'exact':>10}")
+    for n in args.constants:
+        asm: AsmProgram = compileAsm(generateProgram(n))
+        bytecode: bytes = bytes(Assembler(asm.getLines()).getBytecode())
+
+        t, _ = timeit(lambda: CodeBuilder(bytecode).getCodeObj(), args.repeat)
+
+        written: List[float] = [float(c[1:]) for c in asm.constants if c[0] == 'd']
+        loaded: List[float] = [c.info for c in CodeBuilder(bytecode).getCodeObj().const_pool if c.tag == Tag.CONSTANT_Double]
+        exact: int = sum(1 for w, l in zip(written, loaded) if w == l)
+
+        print(f"{n:<12}{t * 1000:>12.1f}{exact:>6}/{len(written)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#
+# Compares the stack VM with and without inlining on the programs in
+#   benchmark/programs: the number of executed instructions and the run
+#   time. Both runs have to print the same output.
+#
+# usage: python benchmark/inline.py [-s <size>] [-r <repeat>] [program.lks ...]
+#
+import argparse
+
+from util import listPrograms, readProgram, compileProgram, timeit
+from licm import countInstructions
+
+from loks.VM.vm import VirtualMachine
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the stack VM with and without inlining")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-s', '--size', type=int, default=40, help='largest function body to inline, in AST nodes')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'executed':>12}{'inlined':>12}{'saved':>8}{'calls (ms)':>12}{'inlined (ms)':>14}{'speedup':>10}")
+    for name in programs:
+        program = readProgram(name)
+        before = compileProgram(program, inlineSize=0)
+        after = compileProgram(program, inlineSize=args.size)
+
+        counts = []
+        timeit(lambda: counts.append((countInstructions(before), countInstructions(after))), 1)
+        nb, na = counts[-1]
+
+        tb, outBefore = timeit(lambda: VirtualMachine(before).run(), args.repeat)
+        ta, outAfter = timeit(lambda: VirtualMachine(after).run(), args.repeat)
+
+        if outBefore != outAfter:
+            raise Exception(f"{name}: inlining changed the output")
+
+        print(f"{name:<16}{nb:>12}{na:>12}{(nb - na) / nb:>7.0%}{tb * 1000:>12.1f}{ta * 1000:>14.1f}{tb / ta:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#
+# Compares the stack VM with and without the JIT (-j) on the programs in
+#   benchmark/programs. Compilation to bytecode is not timed, compilation by
+#   the JIT is, and both runs have to print the same output.
+#
+# usage: python benchmark/jit.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+
+from util import listPrograms, readProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the stack VM with and without the JIT")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'interp (ms)':>12}{'jit (ms)':>10}{'speedup':>10}  compiled")
+    for name in programs:
+        bytecode = compileProgram(readProgram(name))
+        ti, outInterp = timeit(lambda: VirtualMachine(bytecode).run(), args.repeat)
+
+        vms = []
+        def runJIT():
+            vms.append(VirtualMachine(bytecode, jit=True))
+            vms[-1].run()
+        tj, outJIT = timeit(runJIT, args.repeat)
+
+        if outInterp != outJIT:
+            raise Exception(f"{name}: the JIT changed the output")
+
+        compiled = sum(1 for f in vms[-1]._code_obj.func_pool if f.jitted != None)
+        print(f"{name:<16}{ti * 1000:>12.1f}{tj * 1000:>10.1f}{ti / tj:>9.2f}x  {compiled}")
+
+
+if __name__ == '__main__':
+    main()
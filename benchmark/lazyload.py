@@ -0,0 +1,65 @@
+#
+# Startup of a program with many functions of which only one is called:
+#   loading all of its bytecode with the CodeBuilder against running it
+#   from a memory-mapped .lkc file (see loks/VM/code/lkc.py), which only
+#   decodes the functions that are called.
+#
+# usage: python benchmark/lazyload.py [-r <repeat>] [functions ...]
+#
+import argparse
+import os
+import tempfile
+from typing import List
+
+from util import timeit
+from compiletime import compileAsm
+
+from loks.assembler.asm import Assembler
+from loks.assembler.builder import AsmProgram
+from loks.VM.vm import VirtualMachine
+from loks.VM.code.lkc import writeCache, openCache
+
+
+# n functions of 50 statements each, main only calls the first one
+def generateProgram(functions: int) -> str:
+    lines: List[str] = []
+    for i in range(functions):
+        lines.append(f"fun f{i}(a) {{")
+        lines.append("    var b = a;")
+        for k in range(50):
+            lines.append(f"    b = b * 3 % 1000 + {k};")
+        lines.append("    return b;")
+        lines.append("}")
+    lines.append("println(f0(1));")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time loading all functions against loading them when called")
+    argParser.add_argument('functions', nargs='*', type=int, default=[10, 100, 1000], help='numbers of functions in the generated programs')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    key: bytes = bytes(32)
+    path: str = os.path.join(tempfile.mkdtemp(), "lazyload.lkc")
+
+    print(f"{'functions':<12}{'bytes':>12}{'eager (ms)':>12}{'mapped (ms)':>13}{'speedup':>10}")
+    for n in args.functions:
+        asm: AsmProgram = compileAsm(generateProgram(n))
+        bytecode: bytes = bytes(Assembler(asm.getLines()).getBytecode())
+        writeCache(path, key, bytecode, [f.name for f in asm.functions])
+
+        te, outEager = timeit(lambda: VirtualMachine(bytecode).run(), args.repeat)
+        tm, outMapped = timeit(lambda: VirtualMachine(openCache(path, key)[0]).run(), args.repeat)
+
+        if outEager != outMapped:
+            raise Exception(f"{n} functions: running from the mapped file changed the output")
+
+        print(f"{n:<12}{len(bytecode):>12}{te * 1000:>12.1f}{tm * 1000:>13.1f}{te / tm:>9.1f}x")
+
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#
+# Compares the stack VM with and without loop-invariant code motion on the
+#   programs in benchmark/programs: the number of executed instructions and
+#   the run time. Both runs have to print the same output.
+#
+# usage: python benchmark/licm.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+from typing import List
+
+from util import listPrograms, readProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+
+
+# runs the program like VirtualMachine.run, returns the number of executed instructions
+def countInstructions(bytecode: List[int]) -> int:
+    vm = VirtualMachine(bytecode)
+    vm._init_vm()
+
+    count: int = 0
+    ip: int = 0
+    while ip >= 0:
+        fn, arg = vm._code[ip]
+        ip = fn(arg, ip)
+        count += 1
+
+    return count
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the stack VM with and without loop-invariant code motion")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'executed':>12}{'hoisted':>12}{'saved':>8}{'before (ms)':>13}{'after (ms)':>12}{'speedup':>10}")
+    for name in programs:
+        program = readProgram(name)
+        before = compileProgram(program, hoist=False)
+        after = compileProgram(program)
+
+        counts = []
+        timeit(lambda: counts.append((countInstructions(before), countInstructions(after))), 1)
+        nb, na = counts[-1]
+
+        tb, outBefore = timeit(lambda: VirtualMachine(before).run(), args.repeat)
+        ta, outAfter = timeit(lambda: VirtualMachine(after).run(), args.repeat)
+
+        if outBefore != outAfter:
+            raise Exception(f"{name}: hoisting changed the output")
+
+        print(f"{name:<16}{nb:>12}{na:>12}{(nb - na) / nb:>7.0%}{tb * 1000:>13.1f}{ta * 1000:>12.1f}{tb / ta:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
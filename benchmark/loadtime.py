@@ -0,0 +1,33 @@
+#
+# Times the CodeBuilder loading the bytecode of generated scripts of
+#   increasing size (see benchmark/compiletime.py). Loading is linear in the
+#   size of the bytecode, so the time per KB should stay about the same.
+#
+# usage: python benchmark/loadtime.py [-r <repeat>] [statements ...]
+#
+import argparse
+
+from util import timeit
+from compiletime import generateProgram, compileAsm
+
+from loks.assembler.asm import Assembler
+from loks.VM.code.codeBuilder import CodeBuilder
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time loading bytecode of increasing size")
+    argParser.add_argument('statements', nargs='*', type=int, default=[1000, 2000, 4000], help='sizes of the generated scripts')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    print(f"{'statements':<12}{'bytes':>12}{'load (ms)':>12}{'us/KB':>10}")
+    for n in args.statements:
+        bytecode = bytes(Assembler(compileAsm(generateProgram(n)).getLines()).getBytecode())
+
+        t, _ = timeit(lambda: CodeBuilder(bytecode).getCodeObj(), args.repeat)
+
+        print(f"{n:<12}{len(bytecode):>12}{t * 1000:>12.1f}{t * 1e6 / (len(bytecode) / 1024):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#
+# Records how often sequences of opcodes are executed back to back over a
+#   corpus of loks programs. Used to pick the superinstructions in
+#   loks/optimizer/superinstructions.py from data.
+#
+# Only sequences that are adjacent in the code and were executed one after
+#   another without a jump in between are counted, since only those can be
+#   fused into a single instruction.
+#
+# usage: python benchmark/opstats.py [-n <length>] [-t <top>] [--fused] [file.lks ...]
+#
+import argparse
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from util import listPrograms, programPath, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+from loks.instruction import opcodeDict
+
+
+#
+# Runs the program like VirtualMachine.run, but also counts every sequence
+#   of 'n' opcodes that was executed in order
+#
+def countSequences(bytecode: List[int], n: int) -> Counter:
+    counts: Counter = Counter()
+
+    vm = VirtualMachine(bytecode)
+    vm._init_vm()
+
+    # instruction list of every function -> its (opcode, operand) pairs
+    opsOf: Dict[int, List[Tuple[int, int]]] = {
+        id(f.instructions): f.ops for f in vm._code_obj.func_pool
+    }
+
+    window: List[int] = []
+    ip: int = 0
+    while ip >= 0:
+        code = vm._code
+        ops = opsOf[id(code)]
+
+        fn, arg = code[ip]
+        window.append(ops[ip][0])
+        if len(window) > n:
+            window.pop(0)
+        if len(window) == n:
+            counts[tuple(window)] += 1
+
+        nextIp: int = fn(arg, ip)
+
+        # jumps, calls and returns break the sequence
+        if nextIp != ip + 1 or vm._code is not code:
+            window = []
+        ip = nextIp
+
+    return counts
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Count dynamic opcode sequence frequencies")
+    argParser.add_argument('files', nargs='*', help='loks files (default: every program in benchmark/programs)')
+    argParser.add_argument('-n', '--length', type=int, default=2, help='length of the counted sequences (default: 2)')
+    argParser.add_argument('-t', '--top', type=int, default=20, help='number of sequences to show')
+    argParser.add_argument('--fused', action='store_true', help='count after the superinstruction pass')
+    args = argParser.parse_args()
+
+    files = args.files or [programPath(p) for p in listPrograms()]
+
+    total: Counter = Counter()
+    for path in files:
+        program = open(path, 'r', encoding='unicode_escape').read()
+        bytecode = compileProgram(program, args.fused)
+
+        # the program's own output is not interesting here
+        counts: Counter = Counter()
+        def run():
+            counts.update(countSequences(bytecode, args.length))
+        timeit(run, 1)
+
+        total.update(counts)
+
+    allSeq = sum(total.values())
+    print(f"{'count':>10} {'share':>7}  sequence")
+    for seq, count in total.most_common(args.top):
+        names = ' '.join(opcodeDict[o] for o in seq)
+        print(f"{count:>10} {count / allSeq:>7.1%}  {names}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#
+# Compares the stack VM with and without quickening on the programs in
+#   benchmark/programs. Both runs have to print the same output.
+#
+# usage: python benchmark/quicken.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+
+from util import listPrograms, readProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the stack VM with and without quickening")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'generic (ms)':>13}{'quick (ms)':>12}{'speedup':>10}{'quickened':>11}{'de-quick':>10}")
+    for name in programs:
+        bytecode = compileProgram(readProgram(name))
+        tg, outGeneric = timeit(lambda: VirtualMachine(bytecode, quicken=False).run(), args.repeat)
+
+        vms = []
+        def runQuick():
+            vms.append(VirtualMachine(bytecode))
+            vms[-1].run()
+        tq, outQuick = timeit(runQuick, args.repeat)
+
+        if outGeneric != outQuick:
+            raise Exception(f"{name}: quickening changed the output")
+
+        print(f"{name:<16}{tg * 1000:>13.1f}{tq * 1000:>12.1f}{tg / tq:>9.2f}x{vms[-1].quickenedCount:>11}{vms[-1].dequickenedCount:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#
+# Compares the stack VM with the register VM on the programs in
+#   benchmark/programs. Compilation is not timed, and both VMs have to print
+#   the same output.
+#
+# usage: python benchmark/regvm.py [-r <repeat>] [program.lks ...]
+#
+import argparse
+
+from util import listPrograms, readProgram, parseProgram, compileProgram, timeit
+
+from loks.VM.vm import VirtualMachine
+from loks.VM.regvm import RegisterVirtualMachine
+from loks.compiler.compiler import RegisterCompiler
+from loks.optimizer.constfold import ConstantFolder
+from loks.optimizer.licm import LoopInvariantHoister
+from loks.optimizer.inline import Inliner
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Time the stack VM against the register VM")
+    argParser.add_argument('programs', nargs='*', help='programs in benchmark/programs to run (default: all)')
+    argParser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the best one is reported')
+    args = argParser.parse_args()
+
+    programs = args.programs or listPrograms()
+
+    print(f"{'program':<16}{'stack (ms)':>12}{'register (ms)':>15}{'speedup':>10}")
+    for name in programs:
+        program = readProgram(name)
+
+        bytecode = compileProgram(program)
+        ts, outStack = timeit(lambda: VirtualMachine(bytecode).run(), args.repeat)
+
+        c = RegisterCompiler()
+        c.visit(LoopInvariantHoister().hoist(Inliner().inline(ConstantFolder().fold(parseProgram(program)))))
+        code = c.getCode()
+        tr, outReg = timeit(lambda: RegisterVirtualMachine(code).run(), args.repeat)
+
+        if outStack != outReg:
+            raise Exception(f"{name}: the VMs printed different output")
+
+        print(f"{name:<16}{ts * 1000:>12.1f}{tr * 1000:>15.1f}{ts / tr:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+# allow the benchmarks to be run from any directory
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from loks.lexer.lexer import Lexer
+from loks.parser.parser import Parser
+from loks.analyzer.analyzer import SemanticAnalyzer
+from loks.compiler.compiler import Compiler
+from loks.assembler.asm import Assembler
+from loks.assembler.builder import AsmProgram
+from loks.optimizer.superinstructions import SuperinstructionFuser
+from loks.optimizer.constfold import ConstantFolder
+from loks.optimizer.cfg import ControlFlowOptimizer
+from loks.optimizer.licm import LoopInvariantHoister
+from loks.optimizer.inline import Inliner
+
+PROGRAMS_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+
+
+def programPath(name: str) -> str:
+    return os.path.join(PROGRAMS_DIR, name)
+
+
+def listPrograms() -> List[str]:
+    return sorted(f for f in os.listdir(PROGRAMS_DIR) if f.endswith(".lks"))
+
+
+def readProgram(name: str) -> str:
+    return open(programPath(name), 'r', encoding='unicode_escape').read()
+
+
+#
+# lex, parse and analyze a program, returns the AST
+#
+def parseProgram(program: str):
+    l = Lexer(program)
+    tokl = l.getTokens()
+    if l.hadError:
+        raise Exception(l.getErrorList())
+
+    p = Parser(tokl)
+    ast = p.getAST()
+    if p.hadError:
+        raise Exception(p.getError())
+
+    s = SemanticAnalyzer()
+    s.visit(ast)
+    if s.hadError:
+        raise Exception(s.getErrorList())
+
+    return ast
+
+
+def compileProgram(program: str, optimize: bool = True, hoist: bool = True, inlineSize: int = 40) -> List[int]:
+    ast = parseProgram(program)
+    if optimize:
+        ast = Inliner(inlineSize).inline(ConstantFolder().fold(ast))
+        if hoist:
+            ast = LoopInvariantHoister().hoist(ast)
+
+    c = Compiler()
+    c.visit(ast)
+    code: AsmProgram = c.getProgram()
+
+    if optimize:
+        code = SuperinstructionFuser(ControlFlowOptimizer(code).getProgram()).getProgram()
+
+    return Assembler(code.getLines()).getBytecodeList()
+
+
+#
+# Runs fn 'repeat' times with stdout suppressed.
+# Returns the best time and whatever the program printed on the last run.
+#
+def timeit(fn: Callable[[], None], repeat: int = 3) -> Tuple[float, str]:
+    best: float = float("inf")
+    output: str = ""
+
+    for _ in range(repeat):
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            t0 = perf_counter()
+            fn()
+            t = perf_counter() - t0
+        best = min(best, t)
+        output = buf.getvalue()
+
+    return best, output
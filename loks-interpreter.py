@@ -3,21 +3,48 @@ import argparse
 import os
 import tkinter as tk
 from time import time
+from typing import List
 
 from loks.lexer.lexer import Lexer
 from loks.parser.parser import Parser
 from loks.analyzer.analyzer import SemanticAnalyzer
 from loks.interpreter.interpreter import Interpeter
+from loks.interpreter.closures import ClosureCompiler
 
-from loks.compiler.compiler import Compiler
+from loks.compiler.compiler import Compiler, RegisterCompiler
 from loks.assembler.asm import Assembler
-from loks.vm.vm import VirtualMachine
+from loks.assembler.builder import BytecodeBuilder
+from loks.optimizer.superinstructions import SuperinstructionFuser
+from loks.optimizer.constfold import ConstantFolder
+from loks.optimizer.cfg import ControlFlowOptimizer
+from loks.optimizer.licm import LoopInvariantHoister
+from loks.optimizer.inline import Inliner
+from loks.VM.vm import VirtualMachine
+from loks.VM.regvm import RegisterVirtualMachine
+from loks.VM.code.lkc import sourceHash, cachePath, openCache, writeCache
 
 from loks.error import Error
 
 from loks.visualizeAST.gendot import VisualizeAST
 
 
+# run bytecode or a Code object on the stack based loks VM
+def runVM(code, fnNames: List[str], args) -> int:
+    v = None
+    try:
+        v = VirtualMachine(code, args.jit, fnNames)
+        v.run()
+    except Error as e:
+        print(e)
+        return -1
+    finally:
+        if args.stats and v != None:
+            print(v.getQuickeningReport(), end='')
+            print(v.getJITReport(), end='')
+
+    return 0
+
+
 def main():
     # setup CLI
     argParser = argparse.ArgumentParser(
@@ -38,6 +65,53 @@ def main():
         help='Use the tree walk interpreter instead of the loks VM to execute code.',
     )
 
+    argParser.add_argument(
+        '-c',
+        '--closures',
+        action='store_true',
+        help='Use the closure compiling interpreter, with the same behavior as the tree walk interpreter, instead of the loks VM to execute code.',
+    )
+
+    argParser.add_argument(
+        '-r',
+        '--registerVM',
+        action='store_true',
+        help='Use the register based VM instead of the stack based loks VM to execute code.',
+    )
+
+    argParser.add_argument(
+        '-j',
+        '--jit',
+        action='store_true',
+        help='Compile hot functions to python while running them on the stack based loks VM.',
+    )
+
+    argParser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Report what the optimizer did, and after the program finished, which functions the JIT compiled.',
+    )
+
+    argParser.add_argument(
+        '--inlineSize',
+        metavar="<nodes>",
+        type=int,
+        default=40,
+        help='Inline calls to functions with at most this many AST nodes in their body, 0 turns inlining off (default: 40).',
+    )
+
+    argParser.add_argument(
+        '--cache',
+        action='store_true',
+        help='Store the compiled program in a .lkc file next to the script, and run it from there while the script and the options are unchanged. Only for the stack based loks VM.',
+    )
+
+    argParser.add_argument(
+        '--cacheDir',
+        metavar="<dir>",
+        help='Like --cache, but store the .lkc file in the specified directory.',
+    )
+
     argParser.add_argument(
         '-b',
         '--bytecode',
@@ -72,6 +146,20 @@ def main():
         print(f"Error: {e}")
         return 1
 
+    # --cache or --cacheDir specified, run the program compiled by an earlier run if the script didn't change
+    cacheFile: str = None
+    cacheKey: bytes = None
+    if (args.cache or args.cacheDir) and not (args.debug or args.closures or args.registerVM or args.bytecode or args.viewBytecode or args.genASTdot):
+        cacheFile = cachePath(args.path, args.cacheDir)
+        cacheKey = sourceHash(program, args.inlineSize)
+
+        cached = openCache(cacheFile, cacheKey)
+        if cached != None:
+            if args.stats:
+                print(f"bytecode cache: loaded {cacheFile}")
+            codeObj, fnNames = cached
+            return runVM(codeObj, fnNames, args)
+
     # lexer - split into tokens
     l = Lexer(program)
     tokl = l.getTokens()
@@ -205,21 +293,79 @@ def main():
             input("\nPress Enter to continue...")
         return -1
 
+    # -c specified, compile the AST to closures and run them
+    if args.closures and not args.debug:
+        try:
+            ClosureCompiler().run(ast)
+        except KeyboardInterrupt:
+            print("\nKeyboard Interrupt")
+            return -1
+        except Error as e:
+            print(e)
+            return -1
+        except:
+            print("The interpreter crashed! Check the Known Bugs sections in the loks github repository (https://github.com/1L1M1N4L1/LOKS) or open an issue.")
+            return -1
+
+        return 0
+
+    # fold constants, inline calls and hoist loop invariants for the
+    #   compilers, the tree walk interpreter runs the AST as written
+    if not args.debug or args.bytecode or args.viewBytecode:
+        folder = ConstantFolder()
+        ast = folder.fold(ast)
+        inliner = Inliner(args.inlineSize)
+        ast = inliner.inline(ast)
+        hoister = LoopInvariantHoister()
+        ast = hoister.hoist(ast)
+        if args.stats:
+            print(f"constant folding: {folder.foldedCount} nodes folded")
+            print(inliner.getReport(), end='')
+            print(f"loop invariant code motion: {hoister.hoistedCount} expressions hoisted")
+
+    # -r specified, use the register VM
+    if args.registerVM and not args.debug:
+        try:
+            c = RegisterCompiler()
+            c.visit(ast)
+            code = c.getCode()
+        except:
+            print("\n Compile Error. Exiting...")
+            return -1
+
+        if args.bytecode:
+            outputf = open(args.bytecode, "w")
+            outputf.write(str(code))
+            outputf.close()
+            return 0
+
+        if args.viewBytecode:
+            print(code)
+            return 0
+
+        try:
+            RegisterVirtualMachine(code).run()
+        except Error as e:
+            print(e)
+            return -1
+
+        return 0
+
     # -b specified, output generated code
     if args.bytecode:
         c = Compiler()
         c.visit(ast)
-        code = c.getCode()
+        code = SuperinstructionFuser(ControlFlowOptimizer(c.getProgram()).getProgram()).getProgram()
 
         outputf = open(args.bytecode, "w")
-        outputf.write(code)
+        outputf.write(code.getText())
         outputf.close()
         return 0
 
     if args.viewBytecode:
         c = Compiler()
         c.visit(ast)
-        print(c.getCode())
+        print(SuperinstructionFuser(ControlFlowOptimizer(c.getProgram()).getProgram()).getProgram().getText())
         return 0
 
     # -d specified, use tree walk interpreter
@@ -255,21 +401,31 @@ def main():
         try:
             c = Compiler()
             c.visit(ast)
-            code = c.getCode()
+            cfg = ControlFlowOptimizer(c.getProgram())
+            code = SuperinstructionFuser(cfg.getProgram()).getProgram()
         except:
             print("\n Compile Error. Exiting...")
             return -1
         
-        try:
-            a = Assembler(code)
-            b = a.getBytecodeList()
-            #for i in b:
-            #    print(hex(i), end=' ')
-            v  = VirtualMachine(b)
-            v.run()
-        except Error as e:
-            print(e)
-            return -1
+        if args.stats:
+            print(f"control flow: {cfg.foldedBranches} constant branches, {cfg.threadedJumps} jumps threaded, {cfg.removedBlocks} unreachable blocks removed")
+            print(c.getTypedReport(), end='')
+
+        # the code is built in memory, the text and bytecode are only for -v, -b and --cache
+        builder = BytecodeBuilder(code)
+        codeObj = builder.getCodeObj()
+
+        if cacheFile != None:
+            try:
+                writeCache(cacheFile, cacheKey, Assembler(code.getLines()).getBytecode(), builder.getFunctionNames())
+                if args.stats:
+                    print(f"bytecode cache: wrote {cacheFile}")
+            except (Error, OSError) as e:
+                # the program still runs, it is compiled again next time
+                if args.stats:
+                    print(f"bytecode cache: not written, {e}")
+
+        return runVM(codeObj, builder.getFunctionNames(), args)
 
     return 0
 
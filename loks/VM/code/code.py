@@ -1,4 +1,4 @@
-from typing import List, Any
+from typing import List, Any, Tuple, Callable
 
 class Tag:
     CONSTANT_Integer = 0x3
@@ -8,8 +8,22 @@ class Tag:
 class func_info:
     def __init__(self):
         self.argc: int = 0
+        # number of local variable slots, params included
+        self.localc: int = 0
         self.code: List[int] = []
 
+        # code decoded into (opcode, operand) pairs, jump operands are
+        #   indices into this list instead of byte offsets
+        self.ops: List[Tuple[int, int]] = []
+
+        # ops with each opcode replaced by its VM handler
+        self.instructions: List[Tuple[Callable[[int, int], int], int]] = []
+
+        # profile and compiled code of the JIT, see loks/VM/jit.py
+        self.calls: int = 0
+        self.backJumps: int = 0
+        self.jitted: Callable[..., Any] = None
+
     def __str__(self):
         code = ""
         for i in self.code:
@@ -48,4 +62,43 @@ class Code:
         self.func_pool.append(c)
 
     def getFromFP(self, idx: int) -> func_info:
-        return self.func_pool[idx]
\ No newline at end of file
+        return self.func_pool[idx]
+
+#
+# Code for the register VM, generated by RegisterCompiler in
+#   loks/compiler/compiler.py. Instructions are kept in memory as
+#   (name, a, b, c) tuples instead of being assembled into bytes.
+#
+class reg_func_info:
+    def __init__(self, name: str, argc: int = 0):
+        self.name: str = name
+        self.argc: int = argc
+        # number of registers, params are the first argc registers
+        self.regc: int = 0
+        self.code: List[Tuple[str, Any, Any, Any]] = []
+
+    def __str__(self):
+        output = f"fn {self.name}\nargc {self.argc}\nregc {self.regc}\n"
+        for idx, (name, a, b, c) in enumerate(self.code):
+            operands = ' '.join(str(o) for o in (a, b, c) if o != None)
+            output += f"    {idx:<5}{name} {operands}\n"
+        return output
+
+    def __repr__(self):
+        return self.__str__()
+
+class RegisterCode:
+    def __init__(self):
+        self.const_pool: List[cp_info] = []
+        self.func_pool: List[reg_func_info] = []
+
+    def __str__(self):
+        output = f"cpc {len(self.const_pool)}\n"
+        for idx, c in enumerate(self.const_pool):
+            output += f"    {idx:<5}{c.info!r}\n"
+        for f in self.func_pool:
+            output += '\n' + str(f)
+        return output
+
+    def __repr__(self):
+        return self.__str__()
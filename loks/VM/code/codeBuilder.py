@@ -1,10 +1,47 @@
+import mmap
+import struct
+from typing import Callable, Dict, List, Tuple, Union
+
 from .code import Code, Tag, func_info, cp_info
+from ...instruction import opcode, opcodeDict, opcodeSizeDict, jumpOpcodes, pairOperandOpcodes
 from ...error import InvalidBytecodeError
 
+
+# size of the instruction starting with every byte, 0 if it isn't an opcode
+_opcodeSizes: List[int] = [0] * 256
+for _op, _name in opcodeDict.items():
+    _opcodeSizes[_op] = opcodeSizeDict[_name]
+
+_EXTENDED_ARG: int = opcode.EXTENDED_ARG.value
+
+# big-endian fields of the format
+_u8: struct.Struct = struct.Struct(">B")
+_u16: struct.Struct = struct.Struct(">H")
+_u32: struct.Struct = struct.Struct(">I")
+_i64: struct.Struct = struct.Struct(">q")
+_f64: struct.Struct = struct.Struct(">d")
+
+
+#
+# Loads bytecode into a Code object. The bytecode is read through a cursor,
+#   fixed size fields with struct and strings and function bodies in one
+#   slice each, so loading takes time linear in its size.
+#
 class CodeBuilder:
-    def __init__(self, codeArr):
+    # codeArr: the bytecode, as a list of ints, a bytes-like object or an mmap
+    # handlers: opcode -> handler table, used to fill func_info.instructions
+    def __init__(self, codeArr: Union[List[int], bytes, mmap.mmap], handlers: List[Callable[[int, int], int]] = None):
         self._code = Code()
-        self._code_array = codeArr
+        try:
+            # an mmap is read in place, only the parts that are decoded are paged in
+            self._code_array: Union[bytes, mmap.mmap] = codeArr if isinstance(codeArr, mmap.mmap) else bytes(codeArr)
+        except ValueError:
+            # an int that isn't a byte
+            raise InvalidBytecodeError()
+
+        # offset of the next byte to read
+        self._pos: int = 0
+        self._handlers = handlers
 
     
     def getCodeObj(self) -> Code:
@@ -13,114 +50,178 @@ class CodeBuilder:
         self._makeFuncPool()
         return self._code
 
-    def _removeFromFront(self, n: int) -> None:
-        self._code_array = self._code_array[n:]
+
+    #
+    # Byte offsets of every constant and every function, without decoding
+    #   the functions. Constants and functions can then be decoded one at a
+    #   time with constantAt and functionAt, see loks/VM/code/mappedCode.py.
+    #
+    def getOffsets(self) -> Tuple[List[int], List[int]]:
+        self._initCode()
+
+        constants: List[int] = []
+        for _ in range(self._unpack(_u32)):
+            constants.append(self._pos)
+            self._readConstant()
+
+        functions: List[int] = []
+        for _ in range(self._unpack(_u16)):
+            functions.append(self._pos)
+            self._advance(4)
+            self._advance(self._unpack(_u32))
+
+        return constants, functions
+
+
+    def constantAt(self, pos: int) -> cp_info:
+        self._pos = pos
+        return self._readConstant()
+
+
+    # the function at pos, its code is only decoded if decode is True
+    def functionAt(self, pos: int, decode: bool = True) -> func_info:
+        self._pos = pos
+        return self._makeFunc(decode)
+
+
+    # position of the next n bytes, which are skipped
+    def _advance(self, n: int) -> int:
+        pos: int = self._pos
+        if pos + n > len(self._code_array):
+            raise InvalidBytecodeError()
+        self._pos += n
+        return pos
+
+
+    def _unpack(self, field: struct.Struct) -> int:
+        return field.unpack_from(self._code_array, self._advance(field.size))[0]
 
     
     def _initCode(self) -> None:
         if len(self._code_array) < 10:
             raise InvalidBytecodeError()
 
-        magic: int =                        \
-            (self._code_array[0] << 24) +   \
-            (self._code_array[1] << 16) +   \
-            (self._code_array[2] << 8) +    \
-            (self._code_array[3])
-
-        if magic != Code.magic_number:
+        if self._unpack(_u32) != Code.magic_number:
             raise InvalidBytecodeError()
-        
-        self._removeFromFront(4)
 
     
     def _makeConstPool(self) -> None:
-        cp_count: int = (self._code_array[0] << 8) + (self._code_array[1])
-        self._removeFromFront(2)
+        cp_count: int = self._unpack(_u32)
         
         for _ in range(cp_count):
-            t: Tag = self._code_array[0]
-            self._removeFromFront(1)
-
-            if t == Tag.CONSTANT_Integer:
-                self._makeInteger()
-            elif t == Tag.CONSTANT_Double:
-                self._makeDouble()
-            elif t == Tag.CONSTANT_String:
-                self._makeString()
-
-    def _makeInteger(self) -> None:
-        i: int =                            \
-            (self._code_array[0] << 56) +   \
-            (self._code_array[1] << 48) +   \
-            (self._code_array[2] << 40) +   \
-            (self._code_array[3] << 32) +   \
-            (self._code_array[4] << 24) +   \
-            (self._code_array[5] << 16) +   \
-            (self._code_array[6] << 8) +    \
-            (self._code_array[7])
-
-        s_test: int = (i & 0xf000000000000000) >> 60
-
-        if s_test > 7:
-            i -= 1  # sub 1
-            i = i ^ (0xffffffffffffffff)  # flip bits
-            i = -i  # negate
-
-        self._removeFromFront(8)
-        self._code.addToCP(cp_info(Tag.CONSTANT_Integer, i))
-
-    
-    def _makeDouble(self) -> None:
-        v = self._code_array
+            self._code.addToCP(self._readConstant())
 
-        sign: int = (v[0] & 0b10000000) >> 7
-        exp: int = (((v[0] << 8) + (v[1])) & 0b0111111111110000) >> 4
-        mantissa: int = ((v[1] & 0x0f) << 48) + \
-            (v[2] << 40) +    \
-            (v[3] << 32) +    \
-            (v[4] << 24) +    \
-            (v[5] << 16) +    \
-            (v[6] << 8) +     \
-            (v[7])            
+    # the constant at the cursor
+    def _readConstant(self) -> cp_info:
+        t: Tag = self._unpack(_u8)
 
-        d: float = mantissa/(10**exp)
+        if t == Tag.CONSTANT_Integer:
+            return self._makeInteger()
+        elif t == Tag.CONSTANT_Double:
+            return self._makeDouble()
+        elif t == Tag.CONSTANT_String:
+            return self._makeString()
 
-        if sign == 1:
-            d = -d
+        raise InvalidBytecodeError()
 
-        self._removeFromFront(8)
-        self._code.addToCP(cp_info(Tag.CONSTANT_Double, d))
+    def _makeInteger(self) -> cp_info:
+        # two's complement
+        return cp_info(Tag.CONSTANT_Integer, self._unpack(_i64))
 
-    def _makeString(self) -> None:
-        s: str = ""
+    
+    def _makeDouble(self) -> cp_info:
+        return cp_info(Tag.CONSTANT_Double, self._unpack(_f64))
 
-        while self._code_array[0] != 0x00:
-            s += chr(self._code_array[0])
-            self._removeFromFront(1)
+    # null terminated, one character per byte
+    def _makeString(self) -> cp_info:
+        end: int = self._code_array.find(b"\x00", self._pos)
+        if end == -1:
+            raise InvalidBytecodeError()
 
-        self._removeFromFront(1)
-        self._code.addToCP(cp_info(Tag.CONSTANT_String, s))
+        s: str = self._code_array[self._pos:end].decode("latin-1")
+        self._pos = end + 1
+        return cp_info(Tag.CONSTANT_String, s)
 
     def _makeFuncPool(self) -> None:
-        fp_count: int = (self._code_array[0] << 8) + (self._code_array[1])
-        self._removeFromFront(2)
+        fp_count: int = self._unpack(_u16)
         for _ in range(fp_count):
             self._code.addToFP(self._makeFunc())
 
-    def _makeFunc(self) -> func_info:
+    def _makeFunc(self, decode: bool = True) -> func_info:
         f = func_info()
 
-        argc: int = (self._code_array[0] << 8) + (self._code_array[1])
-        self._removeFromFront(2)
-        f.argc = argc
-
-        code_count: int = (self._code_array[0] << 8) + (self._code_array[1])
-        self._removeFromFront(2)
-        
-        for _ in range(code_count):
-            f.code.append(self._code_array[0])
-            self._removeFromFront(1)
+        f.argc = self._unpack(_u16)
+        f.localc = self._unpack(_u16)
 
+        if decode:
+            code_count: int = self._unpack(_u32)
+            f.code = list(self._code_array[self._advance(code_count):self._pos])
+            self._decodeFunc(f)
         return f
+
+    #
+    # Decodes the operands of every instruction once, so the VM never has to
+    #   reassemble them while running. EXTENDED_ARG prefixes are merged into
+    #   the operand of the instruction they precede and don't show up in
+    #   f.ops, so wide operands cost nothing at runtime.
+    #
+    def _decodeFunc(self, f: func_info) -> None:
+        code: List[int] = f.code
+
+        # byte offset of an instruction -> its index in f.ops
+        offsets: Dict[int, int] = dict()
+
+        # high bytes of the next operand, and where its first prefix starts
+        ext: int = 0
+        start: int = None
+
+        i = 0
+        while i < len(code):
+            op: int = code[i]
+            size: int = _opcodeSizes[op]
+            if size == 0:
+                raise InvalidBytecodeError()
+
+            if op == _EXTENDED_ARG:
+                if start == None:
+                    start = i
+                ext = (ext << 8) + code[i + 1]
+                i += 2
+                continue
+
+            arg: int = 0
+            if size == 2:
+                arg = (ext << 8) + code[i + 1]
+            elif op in pairOperandOpcodes:
+                arg = (code[i + 1], code[i + 2])
+            elif size == 3:
+                arg = (ext << 16) + (code[i + 1] << 8) + code[i + 2]
+
+            # only single operands can be extended
+            if start != None and (size == 1 or op in pairOperandOpcodes):
+                raise InvalidBytecodeError()
+
+            # jumps to an extended instruction go to its first prefix
+            offsets[i if start == None else start] = len(f.ops)
+            f.ops.append((op, arg))
+            i += size
+
+            ext = 0
+            start = None
+
+        if start != None:
+            raise InvalidBytecodeError()
+
+        # a label at the very end of a function points just past the last instruction
+        offsets[i] = len(f.ops)
+
+        for idx, (op, arg) in enumerate(f.ops):
+            if op in jumpOpcodes:
+                if arg not in offsets:
+                    raise InvalidBytecodeError()
+                f.ops[idx] = (op, offsets[arg])
+
+        if self._handlers != None:
+            f.instructions = [(self._handlers[op], arg) for op, arg in f.ops]
         
 
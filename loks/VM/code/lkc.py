@@ -0,0 +1,136 @@
+import hashlib
+import mmap
+import os
+import struct
+from typing import List, Tuple
+
+from .code import Code
+from .codeBuilder import CodeBuilder
+from .mappedCode import MappedCode
+
+
+#
+# Compiled programs cached on disk, so running a script that didn't change
+#   skips everything before the VM. A .lkc file is a header followed by the
+#   bytecode (see loks/assembler/asm.py):
+#   - the magic bytes "LKC\0"
+#   - u16 format version
+#   - the 32 byte key of the source, see sourceHash
+#   - u16 number of functions, followed by their names, null terminated,
+#     for the JIT report
+#   - u32 number of constants and the file offset of each one, as u32
+#   - u16 number of functions and the file offset of each one, as u32
+#   - the bytecode
+# The offsets let a file be mapped into memory and run as a MappedCode,
+#   which only decodes the functions that are called.
+# Bump LKC_VERSION whenever the compiler or the bytecode format changes, so
+#   files written before are compiled again.
+#
+LKC_MAGIC: bytes = b"LKC\x00"
+LKC_VERSION: int = 3
+LKC_EXTENSION: str = ".lkc"
+
+_header: struct.Struct = struct.Struct(">4sH32s")
+_u16: struct.Struct = struct.Struct(">H")
+_u32: struct.Struct = struct.Struct(">I")
+
+
+# SHA-256 of the source and of the options the generated code depends on
+def sourceHash(source: str, inlineSize: int) -> bytes:
+    h = hashlib.sha256()
+    h.update(f"inlineSize {inlineSize}\n".encode())
+    h.update(source.encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+
+#
+# The .lkc file of a script: next to it, or in cacheDir if given. Files in
+#   a cache directory are named after the full path of their script, so
+#   scripts with the same name in different directories don't collide.
+#
+def cachePath(scriptPath: str, cacheDir: str = None) -> str:
+    base: str = os.path.splitext(os.path.basename(scriptPath))[0]
+    if cacheDir == None:
+        return os.path.join(os.path.dirname(scriptPath), base + LKC_EXTENSION)
+
+    pathHash: str = hashlib.sha256(os.path.abspath(scriptPath).encode("utf-8", "surrogatepass")).hexdigest()[:16]
+    return os.path.join(cacheDir, f"{base}-{pathHash}{LKC_EXTENSION}")
+
+
+#
+# Writes the file to a temporary name first and then renames it, so a run
+#   reading it at the same time sees either the old file or the new one.
+#
+def writeCache(path: str, key: bytes, bytecode: bytes, fnNames: List[str]) -> None:
+    output: bytearray = bytearray(_header.pack(LKC_MAGIC, LKC_VERSION, key))
+
+    output += _u16.pack(len(fnNames))
+    for name in fnNames:
+        output += name.encode("utf-8", "surrogatepass") + b"\x00"
+
+    constants, functions = CodeBuilder(bytecode).getOffsets()
+
+    # the bytecode starts right after the offset tables
+    base: int = len(output) + _u32.size + 4 * len(constants) + _u16.size + 4 * len(functions)
+
+    output += _u32.pack(len(constants))
+    output += struct.pack(f">{len(constants)}I", *(base + c for c in constants))
+    output += _u16.pack(len(functions))
+    output += struct.pack(f">{len(functions)}I", *(base + f for f in functions))
+
+    output += bytecode
+
+    if os.path.dirname(path) != "":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    temp: str = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(output)
+    os.replace(temp, path)
+
+
+#
+# (code, function names) stored in the file at path, or None if there is
+#   no such file or it wasn't written for key by this version. The file is
+#   mapped into memory, functions are only read and decoded when called.
+#
+def openCache(path: str, key: bytes) -> Tuple[MappedCode, List[str]]:
+    try:
+        with open(path, "rb") as f:
+            data: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # ValueError: the file is empty
+        return None
+
+    try:
+        magic, version, fileKey = _header.unpack_from(data, 0)
+        if magic != LKC_MAGIC or version != LKC_VERSION or fileKey != key:
+            return None
+
+        pos: int = _header.size
+        count: int = _u16.unpack_from(data, pos)[0]
+        pos += _u16.size
+
+        fnNames: List[str] = []
+        for _ in range(count):
+            end: int = data.find(b"\x00", pos)
+            if end == -1:
+                return None
+            fnNames.append(data[pos:end].decode("utf-8", "surrogatepass"))
+            pos = end + 1
+
+        count = _u32.unpack_from(data, pos)[0]
+        constants: List[int] = list(struct.unpack_from(f">{count}I", data, pos + _u32.size))
+        pos += _u32.size + 4 * count
+
+        count = _u16.unpack_from(data, pos)[0]
+        functions: List[int] = list(struct.unpack_from(f">{count}I", data, pos + _u16.size))
+        pos += _u16.size + 4 * count
+
+        if _u32.unpack_from(data, pos)[0] != Code.magic_number:
+            return None
+    except struct.error:
+        # cut off
+        return None
+
+    return MappedCode(data, constants, functions), fnNames
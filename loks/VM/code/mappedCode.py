@@ -0,0 +1,59 @@
+import mmap
+from typing import Callable, List, Union
+
+from .code import Code, func_info, cp_info
+from .codeBuilder import CodeBuilder
+
+
+#
+# A Code object over bytecode that is decoded lazily: a constant on the
+#   first getFromCP, a function on the first getFromFP. With the bytecode
+#   in an mmap, starting a program only reads what it runs.
+# The functions in func_pool are there from the start with their argc and
+#   localc, but their code, ops and instructions stay empty until they are
+#   loaded through getFromFP. onLoad is then called with the index of the
+#   function, so the VM can fill in its instructions.
+#
+class MappedCode(Code):
+    # buffer: the bytecode, possibly at an offset into a larger buffer
+    # constOffsets, funcOffsets: positions of the constants and functions
+    #   in buffer, see CodeBuilder.getOffsets
+    def __init__(self, buffer: Union[bytes, mmap.mmap], constOffsets: List[int], funcOffsets: List[int]):
+        super().__init__()
+
+        self._builder: CodeBuilder = CodeBuilder(buffer)
+        self._constOffsets: List[int] = constOffsets
+        self._funcOffsets: List[int] = funcOffsets
+
+        self.const_pool = [None] * len(constOffsets)
+        self.func_pool = [self._builder.functionAt(pos, False) for pos in funcOffsets]
+        self._loaded: List[bool] = [False] * len(funcOffsets)
+
+        self.onLoad: Callable[[int, func_info], None] = None
+
+
+    def getFromCP(self, idx: int) -> cp_info:
+        c: cp_info = self.const_pool[idx]
+        if c == None:
+            c = self._builder.constantAt(self._constOffsets[idx])
+            self.const_pool[idx] = c
+        return c
+
+
+    def getFromFP(self, idx: int) -> func_info:
+        if not self._loaded[idx]:
+            self._load(idx)
+        return self.func_pool[idx]
+
+
+    def _load(self, idx: int) -> None:
+        f: func_info = self.func_pool[idx]
+        decoded: func_info = self._builder.functionAt(self._funcOffsets[idx])
+
+        # the func_info in the pool keeps its identity
+        f.code = decoded.code
+        f.ops = decoded.ops
+        self._loaded[idx] = True
+
+        if self.onLoad != None:
+            self.onLoad(idx, f)
@@ -0,0 +1,673 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+from .code.code import func_info
+from ..instruction import opcode, opcodeDict, jumpOpcodes
+from ..types import LObject, Array, String, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
+from ..stdlib import builtinFunctionIndex, builtinFunctionTable, builtinFunctionInfo
+from ..error import TypeErr, ZeroDivErr, IndexErr
+
+
+# calls + backward jumps after which a function is compiled
+JIT_THRESHOLD: int = 200
+
+# compiled functions call each other through python calls, past this depth
+#   calls are interpreted so deep recursion doesn't hit python's limit
+JIT_MAX_DEPTH: int = 100
+
+
+class JITUnsupported(Exception):
+    pass
+
+
+#
+# Slow paths of the generated code, they raise the same errors as the
+#   handlers in VirtualMachine
+#
+
+def _typeName(v: LObject) -> str:
+    return type(v).__name__
+
+
+def _sub(l: LObject, r: LObject) -> LObject:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Cannot subtract {_typeName(r)} from {_typeName(l)}")
+    return makeNumber(l.value - r.value)
+
+
+def _mul(l: LObject, r: LObject) -> LObject:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Cannot multiply {_typeName(l)} by {_typeName(r)}")
+    return makeNumber(l.value * r.value)
+
+
+def _div(l: LObject, r: LObject) -> LObject:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Cannot divide {_typeName(l)} by {_typeName(r)}")
+    if r.value == 0:
+        raise ZeroDivErr()
+    return makeNumber(l.value / r.value)
+
+
+def _mod(l: LObject, r: LObject) -> LObject:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Invalid operand type for modulo: {_typeName(l)} and {_typeName(r)}")
+    if r.value == 0:
+        raise ZeroDivErr()
+    return makeNumber(l.value % r.value)
+
+
+def _neg(v: LObject) -> LObject:
+    if v.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Cannot negate {_typeName(v)}")
+    return makeNumber(-(v.value))
+
+
+def _gt(l: LObject, r: LObject) -> bool:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Invalid operand type for greater than operator: {_typeName(l)} and {_typeName(r)}")
+    return l.value > r.value
+
+
+def _lt(l: LObject, r: LObject) -> bool:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Invalid operand type for less than operator: {_typeName(l)} and {_typeName(r)}")
+    return l.value < r.value
+
+
+def _ge(l: LObject, r: LObject) -> bool:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Invalid operand type for greater than equals operator: {_typeName(l)} and {_typeName(r)}")
+    return l.value >= r.value
+
+
+def _le(l: LObject, r: LObject) -> bool:
+    if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Invalid operand type for less than equals operator: {_typeName(l)} and {_typeName(r)}")
+    return l.value <= r.value
+
+
+def _checkIndex(arr: LObject, idx: LObject) -> None:
+    if idx.tag != TypeTag.NUMBER:
+        raise TypeErr(f"Array indices must be integers, not '{_typeName(idx)}'")
+
+    if type(idx.value) is float:
+        raise TypeErr(f"Array indices must be integers, not float")
+
+    if arr.tag != TypeTag.ARRAY:
+        raise TypeErr(f"Type '{_typeName(arr)}' is not subscriptable")
+
+    if arr.getEL(idx.value) == None:
+        raise IndexErr()
+
+
+def _subscr(arr: LObject, idx: LObject) -> LObject:
+    _checkIndex(arr, idx)
+    return arr.getEL(idx.value)
+
+
+def _storeSubscr(arr: LObject, idx: LObject, val: LObject) -> None:
+    _checkIndex(arr, idx)
+    arr.setEL(val, idx.value)
+
+
+def _buildList(*elements: LObject) -> Array:
+    arrObj: Array = Array()
+    for e in elements:
+        arrObj.addEl(e)
+    return arrObj
+
+
+# python operator and slow path of the number comparisons
+comparisons: Dict[str, Tuple[str, str]] = {
+    "GT": (">", "gt"),
+    "LT": ("<", "lt"),
+    "GE": (">=", "ge"),
+    "LE": ("<=", "le"),
+}
+
+# python operator and slow path of the number arithmetic
+arithmetic: Dict[str, Tuple[str, str]] = {
+    "BINARY_ADD": ("+", "add"),
+    "BINARY_SUBTRACT": ("-", "sub"),
+    "BINARY_MULTIPLY": ("*", "mul"),
+}
+
+
+#
+# Translates the bytecode of one function into the source of a python
+#   function with the same behavior.
+# Locals become python locals (l0, l1, ...) and the operand stack is
+#   simulated while translating, so stack operations turn into expressions
+#   and temporaries (t0, t1, ...). Basic blocks are the arms of a dispatch
+#   loop over the block number 'blk'; a jump sets blk and restarts the loop.
+# Values that stay on the stack across a jump, like the operands pending
+#   around a short-circuited and/or, are passed in s0, s1, ...
+# Raises JITUnsupported for code it can't translate, the function is then
+#   left to the interpreter.
+#
+class FunctionTranslator:
+    def __init__(self, vm, idx: int) -> None:
+        self._vm = vm
+        self._idx: int = idx
+        self._fn: func_info = vm._code_obj.getFromFP(idx)
+        self._ops: List[Tuple[int, Any]] = self._fn.ops
+
+        self._namespace: Dict[str, Any] = {
+            "vm": vm,
+            "invoke": vm._invoke,
+            "NIL": NIL, "TRUE": TRUE, "FALSE": FALSE,
+            "makeNumber": makeNumber, "String": String, "isTruthy": isTruthy, "valuesEqual": valuesEqual,
+            "add": vm._add, "sub": _sub, "mul": _mul, "div": _div, "mod": _mod, "neg": _neg,
+            "gt": _gt, "lt": _lt, "ge": _ge, "le": _le,
+            "subscr": _subscr, "storeSubscr": _storeSubscr, "buildList": _buildList,
+        }
+
+        self._lines: List[str] = []
+        self._stack: List[str] = []
+        self._tempCtr: int = 0
+
+        # block start -> stack depth when it is entered
+        self._depths: Dict[int, int] = {0: 0}
+
+        # indentation of the code of the current block
+        self._indent: str = ""
+
+        # python source of the translated function
+        self.source: str = ""
+
+
+    def translate(self) -> Callable[..., LObject]:
+        name: str = f"jit_{self._idx}"
+        params: str = ', '.join(f"l{i}" for i in range(self._fn.argc))
+        blocks: List[Tuple[int, int]] = self._findBlocks()
+
+        self._lines.append(f"def {name}({params}):")
+        self._lines.append("    g = vm._stack")
+        for i in range(self._fn.argc, self._fn.localc):
+            self._lines.append(f"    l{i} = NIL")
+
+        self._lines.append("    blk = 0")
+        self._lines.append("    while True:")
+        for n, (start, end) in enumerate(blocks):
+            self._lines.append(f"        if blk == {start}:")
+            self._indent = " " * 12
+            self._translateBlock(start, end)
+
+        # every function ends with a return, falling off the end is a bug
+        self._lines.append("        raise Exception('jit: fell off the end of the function')")
+
+        self.source = '\n'.join(self._lines) + '\n'
+        code = compile(self.source, f"<jit {self._vm._fnNames[self._idx]}>", "exec")
+        exec(code, self._namespace)
+        return self._namespace[name]
+
+
+    # (first, last + 1) instruction index of every basic block
+    def _findBlocks(self) -> List[Tuple[int, int]]:
+        leaders = {0}
+        for i, (op, arg) in enumerate(self._ops):
+            if op not in opcodeDict:
+                raise JITUnsupported(f"unknown opcode {op}")
+
+            if op in jumpOpcodes:
+                if arg >= len(self._ops):
+                    raise JITUnsupported("jump past the end of the function")
+                leaders.add(arg)
+                leaders.add(i + 1)
+            elif op in (opcode.RETURN_VALUE.value, opcode.TAIL_CALL.value):
+                leaders.add(i + 1)
+
+        starts: List[int] = sorted(l for l in leaders if l < len(self._ops))
+        return list(zip(starts, starts[1:] + [len(self._ops)]))
+
+
+    def _emit(self, line: str) -> None:
+        self._lines.append(self._indent + line)
+
+
+    def _newTemp(self) -> str:
+        self._tempCtr += 1
+        return f"t{self._tempCtr}"
+
+
+    # store expr in a new temporary and push it
+    def _pushTemp(self, expr: str) -> None:
+        t: str = self._newTemp()
+        self._emit(f"{t} = {expr}")
+        self._stack.append(t)
+
+
+    def _pop(self) -> str:
+        if len(self._stack) == 0:
+            raise JITUnsupported("operand stack underflow")
+        return self._stack.pop()
+
+
+    def _popN(self, n: int) -> List[str]:
+        values: List[str] = [self._pop() for _ in range(n)]
+        values.reverse()
+        return values
+
+
+    # values on the simulated stack that read local x keep its old value
+    def _beforeStore(self, local: str) -> None:
+        for i, v in enumerate(self._stack):
+            if v == local:
+                t: str = self._newTemp()
+                self._emit(f"{t} = {local}")
+                self._stack[i] = t
+
+
+    def _jump(self, target: int) -> None:
+        self._emit(f"blk = {target}")
+        self._emit("continue")
+
+
+    #
+    # Store the values on the simulated stack in s0, s1, ... before the
+    #   block is left for target. Every path into a block has to leave the
+    #   same number of values.
+    #
+    def _spill(self, target: int) -> None:
+        if self._depths.setdefault(target, len(self._stack)) != len(self._stack):
+            raise JITUnsupported("different stack depths on the paths into a block")
+
+        pending: List[int] = [i for i, v in enumerate(self._stack) if v != f"s{i}"]
+        if len(pending) > 0:
+            self._emit(f"{', '.join(f's{i}' for i in pending)} = {', '.join(self._stack[i] for i in pending)}")
+            for i in pending:
+                self._stack[i] = f"s{i}"
+
+
+    def _translateBlock(self, start: int, end: int) -> None:
+        # blocks only reached by backward jumps start at statements
+        self._stack = [f"s{i}" for i in range(self._depths.setdefault(start, 0))]
+
+        for i in range(start, end):
+            op, arg = self._ops[i]
+            name: str = opcodeDict[op]
+
+            translate = getattr(self, f"_translate_{name}", None)
+            if translate == None:
+                raise JITUnsupported(f"unsupported opcode {name}")
+
+            # True if the instruction ended the block
+            if translate(arg):
+                return
+
+        # fall through to the next block
+        self._spill(end)
+        self._emit(f"blk = {end}")
+
+
+    def _translate_POP_TOP(self, arg: int) -> bool:
+        self._pop()
+        return False
+
+    def _translate_LOAD_NIL(self, arg: int) -> bool:
+        self._stack.append("NIL")
+        return False
+
+    def _translate_LOAD_TRUE(self, arg: int) -> bool:
+        self._stack.append("TRUE")
+        return False
+
+    def _translate_LOAD_FALSE(self, arg: int) -> bool:
+        self._stack.append("FALSE")
+        return False
+
+    def _translate_LOAD_CONST(self, arg: int) -> bool:
+        self._namespace[f"k{arg}"] = self._vm._constants[arg]
+        self._stack.append(f"k{arg}")
+        return False
+
+    def _translate_BIPUSH(self, arg: int) -> bool:
+        self._namespace[f"n{arg}"] = makeNumber(arg)
+        self._stack.append(f"n{arg}")
+        return False
+
+    def _translate_LOAD_LOCAL(self, arg: int) -> bool:
+        self._stack.append(f"l{arg}")
+        return False
+
+    def _translate_STORE_LOCAL(self, arg: int) -> bool:
+        v: str = self._pop()
+        self._beforeStore(f"l{arg}")
+        self._emit(f"l{arg} = {v}")
+        return False
+
+    # globals can be changed by calls, so they are read into a temporary
+    def _translate_LOAD_GLOBAL(self, arg: int) -> bool:
+        self._pushTemp(f"g[{arg}]")
+        return False
+
+    def _translate_STORE_GLOBAL(self, arg: int) -> bool:
+        self._emit(f"g[{arg}] = {self._pop()}")
+        return False
+
+
+    def _arithmetic(self, name: str) -> bool:
+        r: str = self._pop()
+        l: str = self._pop()
+        pyop, slow = arithmetic[name]
+        self._pushTemp(
+            f"makeNumber({l}.value {pyop} {r}.value) if {l}.tag == {TypeTag.NUMBER} and {r}.tag == {TypeTag.NUMBER} else {slow}({l}, {r})"
+        )
+        return False
+
+    def _translate_BINARY_ADD(self, arg: int) -> bool:
+        return self._arithmetic("BINARY_ADD")
+
+    def _translate_BINARY_SUBTRACT(self, arg: int) -> bool:
+        return self._arithmetic("BINARY_SUBTRACT")
+
+    def _translate_BINARY_MULTIPLY(self, arg: int) -> bool:
+        return self._arithmetic("BINARY_MULTIPLY")
+
+    def _translate_BINARY_DIVIDE(self, arg: int) -> bool:
+        r: str = self._pop()
+        self._pushTemp(f"div({self._pop()}, {r})")
+        return False
+
+    def _translate_BINARY_MODULO(self, arg: int) -> bool:
+        r: str = self._pop()
+        self._pushTemp(f"mod({self._pop()}, {r})")
+        return False
+
+    def _translate_BINARY_AND(self, arg: int) -> bool:
+        r: str = self._pop()
+        l: str = self._pop()
+        self._pushTemp(f"TRUE if isTruthy({l}) and isTruthy({r}) else FALSE")
+        return False
+
+    def _translate_BINARY_OR(self, arg: int) -> bool:
+        r: str = self._pop()
+        l: str = self._pop()
+        self._pushTemp(f"TRUE if isTruthy({l}) or isTruthy({r}) else FALSE")
+        return False
+
+    def _translate_UNARY_NOT(self, arg: int) -> bool:
+        self._pushTemp(f"FALSE if isTruthy({self._pop()}) else TRUE")
+        return False
+
+    def _translate_UNARY_NEGATIVE(self, arg: int) -> bool:
+        self._pushTemp(f"neg({self._pop()})")
+        return False
+
+
+    # python expression for a comparison of l and r, evaluates to a bool
+    def _compare(self, cmp: str) -> str:
+        r: str = self._pop()
+        l: str = self._pop()
+
+        if cmp == "EQ":
+            return f"valuesEqual({l}, {r})"
+        if cmp == "NE":
+            return f"not valuesEqual({l}, {r})"
+
+        pyop, slow = comparisons[cmp]
+        return f"({l}.value {pyop} {r}.value if {l}.tag == {TypeTag.NUMBER} and {r}.tag == {TypeTag.NUMBER} else {slow}({l}, {r}))"
+
+    def _translate_CMPEQ(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('EQ')} else FALSE")
+        return False
+
+    def _translate_CMPNE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('NE')} else FALSE")
+        return False
+
+    def _translate_CMPGT(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('GT')} else FALSE")
+        return False
+
+    def _translate_CMPLT(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('LT')} else FALSE")
+        return False
+
+    def _translate_CMPGE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('GE')} else FALSE")
+        return False
+
+    def _translate_CMPLE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._compare('LE')} else FALSE")
+        return False
+
+
+    # jump to target if cond is true
+    def _branch(self, cond: str, target: int) -> bool:
+        # cond only reads popped values, which the spill doesn't overwrite
+        self._spill(target)
+        self._emit(f"if {cond}:")
+        self._emit(f"    blk = {target}")
+        self._emit("    continue")
+        return False
+
+    def _translate_GOTO(self, arg: int) -> bool:
+        self._spill(arg)
+        self._jump(arg)
+        return True
+
+    def _translate_POP_JMP_IF_TRUE(self, arg: int) -> bool:
+        return self._branch(f"isTruthy({self._pop()})", arg)
+
+    def _translate_POP_JMP_IF_FALSE(self, arg: int) -> bool:
+        return self._branch(f"not isTruthy({self._pop()})", arg)
+
+    def _translate_JMP_IF_NOT_EQ(self, arg: int) -> bool:
+        return self._branch(f"not {self._compare('EQ')}", arg)
+
+    def _translate_JMP_IF_NOT_NE(self, arg: int) -> bool:
+        return self._branch(f"not ({self._compare('NE')})", arg)
+
+    def _translate_JMP_IF_NOT_GT(self, arg: int) -> bool:
+        return self._branch(f"not {self._compare('GT')}", arg)
+
+    def _translate_JMP_IF_NOT_LT(self, arg: int) -> bool:
+        return self._branch(f"not {self._compare('LT')}", arg)
+
+    def _translate_JMP_IF_NOT_GE(self, arg: int) -> bool:
+        return self._branch(f"not {self._compare('GE')}", arg)
+
+    def _translate_JMP_IF_NOT_LE(self, arg: int) -> bool:
+        return self._branch(f"not {self._compare('LE')}", arg)
+
+
+    def _translate_ADD_LOCALS(self, arg: Tuple[int, int]) -> bool:
+        self._stack.append(f"l{arg[0]}")
+        self._stack.append(f"l{arg[1]}")
+        return self._arithmetic("BINARY_ADD")
+
+    def _translate_INC_LOCAL(self, arg: Tuple[int, int]) -> bool:
+        l: str = f"l{arg[0]}"
+        self._namespace[f"n{arg[1]}"] = makeNumber(arg[1])
+        self._beforeStore(l)
+        self._emit(f"{l} = makeNumber({l}.value + {arg[1]}) if {l}.tag == {TypeTag.NUMBER} else add({l}, n{arg[1]})")
+        return False
+
+
+    #
+    # Typed instructions, their operands are known to be numbers or strings
+    #
+
+    def _typed(self, pyop: str) -> bool:
+        r: str = self._pop()
+        l: str = self._pop()
+        self._pushTemp(f"makeNumber({l}.value {pyop} {r}.value)")
+        return False
+
+    def _translate_NUM_ADD(self, arg: int) -> bool:
+        return self._typed("+")
+
+    def _translate_NUM_SUB(self, arg: int) -> bool:
+        return self._typed("-")
+
+    def _translate_NUM_MUL(self, arg: int) -> bool:
+        return self._typed("*")
+
+    # division by zero is still checked by the slow path
+    def _translate_NUM_DIV(self, arg: int) -> bool:
+        return self._translate_BINARY_DIVIDE(arg)
+
+    def _translate_NUM_MOD(self, arg: int) -> bool:
+        return self._translate_BINARY_MODULO(arg)
+
+    def _translate_NUM_NEG(self, arg: int) -> bool:
+        self._pushTemp(f"makeNumber(-({self._pop()}.value))")
+        return False
+
+    def _translate_STR_ADD(self, arg: int) -> bool:
+        r: str = self._pop()
+        l: str = self._pop()
+        self._pushTemp(f"String({l}.value + {r}.value)")
+        return False
+
+    def _translate_NUM_ADD_LOCALS(self, arg: Tuple[int, int]) -> bool:
+        self._stack.append(f"l{arg[0]}")
+        self._stack.append(f"l{arg[1]}")
+        return self._typed("+")
+
+
+    # python expression for a comparison of two numbers
+    def _typedCompare(self, pyop: str) -> str:
+        r: str = self._pop()
+        l: str = self._pop()
+        return f"({l}.value {pyop} {r}.value)"
+
+    def _translate_NUM_CMPEQ(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('==')} else FALSE")
+        return False
+
+    def _translate_NUM_CMPNE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('!=')} else FALSE")
+        return False
+
+    def _translate_NUM_CMPGT(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('>')} else FALSE")
+        return False
+
+    def _translate_NUM_CMPLT(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('<')} else FALSE")
+        return False
+
+    def _translate_NUM_CMPGE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('>=')} else FALSE")
+        return False
+
+    def _translate_NUM_CMPLE(self, arg: int) -> bool:
+        self._pushTemp(f"TRUE if {self._typedCompare('<=')} else FALSE")
+        return False
+
+    def _translate_NUM_JMP_IF_NOT_EQ(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('==')}", arg)
+
+    def _translate_NUM_JMP_IF_NOT_NE(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('!=')}", arg)
+
+    def _translate_NUM_JMP_IF_NOT_GT(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('>')}", arg)
+
+    def _translate_NUM_JMP_IF_NOT_LT(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('<')}", arg)
+
+    def _translate_NUM_JMP_IF_NOT_GE(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('>=')}", arg)
+
+    def _translate_NUM_JMP_IF_NOT_LE(self, arg: int) -> bool:
+        return self._branch(f"not {self._typedCompare('<=')}", arg)
+
+
+    def _translate_BUILD_LIST(self, arg: int) -> bool:
+        self._pushTemp(f"buildList({', '.join(self._popN(arg))})")
+        return False
+
+    def _translate_BINARY_SUBSCR(self, arg: int) -> bool:
+        idx: str = self._pop()
+        self._pushTemp(f"subscr({self._pop()}, {idx})")
+        return False
+
+    def _translate_STORE_SUBSCR(self, arg: int) -> bool:
+        idx: str = self._pop()
+        arr: str = self._pop()
+        self._emit(f"storeSubscr({arr}, {idx}, {self._pop()})")
+        return False
+
+
+    def _translate_CALL_FUNCTION(self, arg: int) -> bool:
+        args: List[str] = self._popN(self._vm._code_obj.getFromFP(arg).argc)
+        self._pushTemp(f"invoke({', '.join([str(arg)] + args)})")
+        return False
+
+    def _translate_CALL_NATIVE(self, arg: int) -> bool:
+        fnName: str = builtinFunctionIndex[arg]
+        self._namespace[f"native_{fnName}"] = builtinFunctionTable[fnName]
+        args: List[str] = self._popN(builtinFunctionInfo[fnName][1])
+        self._pushTemp(f"native_{fnName}([{', '.join(args)}])")
+        return False
+
+    def _translate_RETURN_VALUE(self, arg: int) -> bool:
+        self._emit(f"return {self._pop()}")
+        return True
+
+    # a tail call of the function itself becomes a jump to its start
+    def _translate_TAIL_CALL(self, arg: int) -> bool:
+        args: List[str] = self._popN(self._vm._code_obj.getFromFP(arg).argc)
+
+        if arg != self._idx:
+            self._emit(f"return invoke({', '.join([str(arg)] + args)})")
+            return True
+
+        if len(args) > 0:
+            self._emit(f"{', '.join(f'l{i}' for i in range(len(args)))} = {', '.join(args)}")
+        for i in range(self._fn.argc, self._fn.localc):
+            self._emit(f"l{i} = NIL")
+        self._jump(0)
+        return True
+
+
+#
+# Decides when functions are compiled and keeps the results for the
+#   --stats report
+#
+class JIT:
+    def __init__(self, vm, threshold: int = JIT_THRESHOLD) -> None:
+        self._vm = vm
+        self.threshold: int = threshold
+
+        # function index -> why it was not compiled
+        self._failed: Dict[int, str] = dict()
+
+
+    # compile function idx, returns False if it has to stay interpreted
+    def compile(self, idx: int) -> bool:
+        fnInfo: func_info = self._vm._code_obj.getFromFP(idx)
+
+        try:
+            fnInfo.jitted = FunctionTranslator(self._vm, idx).translate()
+        except JITUnsupported as e:
+            self._failed[idx] = str(e)
+            return False
+
+        return True
+
+
+    def report(self) -> str:
+        names: List[str] = self._vm._fnNames
+        pool: List[func_info] = self._vm._code_obj.func_pool
+
+        compiled: int = sum(1 for f in pool if f.jitted != None)
+        output: str = f"JIT: {compiled} of {len(pool) - 1} functions compiled (threshold {self.threshold})\n"
+
+        # main is never called, so it is never compiled
+        for idx, f in enumerate(pool[1:], 1):
+            counts: str = f"{f.calls} calls, {f.backJumps} backward jumps"
+
+            if f.jitted != None:
+                status = "compiled"
+            elif idx in self._failed:
+                status = f"interpreted, {self._failed[idx]}"
+            else:
+                status = "interpreted, not hot"
+
+            output += f"  {names[idx]:<16}{status} ({counts})\n"
+
+        return output
@@ -0,0 +1,447 @@
+from typing import Any, Callable, List, Tuple
+
+from .code.code import RegisterCode, reg_func_info, Tag
+
+from ..types import LObject, Number, Nil, Array, Boolean, String, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
+from ..stdlib import builtinFunctionIndex, builtinFunctionTable, builtinFunctionInfo
+from ..error import TypeErr, ZeroDivErr, IndexErr
+
+
+Instruction = Tuple[Callable[[Any, Any, Any, int], int], Any, Any, Any]
+
+
+#
+# Register based variant of VirtualMachine, runs the code generated by
+#   RegisterCompiler. Operands name registers of the current frame directly,
+#   so most statements take a single instruction instead of a sequence of
+#   pushes and pops.
+#
+class RegisterVirtualMachine:
+    def __init__(self, code: RegisterCode) -> None:
+        self._code_obj: RegisterCode = code
+
+        self._constants: List[LObject] = self._makeConstants()
+        self._functions: List[List[Instruction]] = [self._link(f) for f in code.func_pool]
+
+        # (code, return address, registers, destination register) of the callers
+        self._call_stack: List[Tuple[List[Instruction], int, List[LObject], int]] = []
+
+        self._code: List[Instruction] = []
+        self._regs: List[LObject] = []
+        self._globals: List[LObject] = []
+
+
+    # build the runtime objects for the constant pool once
+    def _makeConstants(self) -> List[LObject]:
+        constants: List[LObject] = []
+
+        for c in self._code_obj.const_pool:
+            if c.tag == Tag.CONSTANT_String:
+                constants.append(String(c.info))
+            else:
+                constants.append(makeNumber(c.info))
+
+        return constants
+
+
+    # replace the instruction names with their handlers
+    def _link(self, f: reg_func_info) -> List[Instruction]:
+        return [
+            (getattr(self, f"execute_{name}", self._insNotImplemented), a, b, c)
+            for name, a, b, c in f.code
+        ]
+
+
+    def _newRegisters(self, f: reg_func_info) -> List[LObject]:
+        return [NIL] * max(f.regc, 1)
+
+
+    def _init_vm(self) -> None:
+        main: reg_func_info = self._code_obj.func_pool[0]
+        self._code = self._functions[0]
+        self._regs = self._newRegisters(main)
+        self._globals = self._regs
+
+
+    def run(self) -> None:
+        self._init_vm()
+
+        ip: int = 0
+
+        # END returns -1
+        while ip >= 0:
+            fn, a, b, c = self._code[ip]
+            ip = fn(a, b, c, ip)
+
+
+    def _getObjType(self, el: LObject) -> str:
+        return type(el).__name__
+
+
+    def _checkIndex(self, arr: LObject, idx: LObject) -> None:
+        if idx.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Array indices must be integers, not '{type(idx).__name__}'")
+
+        if type(idx.value) is float:
+            raise TypeErr(f"Array indices must be integers, not float")
+
+        if arr.tag != TypeTag.ARRAY:
+            raise TypeErr(f"Type '{type(arr).__name__}' is not subscriptable")
+
+        if arr.getEL(idx.value) == None:
+            raise IndexErr()
+
+
+    def _insNotImplemented(self, a: Any, b: Any, c: Any, ip: int) -> int:
+        raise Exception(f"handler for instruction {ip} not implemented.")
+
+
+    def execute_END(self, a: Any, b: Any, c: Any, ip: int) -> int:
+        return -1
+
+
+    def execute_LOADK(self, a: int, b: int, c: Any, ip: int) -> int:
+        self._regs[a] = self._constants[b]
+        return ip + 1
+
+
+    def execute_LOADNIL(self, a: int, b: Any, c: Any, ip: int) -> int:
+        self._regs[a] = NIL
+        return ip + 1
+
+
+    def execute_LOADTRUE(self, a: int, b: Any, c: Any, ip: int) -> int:
+        self._regs[a] = TRUE
+        return ip + 1
+
+
+    def execute_LOADFALSE(self, a: int, b: Any, c: Any, ip: int) -> int:
+        self._regs[a] = FALSE
+        return ip + 1
+
+
+    def execute_MOVE(self, a: int, b: int, c: Any, ip: int) -> int:
+        self._regs[a] = self._regs[b]
+        return ip + 1
+
+
+    def execute_GETGLOBAL(self, a: int, b: int, c: Any, ip: int) -> int:
+        self._regs[a] = self._globals[b]
+        return ip + 1
+
+
+    def execute_SETGLOBAL(self, a: int, b: int, c: Any, ip: int) -> int:
+        self._globals[a] = self._regs[b]
+        return ip + 1
+
+
+    def execute_ADD(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+
+        # string concat for '+'
+        if l.tag == TypeTag.STRING:
+            if r.tag != TypeTag.STRING:
+                raise TypeErr(f"Cannot add {self._getObjType(r)} to String")
+            regs[a] = String(l.value + r.value)
+
+        elif l.tag == TypeTag.NUMBER:
+            if r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Cannot add {self._getObjType(r)} to Number")
+            regs[a] = makeNumber(l.value + r.value)
+
+        else:
+            raise TypeErr(f"Addition not defined for type '{self._getObjType(l)}'")
+
+        return ip + 1
+
+
+    def execute_SUB(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Cannot subtract {self._getObjType(r)} from {self._getObjType(l)}")
+        regs[a] = makeNumber(l.value - r.value)
+        return ip + 1
+
+
+    def execute_MUL(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Cannot multiply {self._getObjType(l)} by {self._getObjType(r)}")
+        regs[a] = makeNumber(l.value * r.value)
+        return ip + 1
+
+
+    def execute_DIV(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Cannot divide {self._getObjType(l)} by {self._getObjType(r)}")
+
+        if r.value == 0:
+            raise ZeroDivErr()
+
+        regs[a] = makeNumber(l.value / r.value)
+        return ip + 1
+
+
+    def execute_MOD(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for modulo: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if r.value == 0:
+            raise ZeroDivErr()
+
+        regs[a] = makeNumber(l.value % r.value)
+        return ip + 1
+
+
+    def execute_AND(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        if isTruthy(regs[b]) and isTruthy(regs[c]):
+            regs[a] = TRUE
+        else:
+            regs[a] = FALSE
+        return ip + 1
+
+
+    def execute_OR(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        if isTruthy(regs[b]) or isTruthy(regs[c]):
+            regs[a] = TRUE
+        else:
+            regs[a] = FALSE
+        return ip + 1
+
+
+    def execute_NOT(self, a: int, b: int, c: Any, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        regs[a] = FALSE if isTruthy(regs[b]) else TRUE
+        return ip + 1
+
+
+    def execute_NEG(self, a: int, b: int, c: Any, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        op: LObject = regs[b]
+
+        if op.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Cannot negate {self._getObjType(op)}")
+
+        regs[a] = makeNumber(-(op.value))
+        return ip + 1
+
+
+    def execute_EQ(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        regs[a] = TRUE if valuesEqual(regs[b], regs[c]) else FALSE
+        return ip + 1
+
+
+    def execute_NE(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        regs[a] = FALSE if valuesEqual(regs[b], regs[c]) else TRUE
+        return ip + 1
+
+
+    def execute_GT(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+        regs[a] = TRUE if l.value > r.value else FALSE
+        return ip + 1
+
+
+    def execute_LT(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+        regs[a] = TRUE if l.value < r.value else FALSE
+        return ip + 1
+
+
+    def execute_GE(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+        regs[a] = TRUE if l.value >= r.value else FALSE
+        return ip + 1
+
+
+    def execute_LE(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        l: LObject = regs[b]
+        r: LObject = regs[c]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+        regs[a] = TRUE if l.value <= r.value else FALSE
+        return ip + 1
+
+
+    def execute_JMP(self, a: int, b: Any, c: Any, ip: int) -> int:
+        return a
+
+
+    def execute_JMPIF(self, a: int, b: int, c: Any, ip: int) -> int:
+        if isTruthy(self._regs[a]):
+            return b
+        return ip + 1
+
+
+    def execute_JMPIFNOT(self, a: int, b: int, c: Any, ip: int) -> int:
+        if not isTruthy(self._regs[a]):
+            return b
+        return ip + 1
+
+
+    # compare and branch, JMPIFNOT<cmp> left, right, target
+
+    def execute_JMPIFNOTEQ(self, a: int, b: int, c: int, ip: int) -> int:
+        if valuesEqual(self._regs[a], self._regs[b]):
+            return ip + 1
+        return c
+
+
+    def execute_JMPIFNOTNE(self, a: int, b: int, c: int, ip: int) -> int:
+        if not valuesEqual(self._regs[a], self._regs[b]):
+            return ip + 1
+        return c
+
+
+    def execute_JMPIFNOTGT(self, a: int, b: int, c: int, ip: int) -> int:
+        l: LObject = self._regs[a]
+        r: LObject = self._regs[b]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value > r.value:
+            return ip + 1
+        return c
+
+
+    def execute_JMPIFNOTLT(self, a: int, b: int, c: int, ip: int) -> int:
+        l: LObject = self._regs[a]
+        r: LObject = self._regs[b]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value < r.value:
+            return ip + 1
+        return c
+
+
+    def execute_JMPIFNOTGE(self, a: int, b: int, c: int, ip: int) -> int:
+        l: LObject = self._regs[a]
+        r: LObject = self._regs[b]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value >= r.value:
+            return ip + 1
+        return c
+
+
+    def execute_JMPIFNOTLE(self, a: int, b: int, c: int, ip: int) -> int:
+        l: LObject = self._regs[a]
+        r: LObject = self._regs[b]
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value <= r.value:
+            return ip + 1
+        return c
+
+
+    # NEWLIST dst, first element, number of elements
+    def execute_NEWLIST(self, a: int, b: int, c: int, ip: int) -> int:
+        arrObj: Array = Array()
+        for e in self._regs[b:b + c]:
+            arrObj.addEl(e)
+
+        self._regs[a] = arrObj
+        return ip + 1
+
+
+    # GETINDEX dst, array, index
+    def execute_GETINDEX(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        arr: Array = regs[b]
+        idx: Number = regs[c]
+
+        self._checkIndex(arr, idx)
+
+        regs[a] = arr.getEL(idx.value)
+        return ip + 1
+
+
+    # SETINDEX array, index, value
+    def execute_SETINDEX(self, a: int, b: int, c: int, ip: int) -> int:
+        regs: List[LObject] = self._regs
+        arr: Array = regs[a]
+        idx: Number = regs[b]
+
+        self._checkIndex(arr, idx)
+
+        arr.setEL(regs[c], idx.value)
+        return ip + 1
+
+
+    # CALL dst, function, first argument
+    def execute_CALL(self, a: int, b: int, c: int, ip: int) -> int:
+        fnInfo: reg_func_info = self._code_obj.func_pool[b]
+
+        regs: List[LObject] = self._newRegisters(fnInfo)
+        regs[:fnInfo.argc] = self._regs[c:c + fnInfo.argc]
+
+        self._call_stack.append((self._code, ip + 1, self._regs, a))
+
+        self._code = self._functions[b]
+        self._regs = regs
+        return 0
+
+
+    # TAILCALL function, first argument: call and return its value, the
+    #   callee returns straight to the caller of the current function
+    def execute_TAILCALL(self, a: int, b: int, c: Any, ip: int) -> int:
+        fnInfo: reg_func_info = self._code_obj.func_pool[a]
+
+        regs: List[LObject] = self._newRegisters(fnInfo)
+        regs[:fnInfo.argc] = self._regs[b:b + fnInfo.argc]
+
+        self._code = self._functions[a]
+        self._regs = regs
+        return 0
+
+
+    # CALLNATIVE dst, builtin function, first argument
+    def execute_CALLNATIVE(self, a: int, b: int, c: int, ip: int) -> int:
+        fnName = builtinFunctionIndex[b]
+        argc: int = builtinFunctionInfo[fnName][1]
+
+        self._regs[a] = builtinFunctionTable[fnName](self._regs[c:c + argc])
+        return ip + 1
+
+
+    def execute_RETURN(self, a: int, b: Any, c: Any, ip: int) -> int:
+        # return at the top level is ignored, like in VirtualMachine
+        if len(self._call_stack) == 0:
+            return ip + 1
+
+        retVal: LObject = self._regs[a]
+        self._code, retAddr, self._regs, dst = self._call_stack.pop()
+        self._regs[dst] = retVal
+        return retAddr
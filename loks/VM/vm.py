@@ -1,491 +1,1280 @@
-from typing import List
+from typing import Callable, Dict, List, Tuple, Union
 
 from .code.codeBuilder import CodeBuilder
 from .code.code import Code, func_info, cp_info, Tag
+from .code.mappedCode import MappedCode
+from .jit import JIT, JIT_MAX_DEPTH
 from ..instruction import opcode, opcodeDict
-from .stack.frame import Frame
-from .stack.stack import Stack
 
-from ..types import LObject, Number, Nil, Array, Boolean, String
+from ..types import LObject, Number, Nil, Array, Boolean, String, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
 from ..stdlib import builtinFunctionIndex, builtinFunctionTable, builtinFunctionInfo
 from ..error import TypeErr, ZeroDivErr, IndexErr, SyntaxErr
 
 
+Instruction = Tuple[Callable[[int, int], int], int]
+
+
+#
+# Quickening: the first time an arithmetic or comparison instruction runs,
+#   it looks at the type tags of its operands and rewrites itself in the
+#   instructions of its function to a version specialized for them, which
+#   only checks the tags before doing the operation. When that check fails
+#   the instruction is rewritten back to the generic handler for good, so an
+#   instruction that sees several types doesn't flip between versions.
+# The quickened instructions have no opcode, they only exist in
+#   func_info.instructions.
+#
+# opcode name -> (left tag, right tag) -> quickened instruction
+quickenings: Dict[str, Dict[Tuple[int, int], str]] = {
+    "BINARY_ADD": {
+        (TypeTag.NUMBER, TypeTag.NUMBER): "BINARY_ADD_NUM",
+        (TypeTag.STRING, TypeTag.STRING): "BINARY_ADD_STR",
+    },
+    "ADD_LOCALS": {
+        (TypeTag.NUMBER, TypeTag.NUMBER): "ADD_LOCALS_NUM",
+        (TypeTag.STRING, TypeTag.STRING): "ADD_LOCALS_STR",
+    },
+}
+
+for _op in ["BINARY_SUBTRACT", "BINARY_MULTIPLY", "BINARY_DIVIDE", "BINARY_MODULO",
+            "CMPEQ", "CMPNE", "CMPGT", "CMPLT", "CMPGE", "CMPLE",
+            "JMP_IF_NOT_EQ", "JMP_IF_NOT_NE", "JMP_IF_NOT_GT",
+            "JMP_IF_NOT_LT", "JMP_IF_NOT_GE", "JMP_IF_NOT_LE"]:
+    quickenings[_op] = {(TypeTag.NUMBER, TypeTag.NUMBER): f"{_op}_NUM"}
+
+
 class VirtualMachine:
-    def __init__(self, code: List[int]) -> None:
-        self._code_obj: Code = CodeBuilder(code).getCodeObj()
+    # code: bytecode, or a Code object built by the BytecodeBuilder in loks/assembler/builder.py,
+    #   or a MappedCode, whose functions are then loaded on their first call
+    # jit: compile hot functions to python, see loks/VM/jit.py
+    # fnNames: function names by index, only used in the JIT report
+    # quicken: specialize instructions to the types they see, see quickenings above
+    def __init__(self, code: Union[List[int], Code], jit: bool = False, fnNames: List[str] = None, quicken: bool = True) -> None:
+        # number of instructions rewritten to a quickened one, and back
+        self.quickenedCount: int = 0
+        self.dequickenedCount: int = 0
+
+        # handler for every opcode, indexed by the opcode byte
+        self._dispatch: List[Callable[[int, int], int]] = self._makeDispatchTable(quicken)
+
+        if isinstance(code, Code):
+            self._code_obj: Code = code
+        else:
+            self._code_obj: Code = CodeBuilder(code).getCodeObj()
+
+        # runtime objects for the constant pool, made when a function that loads them is loaded
+        self._constants: List[LObject] = [None] * len(self._code_obj.const_pool)
+
+        #
+        # Every value lives on one contiguous stack. A call's frame is a window
+        #   of that stack starting at the base pointer _bp: its locals, with
+        #   the arguments as the first ones, followed by its operand stack.
+        #   The operand stack of a frame always ends at the top of the stack.
+        # main's frame starts at 0, so its locals (the globals) are the first
+        #   values of the stack.
+        #
+        self._stack: List[LObject] = []
+        self._bp: int = 0
+
+        self._code: List[Instruction] = []
+
+        # (code, return address, base pointer) of the callers
+        self._call_stack: List[Tuple[List[Instruction], int, int]] = []
+
+        # Nil for every local that is not an argument, per function
+        self._nils: List[Tuple[LObject, ...]] = [
+            (NIL,) * (f.localc - f.argc) for f in self._code_obj.func_pool
+        ]
 
-        self._cur_frame: Frame = Frame()
-        self._main_frame: Frame = Frame("main")
+        self._fnNames: List[str] = fnNames or [f"fn{i}" for i in range(len(self._code_obj.func_pool))]
 
-        self._call_stack: Stack = Stack()
-        self._ip: int = -1
-        self._cur_ins: int = None
+        # number of compiled functions on the python stack
+        self._jitDepth: int = 0
+
+        self._jit: JIT = None
+        if jit:
+            self._jit = JIT(self)
+
+        if isinstance(self._code_obj, MappedCode):
+            self._code_obj.onLoad = self._loadFunction
+        else:
+            for idx, f in enumerate(self._code_obj.func_pool):
+                self._loadFunction(idx, f)
 
         self._LOG: bool = False
 
 
-    def _advance(self, advance_by=1) -> int:
-        self._ip += advance_by
-        self._cur_ins = self._cur_frame.getInsAtIndex(self._ip)
-        return self._cur_ins
+    #
+    # Resolves the handler for each opcode once. Every handler takes the decoded
+    #   operand of its instruction and the index of the instruction in the code
+    #   of the current function, and returns the index of the next instruction
+    #   to execute.
+    #
+    def _makeDispatchTable(self, quicken: bool) -> List[Callable[[int, int], int]]:
+        table: List[Callable[[int, int], int]] = [self._insNotImplemented] * 256
 
-    # jump to index 'idx' of the code of currrent executing function
-    def _goto(self, idx: int) -> None:
-        self._ip = idx
-        self._cur_ins = self._cur_frame.getInsAtIndex(self._ip)
+        for value, name in opcodeDict.items():
+            table[value] = getattr(self, f"execute_{name}", self._insNotImplemented)
 
+            if quicken and name in quickenings:
+                table[value] = self._makeQuickening(name)
 
-    def _pushFrame(self, f: Frame) -> None:
-        self._call_stack.push(f)
+        return table
 
 
-    def _popFrame(self) -> Frame:
-        return self._call_stack.pop()
+    #
+    # Handler that runs an instruction for the first time: it picks the
+    #   quickened version for the types of the operands, or the generic
+    #   handler if there is none, stores it in place of itself and runs it.
+    #
+    def _makeQuickening(self, name: str) -> Callable[[int, int], int]:
+        generic: Callable[[int, int], int] = getattr(self, f"execute_{name}")
+        specialized: Dict[Tuple[int, int], Callable[[int, int], int]] = {
+            tags: getattr(self, f"execute_{q}") for tags, q in quickenings[name].items()
+        }
 
+        # ADD_LOCALS adds two locals, the other instructions the top of the stack
+        localOperands: bool = name == "ADD_LOCALS"
 
-    def _init_vm(self) -> None:
-        main: func_info = self._code_obj.getFromFP(0)
-        self._main_frame.setCode(main.code)
-        self._cur_frame = self._main_frame
-        self._advance()
+        def quicken(arg, ip: int) -> int:
+            stack: List[LObject] = self._stack
+            if localOperands:
+                tags = (stack[self._bp + arg[0]].tag, stack[self._bp + arg[1]].tag)
+            else:
+                tags = (stack[-2].tag, stack[-1].tag)
 
+            handler: Callable[[int, int], int] = specialized.get(tags, generic)
+            if handler is not generic:
+                self.quickenedCount += 1
 
-    def run(self):
-        self._init_vm()
+            self._code[ip] = (handler, arg)
+            return handler(arg, ip)
 
-        while self._cur_ins != opcode.END.value:
-            i = self._cur_ins
-            self.execute(i)
-            if i not in [
-                opcode.GOTO.value,
-                opcode.POP_JMP_IF_TRUE.value,
-                opcode.POP_JMP_IF_FALSE.value,
-            ]:
-                self._advance()
+        return quicken
 
 
-    def _getObjType(self, el: LObject) -> str:
-        return type(el).__name__
+    # the guard of a quickened instruction failed, fall back to the generic handler
+    def _dequicken(self, generic: Callable[[int, int], int], arg: int, ip: int) -> int:
+        self.dequickenedCount += 1
+        self._code[ip] = (generic, arg)
+        return generic(arg, ip)
+
+
+    def getQuickeningReport(self) -> str:
+        return f"quickening: {self.quickenedCount} instructions quickened, {self.dequickenedCount} de-quickened\n"
+
+
+    #
+    # Fills in the instructions of function idx with the handlers, and
+    #   builds the runtime objects of the constants it loads, once.
+    #
+    def _loadFunction(self, idx: int, f: func_info) -> None:
+        f.instructions = [(self._dispatch[op], arg) for op, arg in f.ops]
+
+        for op, arg in f.ops:
+            if op == opcode.LOAD_CONST.value and self._constants[arg] == None:
+                c: cp_info = self._code_obj.getFromCP(arg)
+                if c.tag == Tag.CONSTANT_String:
+                    self._constants[arg] = String(c.info)
+                else:
+                    self._constants[arg] = makeNumber(c.info)
+
+        if self._jit != None:
+            self._installJIT(idx, f)
+
+
+    #
+    # Tiered execution: functions start out interpreted and are compiled once
+    #   their calls plus backward jumps reach the JIT threshold. A function is
+    #   only entered in compiled form on its next call, there is no on stack
+    #   replacement of a running frame.
+    # Calls, tail calls and backward jumps are swapped for the counting
+    #   handlers below, so the interpreter pays nothing when the JIT is off.
+    #
+    def _installJIT(self, idx: int, f: func_info) -> None:
+        for i, (op, arg) in enumerate(f.ops):
+            if op == opcode.GOTO.value and arg <= i:
+                f.instructions[i] = (self._jitBackJump, (arg, idx))
+            elif op == opcode.CALL_FUNCTION.value:
+                f.instructions[i] = (self._jitCallFunction, arg)
+            elif op == opcode.TAIL_CALL.value:
+                f.instructions[i] = (self._jitTailCall, arg)
+
+
+    def getJITReport(self) -> str:
+        if self._jit == None:
+            return "JIT: disabled\n"
+        return self._jit.report()
+
+
+    # counts a call of function idx, returns its compiled code if it can be used
+    def _jitEnter(self, idx: int) -> Callable[..., LObject]:
+        fnInfo: func_info = self._code_obj.getFromFP(idx)
+        fnInfo.calls += 1
+
+        if fnInfo.jitted == None and fnInfo.calls + fnInfo.backJumps >= self._jit.threshold:
+            self._jit.compile(idx)
+
+        if self._jitDepth < JIT_MAX_DEPTH:
+            return fnInfo.jitted
+        return None
+
+
+    def _jitBackJump(self, arg: Tuple[int, int], ip: int) -> int:
+        self._code_obj.getFromFP(arg[1]).backJumps += 1
+        return arg[0]
 
 
-    def _isTruthy(self, obj: LObject) -> bool:
-        if self._getObjType(obj) == "Number":
-            if obj.value == 0:
-                return False
-            return True
+    # pops the arguments of function idx off the operand stack and runs its compiled code
+    def _jitRun(self, jitted: Callable[..., LObject], idx: int) -> LObject:
+        stack: List[LObject] = self._stack
+        start: int = len(stack) - self._code_obj.getFromFP(idx).argc
 
-        elif self._getObjType(obj) == "String":
-            if len(obj.value) == 0:
-                return False
-            return True
+        args: List[LObject] = stack[start:]
+        del stack[start:]
 
-        elif self._getObjType(obj) == "Nil":
-            return False
+        self._jitDepth += 1
+        retVal: LObject = jitted(*args)
+        self._jitDepth -= 1
+        return retVal
 
-        elif self._getObjType(obj) == "Boolean":
-            if obj.value == "false":
-                return False
-            return True
 
-        elif self._getObjType(obj) == "Array":
-            if obj.getLen() == 0:
-                return False
-            return True
+    def _jitCallFunction(self, arg: int, ip: int) -> int:
+        jitted: Callable[..., LObject] = self._jitEnter(arg)
+        if jitted == None:
+            return self.execute_CALL_FUNCTION(arg, ip)
 
-        return True
+        self._stack.append(self._jitRun(jitted, arg))
+        return ip + 1
 
 
-    def execute(self, i: int) -> None:
-        fn_name = f"execute_{opcodeDict[i]}"
-        fn = getattr(self, fn_name, self._insNotImplemented)
-        fn(i)
+    def _jitTailCall(self, arg: int, ip: int) -> int:
+        jitted: Callable[..., LObject] = self._jitEnter(arg)
+        if jitted == None:
+            return self.execute_TAIL_CALL(arg, ip)
 
-    def _insNotImplemented(self, i: int) ->  None:
-        raise Exception(f"execute_{opcodeDict[i]} method not implemented.")
+        self._stack.append(self._jitRun(jitted, arg))
+        return self.execute_RETURN_VALUE(0, ip)
 
 
-    def execute_LOAD_NIL(self, i: int) -> None:
-        self._cur_frame.pushOpStack(Nil())
+    #
+    # Calls function idx from compiled code. Interpreted functions run in a
+    #   nested dispatch loop that ends when they return, the return address -1
+    #   stops it.
+    #
+    def _invoke(self, idx: int, *args: LObject) -> LObject:
+        jitted: Callable[..., LObject] = self._jitEnter(idx)
+        if jitted != None:
+            self._jitDepth += 1
+            retVal: LObject = jitted(*args)
+            self._jitDepth -= 1
+            return retVal
 
+        stack: List[LObject] = self._stack
+        self._call_stack.append((self._code, -1, self._bp))
 
-    def execute_LOAD_TRUE(self, i: int) -> None:
-        self._cur_frame.pushOpStack(Boolean("true"))
+        self._bp = len(stack)
+        stack.extend(args)
+        stack.extend(self._nils[idx])
+        self._code = self._code_obj.getFromFP(idx).instructions
 
+        ip: int = 0
+        while ip >= 0:
+            fn, arg = self._code[ip]
+            ip = fn(arg, ip)
 
-    def execute_LOAD_FALSE(self, i: int) -> None:
-        self._cur_frame.pushOpStack(Boolean("false"))
+        return stack.pop()
 
 
-    def execute_LOAD_CONST(self, i: int) -> None:
-        idx: int = (self._advance() << 8) + self._advance()
-        constObj: cp_info = self._code_obj.getFromCP(idx)
+    def _init_vm(self) -> None:
+        main: func_info = self._code_obj.getFromFP(0)
+        self._code = main.instructions
+        self._stack = [NIL] * main.localc
+        self._bp = 0
+        self._call_stack = []
+
+
+    def run(self) -> None:
+        self._init_vm()
+
+        ip: int = 0
+
+        # END returns -1
+        while ip >= 0:
+            fn, arg = self._code[ip]
+            ip = fn(arg, ip)
+
+
+    def _getObjType(self, el: LObject) -> str:
+        return type(el).__name__
+
+
+    def _insNotImplemented(self, arg: int, ip: int) -> int:
+        raise Exception(f"handler for instruction {ip} not implemented.")
+
+
+    def execute_END(self, arg: int, ip: int) -> int:
+        return -1
+
 
-        if constObj.tag == Tag.CONSTANT_String:
-            self._cur_frame.pushOpStack(String(constObj.info))
-            
-        elif constObj.tag == Tag.CONSTANT_Integer:
-            self._cur_frame.pushOpStack(Number(constObj.info))
-            
-        elif constObj.tag == Tag.CONSTANT_Double:
-            self._cur_frame.pushOpStack(Number(constObj.info))
+    def execute_LOAD_NIL(self, arg: int, ip: int) -> int:
+        self._stack.append(NIL)
+        return ip + 1
 
 
-    def execute_BINARY_ADD(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_LOAD_TRUE(self, arg: int, ip: int) -> int:
+        self._stack.append(TRUE)
+        return ip + 1
 
+
+    def execute_LOAD_FALSE(self, arg: int, ip: int) -> int:
+        self._stack.append(FALSE)
+        return ip + 1
+
+
+    def execute_POP_TOP(self, arg: int, ip: int) -> int:
+        self._stack.pop()
+        return ip + 1
+
+
+    def execute_LOAD_CONST(self, arg: int, ip: int) -> int:
+        self._stack.append(self._constants[arg])
+        return ip + 1
+
+
+    # '+' for numbers and strings
+    def _add(self, l: LObject, r: LObject) -> LObject:
         # string concat for '+'
-        if self._getObjType(l) == "String":
-            if self._getObjType(r) != "String":
+        if l.tag == TypeTag.STRING:
+            if r.tag != TypeTag.STRING:
                 raise TypeErr(f"Cannot add {self._getObjType(r)} to String")
-            self._cur_frame.pushOpStack(String(l.value + r.value))
+            return String(l.value + r.value)
 
         # check type for numbers
-        elif self._getObjType(l) == "Number":
-            if self._getObjType(r) != "Number":
+        elif l.tag == TypeTag.NUMBER:
+            if r.tag != TypeTag.NUMBER:
                 raise TypeErr(f"Cannot add {self._getObjType(r)} to Number")
-            self._cur_frame.pushOpStack(Number(l.value + r.value))
+            return makeNumber(l.value + r.value)
         
         # addition is not defined for any other type
         else:
             raise TypeErr(f"Addition not defined for type '{self._getObjType(l)}'")
 
 
+    def execute_BINARY_ADD(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        stack.append(self._add(l, r))
+
         if self._LOG: print(f"add {l.value}, {r.value}")
+        return ip + 1
 
     
-    def execute_BINARY_SUBTRACT(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_SUBTRACT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot subtract {self._getObjType(r)} from {self._getObjType(l)}")
 
-        self._cur_frame.pushOpStack(Number(l.value - r.value))
+        stack.append(makeNumber(l.value - r.value))
 
         if self._LOG: print(f"sub {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_BINARY_MULTIPLY(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_MULTIPLY(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot multiply {self._getObjType(l)} by {self._getObjType(r)}")
 
-        self._cur_frame.pushOpStack(Number(l.value * r.value))
+        stack.append(makeNumber(l.value * r.value))
 
         if self._LOG: print(f"mul {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_BINARY_DIVIDE(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_DIVIDE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot divide {self._getObjType(l)} by {self._getObjType(r)}")
 
         # division by zero
         if r.value == 0:
             raise ZeroDivErr()
 
-        self._cur_frame.pushOpStack(Number(l.value / r.value))
+        stack.append(makeNumber(l.value / r.value))
 
         if self._LOG: print(f"div {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_BINARY_MODULO(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_MODULO(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for modulo: {self._getObjType(l)} and {self._getObjType(r)}")
 
         # division by zero
         if r.value == 0:
             raise ZeroDivErr()
 
-        self._cur_frame.pushOpStack(Number(l.value % r.value))
+        stack.append(makeNumber(l.value % r.value))
 
         if self._LOG: print(f"mod {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_BINARY_AND(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_AND(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
         if self._LOG: print(f"and {l.value}, {r.value}")
         
-        if not self._isTruthy(l):
-            self._cur_frame.pushOpStack(Boolean("false"))
-            return
-        
-        if not self._isTruthy(r):
-            self._cur_frame.pushOpStack(Boolean("false"))
-            return
-            
-        self._cur_frame.pushOpStack(Boolean("true"))
+        if not isTruthy(l) or not isTruthy(r):
+            stack.append(FALSE)
+        else:
+            stack.append(TRUE)
+
+        return ip + 1
 
 
-    def execute_BINARY_OR(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_BINARY_OR(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._isTruthy(l):
-            self._cur_frame.pushOpStack(Boolean("true"))
-        elif self._isTruthy(r):
-            self._cur_frame.pushOpStack(Boolean("true"))
+        if isTruthy(l) or isTruthy(r):
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"or {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_UNARY_NOT(self, i: int) -> None:
-        op: LObject = self._cur_frame.popOpStack()
-        if self._isTruthy(op):
-            self._cur_frame.pushOpStack(Boolean("false"))
+    def execute_UNARY_NOT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        if isTruthy(stack.pop()):
+            stack.append(FALSE)
         else:
-            self._cur_frame.pushOpStack(Boolean("true"))
+            stack.append(TRUE)
+        return ip + 1
 
 
-    def execute_UNARY_NEGATIVE(self, i: int) -> None:
-        op: LObject = self._cur_frame.popOpStack()
+    def execute_UNARY_NEGATIVE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        op: LObject = stack.pop()
         
-        if not self._getObjType(op) == "Number":
+        if not op.tag == TypeTag.NUMBER:
             raise TypeErr(f"Cannot negate {self._getObjType(op)}")
 
-        self._cur_frame.pushOpStack(Number(-(op.value)))
+        stack.append(makeNumber(-(op.value)))
+        return ip + 1
 
 
-    def execute_STORE_LOCAL(self, i: int) -> None:
-        self._cur_frame.setLocalVarAtIndex(
-            self._advance(),
-            self._cur_frame.popOpStack()
-        )
+    def execute_STORE_LOCAL(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        stack[self._bp + arg] = stack.pop()
+        return ip + 1
 
 
-    def execute_STORE_GLOBAL(self, i: int) -> None:
-        self._main_frame.setLocalVarAtIndex(
-            self._advance(),
-            self._cur_frame.popOpStack()
-        )
+    def execute_STORE_GLOBAL(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        stack[arg] = stack.pop()
+        return ip + 1
 
 
-    def execute_BIPUSH(self, i: int) -> None:
-        self._cur_frame.pushOpStack(Number(self._advance()))
+    def execute_BIPUSH(self, arg: int, ip: int) -> int:
+        self._stack.append(makeNumber(arg))
+        return ip + 1
 
 
-    def execute_LOAD_LOCAL(self, i: int) -> None:
-        self._cur_frame.pushOpStack(self._cur_frame.getLocalVarAtIndex(self._advance()))
+    def execute_LOAD_LOCAL(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        stack.append(stack[self._bp + arg])
+        return ip + 1
 
 
-    def execute_LOAD_GLOBAL(self, i: int) -> None:
-        self._cur_frame.pushOpStack(self._main_frame.getLocalVarAtIndex(self._advance()))
+    def execute_LOAD_GLOBAL(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        stack.append(stack[arg])
+        return ip + 1
 
 
-    def execute_CMPEQ(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPEQ(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if l.value == r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+        if valuesEqual(l, r):
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmpeq {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_CMPNE(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPNE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if l.value != r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+        if not valuesEqual(l, r):
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmpne {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_CMPGT(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPGT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for greater than operator: {self._getObjType(l)} and {self._getObjType(r)}")
 
         if l.value > r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmpgt {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_CMPLT(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPLT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for less than operator: {self._getObjType(l)} and {self._getObjType(r)}")
         
         if l.value < r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmplt {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_CMPGE(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPGE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for greater than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
 
         if l.value >= r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmpge {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_CMPLE(self, i: int) -> None:
-        r: LObject = self._cur_frame.popOpStack()
-        l: LObject = self._cur_frame.popOpStack()
+    def execute_CMPLE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
 
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for less than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
 
         if l.value <= r.value:
-            self._cur_frame.pushOpStack(Boolean("true"))
+            stack.append(TRUE)
         else:
-            self._cur_frame.pushOpStack(Boolean("false"))
+            stack.append(FALSE)
 
         if self._LOG: print(f"cmple {l.value}, {r.value}")
+        return ip + 1
 
 
-    def execute_GOTO(self, i: int) -> None:
-        loc: int = (self._advance() << 8) + self._advance()
-        self._goto(loc)
+    # jumps return the target index, so the run loop doesn't have to
+    #   special case them
+    def execute_GOTO(self, arg: int, ip: int) -> int:
+        return arg
 
 
-    def execute_POP_JMP_IF_TRUE(self, i: int) -> None:
-        idx: int = (self._advance() << 8) + self._advance()
-        if self._isTruthy(self._cur_frame.popOpStack()):
-            self._goto(idx)
-        else:
-            self._advance() # consume second arg
+    def execute_POP_JMP_IF_TRUE(self, arg: int, ip: int) -> int:
+        if isTruthy(self._stack.pop()):
+            return arg
+        return ip + 1
 
 
-    def execute_POP_JMP_IF_FALSE(self, i: int) -> None:
-        idx: int = (self._advance() << 8) + self._advance()
-        if not self._isTruthy(self._cur_frame.popOpStack()):
-            self._goto(idx)
-        else:
-            self._advance() # consume second arg
+    def execute_POP_JMP_IF_FALSE(self, arg: int, ip: int) -> int:
+        if not isTruthy(self._stack.pop()):
+            return arg
+        return ip + 1
 
 
-    def execute_CALL_FUNCTION(self, i: int) -> None:
-        idx: int = self._advance()
-        fnInfo: func_info = self._code_obj.getFromFP(idx)
+    #
+    # The arguments on top of the caller's operand stack become the first
+    #   locals of the callee in place, the rest of its locals are added on top.
+    #
+    def execute_CALL_FUNCTION(self, arg: int, ip: int) -> int:
+        fnInfo: func_info = self._code_obj.getFromFP(arg)
 
-        f = Frame()
-        f.copy(self._cur_frame)
-        f.setReturnAddress(self._ip)
-        
-        self._ip = -1
-        self._cur_frame.reset()
-        self._cur_frame.setCode(fnInfo.code)
+        self._call_stack.append((self._code, ip + 1, self._bp))
+
+        self._bp = len(self._stack) - fnInfo.argc
+        self._stack.extend(self._nils[arg])
+        self._code = fnInfo.instructions
+        return 0
 
-        if f.name == "main":
-            self._main_frame._local_vars = f._local_vars
 
-        for i in range(fnInfo.argc):
-            self._cur_frame.pushOpStack(f.popOpStack())
+    def execute_CALL_NATIVE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        fnName = builtinFunctionIndex[arg]
+        argc: int = builtinFunctionInfo[fnName][1]
 
-        self._pushFrame(f)
+        args: List[LObject] = stack[len(stack) - argc:]
+        del stack[len(stack) - argc:]
 
+        stack.append(builtinFunctionTable[fnName](args))
+        return ip + 1
 
-    def execute_CALL_NATIVE(self, i: int) -> None:
-        idx: int = self._advance()
-        fnName = builtinFunctionIndex[idx]
-        args: List[LObject] = []
-        argc: int = builtinFunctionInfo[fnName][1]
-        for _ in range(argc):
-            args = [self._cur_frame.popOpStack()] + args
 
-        self._cur_frame.pushOpStack(builtinFunctionTable[fnName](args))
+    #
+    # return f(...): the arguments replace the locals of the current frame,
+    #   and f returns straight to the caller of the current function
+    #
+    def execute_TAIL_CALL(self, arg: int, ip: int) -> int:
+        fnInfo: func_info = self._code_obj.getFromFP(arg)
+        stack: List[LObject] = self._stack
+        bp: int = self._bp
 
+        stack[bp:] = stack[len(stack) - fnInfo.argc:]
+        stack.extend(self._nils[arg])
+        self._code = fnInfo.instructions
+        return 0
 
-    def execute_RETURN_VALUE(self, i: int) -> None:        
-        retVal: LObject = self._cur_frame.popOpStack()
 
-        try:
-            ret_f: Frame = self._popFrame()
-            self._ip = ret_f.getReturnAddress()
-            self._cur_frame.copy(ret_f)
-            self._cur_frame.pushOpStack(retVal)
-        except:
-            pass
+    # drops the callee's frame and leaves the return value on the caller's operand stack
+    def execute_RETURN_VALUE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        retVal: LObject = stack.pop()
 
+        # return in main is ignored
+        if len(self._call_stack) == 0:
+            return ip + 1
 
-    def execute_BUILD_LIST(self, i: int) -> None:
-        len: int = (self._advance() << 8) + self._advance()
-        arrObj: Array = Array()
+        del stack[self._bp:]
+        stack.append(retVal)
+
+        self._code, retAddr, self._bp = self._call_stack.pop()
+        return retAddr
 
-        arrElList: list = []
-        for _ in range(len):
-            arrElList = [self._cur_frame.popOpStack()] + arrElList
 
-        for e in arrElList:
+    def execute_BUILD_LIST(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        length: int = arg
+
+        arrObj: Array = Array()
+        for e in stack[len(stack) - length:]:
             arrObj.addEl(e)
+        del stack[len(stack) - length:]
 
-        self._cur_frame.pushOpStack(arrObj)
+        stack.append(arrObj)
+        return ip + 1
         
 
-    def execute_BINARY_SUBSCR(self, i: int) -> None:
-        idx: Number = self._cur_frame.popOpStack()
+    def execute_BINARY_SUBSCR(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        idx: Number = stack.pop()
 
-        if type(idx).__name__ != "Number":
+        if idx.tag != TypeTag.NUMBER:
             raise TypeErr(f"Array indices must be integers, not '{type(idx).__name__}'")
 
-        if type(idx.value).__name__ == "float":
+        if type(idx.value) is float:
             raise TypeErr(f"Array indices must be integers, not float")
         
-        arr: Array = self._cur_frame.popOpStack()
+        arr: Array = stack.pop()
 
-        if self._getObjType(arr) != "Array":
+        if arr.tag != TypeTag.ARRAY:
             raise TypeErr(f"Type '{type(arr).__name__}' is not subscriptable")
         
         if arr.getEL(idx.value) == None:
             raise IndexErr()
 
-        self._cur_frame.pushOpStack(arr.getEL(idx.value))
+        stack.append(arr.getEL(idx.value))
+        return ip + 1
 
 
-    def execute_STORE_SUBSCR(self, i: int) -> None:
-        idx: Number = self._cur_frame.popOpStack()
+    def execute_STORE_SUBSCR(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        idx: Number = stack.pop()
         
-        if type(idx).__name__ != "Number":
+        if idx.tag != TypeTag.NUMBER:
             raise TypeErr(f"Array indices must be integers, not '{type(idx).__name__}'")
 
-        if type(idx.value).__name__ == "float":
+        if type(idx.value) is float:
             raise TypeErr(f"Array indices must be integers, not float")
 
-        arr: Array = self._cur_frame.popOpStack()
-        if self._getObjType(arr) != "Array":
+        arr: Array = stack.pop()
+        if arr.tag != TypeTag.ARRAY:
             raise TypeErr(f"Type '{type(arr).__name__}' is not subscriptable")
 
-        val: LObject = self._cur_frame.popOpStack()
+        val: LObject = stack.pop()
 
         if arr.getEL(idx.value) == None:
             raise IndexErr()
 
         arr.setEL(val, idx.value)
-        self._cur_frame.pushOpStack(arr)
+        return ip + 1
+
+
+    #
+    # Superinstructions, see loks/optimizer/superinstructions.py
+    #
+
+    def execute_ADD_LOCALS(self, arg: Tuple[int, int], ip: int) -> int:
+        stack: List[LObject] = self._stack
+        bp: int = self._bp
+        stack.append(self._add(stack[bp + arg[0]], stack[bp + arg[1]]))
+        return ip + 1
+
+
+    def execute_INC_LOCAL(self, arg: Tuple[int, int], ip: int) -> int:
+        stack: List[LObject] = self._stack
+        idx: int = self._bp + arg[0]
+        k: int = arg[1]
+        l: LObject = stack[idx]
+
+        if l.tag == TypeTag.NUMBER:
+            stack[idx] = makeNumber(l.value + k)
+        else:
+            stack[idx] = self._add(l, makeNumber(k))
+        return ip + 1
+
+
+    # compare and branch, jump to arg if the comparision is false
+
+    def execute_JMP_IF_NOT_EQ(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if valuesEqual(l, r):
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_NE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if not valuesEqual(l, r):
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_GT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value > r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_LT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value < r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_GE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for greater than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value >= r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_LE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            raise TypeErr(f"Invalid operand type for less than equals operator: {self._getObjType(l)} and {self._getObjType(r)}")
+
+        if l.value <= r.value:
+            return ip + 1
+        return arg
+
+
+    #
+    # Typed instructions, the compiler only emits them for operands with
+    #   proven types, see loks/analyzer/typeinference.py
+    #
+
+    def execute_NUM_ADD(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = makeNumber(stack[-1].value + r.value)
+        return ip + 1
+
+
+    def execute_NUM_SUB(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = makeNumber(stack[-1].value - r.value)
+        return ip + 1
+
+
+    def execute_NUM_MUL(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = makeNumber(stack[-1].value * r.value)
+        return ip + 1
+
+
+    def execute_NUM_DIV(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+
+        if r.value == 0:
+            raise ZeroDivErr()
+
+        stack[-1] = makeNumber(stack[-1].value / r.value)
+        return ip + 1
 
+
+    def execute_NUM_MOD(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+
+        if r.value == 0:
+            raise ZeroDivErr()
+
+        stack[-1] = makeNumber(stack[-1].value % r.value)
+        return ip + 1
+
+
+    def execute_NUM_NEG(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        stack[-1] = makeNumber(-(stack[-1].value))
+        return ip + 1
+
+
+    def execute_STR_ADD(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = String(stack[-1].value + r.value)
+        return ip + 1
+
+
+    def execute_NUM_CMPEQ(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value == r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_CMPNE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value != r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_CMPGT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value > r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_CMPLT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value < r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_CMPGE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value >= r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_CMPLE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        stack[-1] = TRUE if stack[-1].value <= r.value else FALSE
+        return ip + 1
+
+
+    def execute_NUM_JMP_IF_NOT_EQ(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value == r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_JMP_IF_NOT_NE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value != r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_JMP_IF_NOT_GT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value > r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_JMP_IF_NOT_LT(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value < r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_JMP_IF_NOT_GE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value >= r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_JMP_IF_NOT_LE(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        if stack.pop().value <= r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_NUM_ADD_LOCALS(self, arg: Tuple[int, int], ip: int) -> int:
+        stack: List[LObject] = self._stack
+        bp: int = self._bp
+        stack.append(makeNumber(stack[bp + arg[0]].value + stack[bp + arg[1]].value))
+        return ip + 1
+
+
+    #
+    # Quickened instructions, see quickenings at the top of this file. They
+    #   leave the left operand on the stack and overwrite it with the result.
+    #
+
+    def execute_BINARY_ADD_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_ADD, arg, ip)
+
+        stack[-1] = makeNumber(l.value + r.value)
+        return ip + 1
+
+
+    def execute_BINARY_ADD_STR(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.STRING or r.tag != TypeTag.STRING:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_ADD, arg, ip)
+
+        stack[-1] = String(l.value + r.value)
+        return ip + 1
+
+
+    def execute_BINARY_SUBTRACT_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_SUBTRACT, arg, ip)
+
+        stack[-1] = makeNumber(l.value - r.value)
+        return ip + 1
+
+
+    def execute_BINARY_MULTIPLY_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_MULTIPLY, arg, ip)
+
+        stack[-1] = makeNumber(l.value * r.value)
+        return ip + 1
+
+
+    # division by zero is left to the generic handler, which raises the error
+    def execute_BINARY_DIVIDE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER or r.value == 0:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_DIVIDE, arg, ip)
+
+        stack[-1] = makeNumber(l.value / r.value)
+        return ip + 1
+
+
+    def execute_BINARY_MODULO_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER or r.value == 0:
+            stack.append(r)
+            return self._dequicken(self.execute_BINARY_MODULO, arg, ip)
+
+        stack[-1] = makeNumber(l.value % r.value)
+        return ip + 1
+
+
+    def execute_CMPEQ_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPEQ, arg, ip)
+
+        stack[-1] = TRUE if l.value == r.value else FALSE
+        return ip + 1
+
+
+    def execute_CMPNE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPNE, arg, ip)
+
+        stack[-1] = TRUE if l.value != r.value else FALSE
+        return ip + 1
+
+
+    def execute_CMPGT_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPGT, arg, ip)
+
+        stack[-1] = TRUE if l.value > r.value else FALSE
+        return ip + 1
+
+
+    def execute_CMPLT_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPLT, arg, ip)
+
+        stack[-1] = TRUE if l.value < r.value else FALSE
+        return ip + 1
+
+
+    def execute_CMPGE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPGE, arg, ip)
+
+        stack[-1] = TRUE if l.value >= r.value else FALSE
+        return ip + 1
+
+
+    def execute_CMPLE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack[-1]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(r)
+            return self._dequicken(self.execute_CMPLE, arg, ip)
+
+        stack[-1] = TRUE if l.value <= r.value else FALSE
+        return ip + 1
+
+
+    def execute_ADD_LOCALS_NUM(self, arg: Tuple[int, int], ip: int) -> int:
+        stack: List[LObject] = self._stack
+        bp: int = self._bp
+        l: LObject = stack[bp + arg[0]]
+        r: LObject = stack[bp + arg[1]]
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            return self._dequicken(self.execute_ADD_LOCALS, arg, ip)
+
+        stack.append(makeNumber(l.value + r.value))
+        return ip + 1
+
+
+    def execute_ADD_LOCALS_STR(self, arg: Tuple[int, int], ip: int) -> int:
+        stack: List[LObject] = self._stack
+        bp: int = self._bp
+        l: LObject = stack[bp + arg[0]]
+        r: LObject = stack[bp + arg[1]]
+
+        if l.tag != TypeTag.STRING or r.tag != TypeTag.STRING:
+            return self._dequicken(self.execute_ADD_LOCALS, arg, ip)
+
+        stack.append(String(l.value + r.value))
+        return ip + 1
+
+
+    # the compare and branch instructions pop both operands
+
+    def execute_JMP_IF_NOT_EQ_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_EQ, arg, ip)
+
+        if l.value == r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_NE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_NE, arg, ip)
+
+        if l.value != r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_GT_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_GT, arg, ip)
+
+        if l.value > r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_LT_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_LT, arg, ip)
+
+        if l.value < r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_GE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_GE, arg, ip)
+
+        if l.value >= r.value:
+            return ip + 1
+        return arg
+
+
+    def execute_JMP_IF_NOT_LE_NUM(self, arg: int, ip: int) -> int:
+        stack: List[LObject] = self._stack
+        r: LObject = stack.pop()
+        l: LObject = stack.pop()
+
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+            stack.append(l)
+            stack.append(r)
+            return self._dequicken(self.execute_JMP_IF_NOT_LE, arg, ip)
+
+        if l.value <= r.value:
+            return ip + 1
+        return arg
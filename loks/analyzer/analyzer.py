@@ -6,10 +6,13 @@ from ..lexer.token import Token, TokenType
 
 from .symboltable import SymbolTable
 from .symboltable import TypeSymbol, VariableSymbol, FunctionSymbol
+from .typeinference import TypeInference
 
 
 #
 # Checks if all names are defined, and performs some minimal static type checking
+# Programs without errors are then annotated with the types of their
+#   expressions, see loks/analyzer/typeinference.py
 # Inherits from NodeVisitor class, defined in loks/nodevisitor.py
 #
 class SemanticAnalyzer(NodeVisitor):
@@ -78,6 +81,9 @@ class SemanticAnalyzer(NodeVisitor):
         for d in node.declarationList:
             self.visit(d)
 
+        if not self.hadError:
+            TypeInference().visit(node)
+
 
     def visit_VarDeclNode(self, node) -> None:
         if self._currentST.get(node.id.token.value, True) != None:
@@ -0,0 +1,329 @@
+from typing import Dict, List, Set
+
+from ..nodevisitor import NodeVisitor
+from ..stdlib import builtinReturnTypes
+
+
+# variable name -> proven type, None for code that can't be reached
+Env = Dict[str, str]
+
+
+# types both environments agree on, variables missing from an environment
+#   have an unknown type
+def _join(a: Env, b: Env) -> Env:
+    if a == None:
+        return None if b == None else dict(b)
+    if b == None:
+        return dict(a)
+    return {name: typ for name, typ in a.items() if b.get(name) == typ}
+
+
+def _copy(env: Env) -> Env:
+    return None if env == None else dict(env)
+
+
+#
+# Flow-sensitive type inference, run by the SemanticAnalyzer once a program
+#   has no errors. Sets node.staticType of every expression to the type
+#   ("number", "string", "boolean", "array" or "nil") all its values are
+#   proven to have, or None. The Compiler emits typed instructions without
+#   runtime type checks for operations on proven operands.
+# The type of every variable is tracked along the statements of a function,
+#   joined where control flow merges, and iterated to a fixed point for
+#   loops. Operations that fail on the wrong types have a known result
+#   type, since a failed operation stops the program.
+# Parameters, globals read inside functions and the results of calls to
+#   user functions are never proven. A call to a user function can assign
+#   any global, so it forgets the types of the variables of main.
+#
+class TypeInference(NodeVisitor):
+    def __init__(self) -> None:
+        self._env: Env = dict()
+
+        # locals of the function being analyzed, None in main where every
+        #   variable is a global
+        self._locals: Set[str] = None
+
+        # environments at the break and continue statements of the enclosing loops
+        self._breaks: List[List[Env]] = []
+        self._continues: List[List[Env]] = []
+
+
+    def _annotate(self, node, typ: str) -> str:
+        node.staticType = typ
+        return typ
+
+
+    # inside a function, globals can be changed by any call
+    def _isTracked(self, name: str) -> bool:
+        return self._locals == None or name in self._locals
+
+
+    def _lookup(self, name: str) -> str:
+        if self._env == None or not self._isTracked(name):
+            return None
+        return self._env.get(name)
+
+
+    def _assign(self, name: str, typ: str) -> None:
+        if self._env == None or not self._isTracked(name):
+            return
+
+        if typ == None:
+            self._env.pop(name, None)
+        else:
+            self._env[name] = typ
+
+
+    #
+    # Statements
+    #
+
+    def visit_ProgramNode(self, node) -> None:
+        for d in node.declarationList:
+            self.visit(d)
+
+
+    def visit_BlockNode(self, node) -> None:
+        for s in node.stmtList:
+            self.visit(s)
+
+
+    def visit_VarDeclNode(self, node) -> None:
+        typ: str = "nil"
+        if node.exprNode != None:
+            typ = self.visit(node.exprNode)
+
+        if self._locals != None:
+            self._locals.add(node.id.token.value)
+        self._assign(node.id.token.value, typ)
+
+
+    # the compiler evaluates the value before the array and the index
+    def visit_AssignNode(self, node) -> None:
+        typ: str = self.visit(node.exprNode)
+
+        if type(node.lvalue).__name__ == "IdentifierNode":
+            self._assign(node.lvalue.token.value, typ)
+        else:
+            self.visit(node.lvalue.base)
+            self.visit(node.lvalue.index)
+
+
+    def visit_FunDeclNode(self, node) -> None:
+        outer = (self._env, self._locals, self._breaks, self._continues)
+
+        self._env = dict()
+        self._locals = set(p.value for p in node.paramList)
+        self._breaks = []
+        self._continues = []
+
+        self.visit(node.blockNode)
+
+        self._env, self._locals, self._breaks, self._continues = outer
+
+
+    # the VM ignores a return in main, execution continues after it
+    def visit_ReturnNode(self, node) -> None:
+        self.visit(node.expr)
+        if self._locals != None:
+            self._env = None
+
+
+    def visit_BreakNode(self, node) -> None:
+        self._breaks[-1].append(self._env)
+        self._env = None
+
+
+    def visit_ContinueNode(self, node) -> None:
+        self._continues[-1].append(self._env)
+        self._env = None
+
+
+    def visit_IfNode(self, node) -> None:
+        ends: List[Env] = []
+
+        for c in [node.ifBlock] + node.elsifBloks:
+            self.visit(c.condition)
+            skipped: Env = _copy(self._env)
+
+            self.visit(c.statement)
+            ends.append(self._env)
+
+            self._env = skipped
+
+        if node.elseBlock != None:
+            self.visit(node.elseBlock)
+        ends.append(self._env)
+
+        self._env = None
+        for e in ends:
+            self._env = _join(self._env, e)
+
+
+    #
+    # The types at the start of the loop are those both the code before it
+    #   and the end of every iteration agree on. Every pass can only forget
+    #   types, so the iteration ends. The last pass annotates the nodes.
+    #
+    def visit_WhileNode(self, node) -> None:
+        entry: Env = self._env
+        head: Env = _copy(entry)
+
+        # the compiler resolves names in the order of the code, so variables
+        #   declared in the loop are not locals before their declaration
+        entryLocals: Set[str] = self._locals
+
+        while True:
+            self._env = _copy(head)
+            if entryLocals != None:
+                self._locals = set(entryLocals)
+            self._breaks.append([])
+            self._continues.append([])
+
+            self.visit(node.condition)
+            exit: Env = _copy(self._env)
+
+            # while (true) is only left by a break
+            if type(node.condition).__name__ == "TrueNode":
+                exit = None
+
+            self.visit(node.statement)
+
+            back: Env = self._env
+            for e in self._continues.pop():
+                back = _join(back, e)
+            breaks: List[Env] = self._breaks.pop()
+
+            newHead: Env = _join(entry, back)
+            if newHead == head:
+                break
+            head = newHead
+
+        for e in breaks:
+            exit = _join(exit, e)
+        self._env = exit
+
+
+    #
+    # Expressions, every visit method returns the type of the expression
+    #
+
+    def visit_NumberNode(self, node) -> str:
+        return node.staticType
+
+
+    def visit_StringNode(self, node) -> str:
+        return node.staticType
+
+
+    def visit_TrueNode(self, node) -> str:
+        return node.staticType
+
+
+    def visit_FalseNode(self, node) -> str:
+        return node.staticType
+
+
+    def visit_NilNode(self, node) -> str:
+        return node.staticType
+
+
+    def visit_IdentifierNode(self, node) -> str:
+        return self._annotate(node, self._lookup(node.token.value))
+
+
+    def visit_ArrayNode(self, node) -> str:
+        for e in node.elements:
+            self.visit(e)
+        return node.staticType
+
+
+    def visit_ArrayAccessNode(self, node) -> str:
+        self.visit(node.base)
+        self.visit(node.index)
+        return self._annotate(node, None)
+
+
+    def visit_FunctionCallNode(self, node) -> str:
+        for a in node.argList:
+            self.visit(a)
+
+        name: str = node.nameNode.token.value
+        if name in builtinReturnTypes:
+            return self._annotate(node, builtinReturnTypes[name])
+
+        if self._locals == None and self._env != None:
+            self._env.clear()
+        return self._annotate(node, None)
+
+
+    # '+' adds numbers or concatenates strings, one known operand decides which
+    def visit_AddNode(self, node) -> str:
+        l: str = self.visit(node.left)
+        r: str = self.visit(node.right)
+
+        if l == "number" or r == "number":
+            return self._annotate(node, "number")
+        if l == "string" or r == "string":
+            return self._annotate(node, "string")
+        return self._annotate(node, None)
+
+
+    def _numeric(self, node) -> str:
+        self.visit(node.left)
+        self.visit(node.right)
+        return self._annotate(node, "number")
+
+    def visit_SubNode(self, node) -> str:
+        return self._numeric(node)
+
+    def visit_MulNode(self, node) -> str:
+        return self._numeric(node)
+
+    def visit_DivNode(self, node) -> str:
+        return self._numeric(node)
+
+    def visit_ModNode(self, node) -> str:
+        return self._numeric(node)
+
+
+    # comparisons, and 'and'/'or' which the compilers turn into a Boolean
+    def _boolean(self, node) -> str:
+        self.visit(node.left)
+        self.visit(node.right)
+        return self._annotate(node, "boolean")
+
+    def visit_EqualNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_NotEqualNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_GreaterThanNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_GreaterThanEqualNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_LessThanNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_LessThanEqualNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_AndNode(self, node) -> str:
+        return self._boolean(node)
+
+    def visit_OrNode(self, node) -> str:
+        return self._boolean(node)
+
+
+    def visit_NotNode(self, node) -> str:
+        self.visit(node.node)
+        return self._annotate(node, "boolean")
+
+
+    def visit_NegationNode(self, node) -> str:
+        self.visit(node.node)
+        return self._annotate(node, "number")
@@ -1,260 +1,331 @@
-from typing import List, Dict
-from ..instruction import opcodeSizeDict, opcodeNameDict
-
-
+import struct
+from typing import List, Dict, Tuple, Union, Iterable, Iterator
+from ..instruction import opcodeSizeDict, opcodeNameDict, pairOperandOpcodes, jumpOpcodes
+from ..error import ValueErr
+
+
+# opcode -> positions of the operands that are local variable names
+localOperandDict: Dict[str, List[int]] = {
+    "STORE_LOCAL": [1],
+    "LOAD_LOCAL": [1],
+    "ADD_LOCALS": [1, 2],
+    "NUM_ADD_LOCALS": [1, 2],
+    "INC_LOCAL": [1],
+}
+
+# opcode -> positions of the operands that are global variable names
+globalOperandDict: Dict[str, List[int]] = {
+    "STORE_GLOBAL": [1],
+    "LOAD_GLOBAL": [1],
+}
+
+
+#
+# Lines of inpstr without their newline characters, except the ones in
+#   strings (marked by double quotes), which stay part of their line
+#
+def iterLines(inpstr: str) -> Iterator[str]:
+    # parts of a line with a string that isn't closed yet
+    pending: List[str] = []
+
+    for part in inpstr.split('\n'):
+        pending.append(part)
+        if sum(p.count('"') for p in pending) % 2 == 1:
+            continue
+
+        yield '\n'.join(pending)
+        pending = []
+
+    if len(pending) > 0:
+        yield '\n'.join(pending)
+
+
+#
+# Superinstructions with two u8 operands as the instructions they were fused
+#   from, for operands that don't fit in a byte
+#
+def unfusePair(ins: List[Union[str, int]]) -> List[List[Union[str, int]]]:
+    if ins[0] == "INC_LOCAL":
+        return [["LOAD_LOCAL", ins[1]], ["BIPUSH", ins[2]], ["BINARY_ADD"], ["STORE_LOCAL", ins[1]]]
+
+    add: str = "NUM_ADD" if ins[0] == "NUM_ADD_LOCALS" else "BINARY_ADD"
+    return [["LOAD_LOCAL", ins[1]], ["LOAD_LOCAL", ins[2]], [add]]
+
+
+# number of EXTENDED_ARG prefixes an operand needs, next to its own bytes
+def prefixCount(operand: int, operandBytes: int) -> int:
+    n: int = 0
+    while operand >> (8 * (operandBytes + n)) > 0:
+        n += 1
+    return n
+
+
+# constant pool entries: integers in two's complement, doubles in IEEE-754
+_u64: struct.Struct = struct.Struct(">Q")
+_f64: struct.Struct = struct.Struct(">d")
+
+
+#
+# Assembles textual assembly into bytecode in two passes. The first reads
+#   the lines once, emitting the constant pool and collecting the lines of
+#   every function, so every function name is known afterwards. The second
+#   resolves names and labels with dictionaries and emits the functions.
+# Output goes into a bytearray, so assembling takes time linear in the
+#   size of the input.
+#
 class Assembler:
-    def __init__(self, inpstr: str) -> None:
-        self._inpCodeList: List[str] = []
-
-        # split inpstr by newline character, except in strings (marked by double quotes)
-        i = 0
-        s = ''
-        while i < len(inpstr):
-            if inpstr[i] == '"':
-                i += 1
-                s += '"'
-                while inpstr[i] != '"':
-                    s += inpstr[i]
-                    i += 1
-            
-            s += inpstr[i]
-            
-            if inpstr[i] == '\n':
-                self._inpCodeList.append(s)
-                s = ""
-
-            i += 1
-
-        self._outputCodeList: List[int] = []
+    # inp: textual assembly, or an iterable of its lines
+    def __init__(self, inp: Union[str, Iterable[str]]) -> None:
+        self._lines: Iterable[str] = iterLines(inp) if isinstance(inp, str) else inp
+
+        self._output: bytearray = bytearray()
 
         self._fnDict: Dict[str, int] = dict()
-        self._fnCount = 0
 
-        self._labelsDict: Dict[str, int] = dict()
+        # (argc, params, instructions) of every function, from the first pass
+        self._functions: List[Tuple[int, List[str], List[List[str]]]] = []
 
+        # globals are the locals of main, which is always the first function
+        self._globalVarDict: Dict[str, int] = None
 
-    def getBytecodeList(self) -> List[int]:
-        self._initCode()
-        self._resolveLabels()
-        self._makeConstantPool()
+        # (position in the output, variables) of every function's local count
+        self._localCounts: List[Tuple[int, Dict[str, int]]] = []
+
+
+    def getBytecode(self) -> bytearray:
+        self._readLines()
         self._makeCode()
+        return self._output
 
-        return self._outputCodeList
 
+    def getBytecodeList(self) -> List[int]:
+        return list(self.getBytecode())
 
-    def _emit(self, *args) -> None:
-        for i in args:
-            self._outputCodeList.append(i)
+
+    # function names indexed by function pool index, after getBytecode
+    def getFunctionNames(self) -> List[str]:
+        names: List[str] = [""] * len(self._fnDict)
+        for name, idx in self._fnDict.items():
+            names[idx] = name
+        return names
 
 
-    def _initCode(self) -> None:
-        # remove while space around lines
-        for i,v in enumerate(self._inpCodeList):
-            self._inpCodeList[i] = v.strip()
+    def _emit(self, *args) -> None:
+        self._output.extend(args)
 
-        # remove blank lines
-        while '' in self._inpCodeList:
-            self._inpCodeList.remove('')
 
-        # add magic number for loks VM
-        self._emit(0x4d, 0x69, 0x68, 0x6f)
+    # n byte big-endian unsigned integer, for the sizes and counts of the format
+    def _emitUnsigned(self, i: int, n: int, what: str) -> None:
+        if i >= 1 << (8 * n):
+            raise ValueErr(f"too many {what} ({i}), the bytecode format allows at most {(1 << (8 * n)) - 1}")
+
+        self._output += i.to_bytes(n, "big")
 
 
     #
-    # Converts identifiers to indices and lables to memory locations
-    # Also counts the number of functions and the code size for each one
+    # First pass: emits the magic number and the constant pool, and splits
+    #   the lines of the functions into instructions
     #
-    def _resolveLabels(self) -> None:
-        # count functions
-        # note that this will remove all lines marked by 'fn'
-        i = 0
-        while i < len(self._inpCodeList):
-            l = self._inpCodeList[i].split(' ')
-            if l[0] == "fn":
-                self._fnDict[l[1]] = self._fnCount
-                self._inpCodeList.pop(i)
-                self._fnCount += 1
-
-            i += 1
-
-        i = 0
-        totalInsSize = 0
-        while i < len(self._inpCodeList):
-            l = self._inpCodeList[i].split(' ')
-
-            # argc marks the beginning of a function
-            if l[0] == "argc":
-                totalInsSize = 0
-            
-            elif l[0][0] == '.':
-                self._labelsDict[l[0][1:]] = totalInsSize
-                self._inpCodeList.pop(i)
-                continue
+    def _readLines(self) -> None:
+        # add magic number for loks VM
+        self._emit(0x4d, 0x69, 0x68, 0x6f)
 
-            else:
-                if l[0] in opcodeSizeDict:
-                    totalInsSize += opcodeSizeDict[l[0]]
+        # constants still to be read, None before the cpc line
+        constants: int = None
+        body: List[List[str]] = None
 
-            i += 1
-                
+        for line in self._lines:
+            line = line.strip()
+            if line == "":
+                continue
 
-    def _removeFromFront(self, n: int) -> None:
-        self._inpCodeList = self._inpCodeList[n:]
+            if constants == None:
+                # cpc - constants pool size
+                constants = int(line.split(' ')[1])
+                self._emitUnsigned(constants, 4, "constants")
+                continue
 
+            if constants > 0:
+                self._makeConstant(line)
+                constants -= 1
+                continue
 
-    def _makeConstantPool(self) -> None:
-        # cpc - constants pool size
-        size: int = int(self._inpCodeList[0].split(' ')[1])
-        self._emit(
-            (size & 0xff00) >> 8,
-            (size & 0xff)
-        )
+            ins: List[str] = line.split(' ')
+            if ins[0] == "fn":
+                self._fnDict[ins[1]] = len(self._functions)
+                body = []
+                self._functions.append((0, [], body))
+            elif ins[0] == "argc":
+                self._functions[-1] = (int(ins[1]), [], body)
+            elif ins[0] == "param":
+                self._functions[-1][1].append(ins[1])
+            else:
+                body.append(ins)
 
-        self._removeFromFront(1)
 
-        for i in range(size):
-            typ: str = self._inpCodeList[i][0]
-            ins: List[str] = self._inpCodeList[i][1:].strip()
-            
-            if typ == 'i':
-                self._makeInteger(int(ins))
+    def _makeConstant(self, line: str) -> None:
+        typ: str = line[0]
+        ins: str = line[1:].strip()
 
-            elif typ == 'd':
-                self._makeDouble(float(ins))
+        if typ == 'i':
+            self._makeInteger(int(ins))
 
-            elif typ == 's':
-                self._makeString(ins[1:-1])
+        elif typ == 'd':
+            self._makeDouble(float(ins))
 
-        self._removeFromFront(size)
+        elif typ == 's':
+            self._makeString(ins[1:-1])
 
 
     def _makeInteger(self, i: int) -> None:
         self._emit(0x03)  # integer tag
 
         # two's complement representation for negative ints
-        if i < 0:
-            i = -i
-            i = i ^ (0xffffffffffffffff)  # flip bits
-            i += 1
-
-        # split into 8 bytes
-        self._emit(
-            (i & 0xff00000000000000) >> 56,
-            (i & 0xff000000000000) >> 48,
-            (i & 0xff0000000000) >> 40,
-            (i & 0xff00000000) >> 32,
-            (i & 0xff000000) >> 24,
-            (i & 0xff0000) >> 16,
-            (i & 0xff00) >> 8,
-            i & 0xff,
-        )
+        self._output += _u64.pack(i & 0xffffffffffffffff)
 
 
     def _makeDouble(self, d: float) -> None:
         self._emit(0x06)  # double tag
-
-        # check sign
-        sign: int = 0
-        if d < 0:
-            sign = 1
-            d = -d
-
-        exp: int = len(str(d)[str(d).index('.')+1:])
-        mantissa: int = int(d*10**exp)
-
-        i = (sign << 63) + (exp << 52) + (mantissa)
-        
-        # split into 8 bytes
-        self._emit(
-            (i & 0xff00000000000000) >> 56,
-            (i & 0xff000000000000) >> 48,
-            (i & 0xff0000000000) >> 40,
-            (i & 0xff00000000) >> 32,
-            (i & 0xff000000) >> 24,
-            (i & 0xff0000) >> 16,
-            (i & 0xff00) >> 8,
-            i & 0xff,
-        )
+        self._output += _f64.pack(d)
 
 
     def _makeString(self, s: str) -> None:
         self._emit(0x08)  # string tag
 
-        for c in s:
-            self._emit(ord(c))
+        # one byte per character
+        try:
+            self._output += s.encode("latin-1")
+        except UnicodeEncodeError:
+            raise ValueErr(f"the string constant {s!r} has a character that doesn't fit in a byte")
 
         self._emit(0x00)  # null terminator
 
 
+    # second pass: the functions, now that every function name is known
     def _makeCode(self) -> None:
         # number of functions
-        self._emit(
-            self._fnCount >> 8,
-            self._fnCount & 0xff
-        )
+        self._emitUnsigned(len(self._functions), 2, "functions")
+
+        for argc, params, body in self._functions:
+            self._makeFunction(argc, params, body)
 
-        for _ in range(self._fnCount):
-            self._makeFunction()
+        # functions can add globals after main was assembled, so the local
+        #   counts are only known at the end
+        for pos, localVarDict in self._localCounts:
+            if len(localVarDict) > 0xffff:
+                raise ValueErr(f"too many variables in a function ({len(localVarDict)}), the bytecode format allows at most 65535")
+            self._output[pos:pos + 2] = len(localVarDict).to_bytes(2, "big")
 
 
-    def _makeFunction(self) -> None:
+    def _makeFunction(self, argc: int, params: List[str], lines: List[List[str]]) -> None:
         localVarDict: Dict[str, int] = dict()
-        localVarCount: int = 0
 
-        argc: int = int(self._inpCodeList[0].split(' ')[1])
-        self._emit(
-            argc >> 8,
-            argc & 0xff
-        )
-        self._removeFromFront(1)
+        if self._globalVarDict == None:
+            self._globalVarDict = localVarDict
+
+        self._emitUnsigned(argc, 2, "parameters")
 
+        # number of locals, filled in by _makeCode
+        self._localCounts.append((len(self._output), localVarDict))
+        self._emit(0x00, 0x00)
+
+        # params are the first locals
+        for p in params:
+            localVarDict[p] = len(localVarDict)
+
+        # instructions with their operands resolved, except labels, which
+        #   are mapped to the index of the instruction they mark
+        body: List[List[Union[str, int]]] = []
+        labels: Dict[str, int] = dict()
+
+        for ins in lines:
+            if ins[0][0] == '.':
+                labels[ins[0][1:]] = len(body)
+                continue
+
+            body += self._resolveOperands(ins, localVarDict)
+
+        offsets, prefixes = self._layout(body, labels)
         # calculate total function size in bytes
-        # opcodeSizeDict is defined in loks/instruction.py
-        size: int = 0
-        for l in self._inpCodeList:
-            l = l.split(' ')[0]
-            if l == "argc":
-                break
-            size += opcodeSizeDict[l]
-
-        self._emit(
-            size >> 8,
-            size & 0xff
-        )
-
-        while len(self._inpCodeList) > 0:
-            ins = self._inpCodeList[0].split(' ')\
-
-            # argc marks beginnig of new function
-            if ins[0] == "argc":
-                break
-
-            self._emit(opcodeNameDict[ins[0]])
-
-            argc = opcodeSizeDict[ins[0]] - 1
-
-            if argc > 0 and not ins[1].isnumeric():
-                if ins[1] in self._labelsDict:
-                    ins[1] = self._labelsDict[ins[1]]
-                elif ins[1] in self._fnDict:
-                    ins[1] = self._fnDict[ins[1]]
-
-            if ins[0] in ["STORE_LOCAL", "LOAD_LOCAL", "STORE_GLOBAL", "LOAD_GLOBAL"]:
-                if ins[1] not in localVarDict:
-                    localVarDict[ins[1]] = localVarCount
-                    ins[1] = localVarCount
-                    localVarCount += 1
-                else:
-                    ins[1] = localVarDict[ins[1]]
-                    
-            if argc == 1:
-                arg: int = int(ins[1])
-                self._emit(arg)
-            elif argc == 2:
-                arg: int = int(ins[1])
-                self._emit(
-                    arg >> 8,
-                    arg & 0xff
-                )
-
-            self._removeFromFront(1)
+        self._emitUnsigned(offsets[-1], 4, "bytes of code in a function")
+
+        for idx, ins in enumerate(body):
+            op: int = opcodeNameDict[ins[0]]
+
+            if len(ins) == 1:
+                self._emit(op)
+            elif op in pairOperandOpcodes:
+                self._emit(op, ins[1], ins[2])
+            else:
+                operand: int = offsets[labels[ins[1]]] if op in jumpOpcodes else ins[1]
+                operandBytes: int = opcodeSizeDict[ins[0]] - 1
+
+                # the high bytes of the operand, most significant first
+                for n in range(prefixes[idx], 0, -1):
+                    self._emit(opcodeNameDict["EXTENDED_ARG"], (operand >> (8 * (operandBytes + n - 1))) & 0xff)
+
+                self._emit(op)
+                if operandBytes == 2:
+                    self._emit((operand >> 8) & 0xff)
+                self._emit(operand & 0xff)
+
+
+    #
+    # Replaces the names of variables and functions in an instruction by
+    #   their indices. Returns the instructions it is assembled to: itself,
+    #   or the unfused instructions if a pair operand doesn't fit in a byte.
+    #
+    def _resolveOperands(self, ins: List[str], localVarDict: Dict[str, int]) -> List[List[Union[str, int]]]:
+        # operands that name a variable
+        for i in localOperandDict.get(ins[0], []):
+            if ins[i] not in localVarDict:
+                localVarDict[ins[i]] = len(localVarDict)
+            ins[i] = localVarDict[ins[i]]
+
+        for i in globalOperandDict.get(ins[0], []):
+            if ins[i] not in self._globalVarDict:
+                self._globalVarDict[ins[i]] = len(self._globalVarDict)
+            ins[i] = self._globalVarDict[ins[i]]
+
+        if opcodeNameDict[ins[0]] in jumpOpcodes:
+            return [ins]
+
+        for i in range(1, len(ins)):
+            if isinstance(ins[i], str):
+                ins[i] = self._fnDict[ins[i]] if ins[i] in self._fnDict else int(ins[i])
+
+        if opcodeNameDict[ins[0]] in pairOperandOpcodes and max(ins[1:]) > 0xff:
+            return unfusePair(ins)
+        return [ins]
+
+
+    #
+    # Byte offset of every instruction, and the number of EXTENDED_ARG
+    #   prefixes it needs. Jumps start out narrow and are widened until all
+    #   their targets fit, widening only moves code further down so this ends.
+    # The last offset is the size of the function.
+    #
+    def _layout(self, body: List[List[Union[str, int]]], labels: Dict[str, int]) -> Tuple[List[int], List[int]]:
+        prefixes: List[int] = [0] * len(body)
+        for idx, ins in enumerate(body):
+            if len(ins) > 1 and opcodeNameDict[ins[0]] not in jumpOpcodes | pairOperandOpcodes:
+                prefixes[idx] = prefixCount(ins[1], opcodeSizeDict[ins[0]] - 1)
+
+        while True:
+            offsets: List[int] = []
+            pos: int = 0
+            for idx, ins in enumerate(body):
+                offsets.append(pos)
+                pos += opcodeSizeDict[ins[0]] + 2 * prefixes[idx]
+            offsets.append(pos)
+
+            changed: bool = False
+            for idx, ins in enumerate(body):
+                if opcodeNameDict[ins[0]] in jumpOpcodes:
+                    n: int = prefixCount(offsets[labels[ins[1]]], opcodeSizeDict[ins[0]] - 1)
+                    if n > prefixes[idx]:
+                        prefixes[idx] = n
+                        changed = True
+
+            if not changed:
+                return offsets, prefixes
@@ -0,0 +1,162 @@
+from typing import List, Dict, Tuple, Any, Iterator
+
+from .asm import localOperandDict, globalOperandDict
+from ..instruction import opcodeNameDict, opcodeSizeDict, pairOperandOpcodes, jumpOpcodes
+from ..VM.code.code import Code, Tag, func_info, cp_info
+
+
+#
+# One function of an assembly program kept in memory. Every instruction is
+#   split into opcode and operands, a label is an instruction of its own
+#   whose opcode starts with '.'.
+#
+class AsmFunction:
+    def __init__(self, name: str, argc: int, params: List[str], body: List[List[str]] = None) -> None:
+        self.name: str = name
+        self.argc: int = argc
+        self.params: List[str] = params
+        self.body: List[List[str]] = body if body != None else []
+
+
+    def getLines(self) -> Iterator[str]:
+        yield f"fn {self.name}"
+        yield f"argc {self.argc}"
+        for p in self.params:
+            yield f"param {p}"
+        for ins in self.body:
+            yield f"    {' '.join(ins)}"
+
+
+#
+# The output of the Compiler before it is turned into text: the constant
+#   pool as lines of assembly ("i 5", "d 1.5", 's "str"') and the functions,
+#   main first. The optimizer passes work on this, so the text is only
+#   generated for -v and -b.
+#
+class AsmProgram:
+    def __init__(self, constants: List[str], functions: List[AsmFunction]) -> None:
+        self.constants: List[str] = constants
+        self.functions: List[AsmFunction] = functions
+
+
+    # lines of the textual assembly, the Assembler reads them one by one
+    def getLines(self) -> Iterator[str]:
+        yield f"cpc {len(self.constants)}"
+        yield from self.constants
+        yield ""
+
+        for f in self.functions:
+            yield from f.getLines()
+            yield ""
+            yield ""
+
+
+    def getText(self) -> str:
+        return ''.join(l + '\n' for l in self.getLines())
+
+
+#
+# Builds the Code object the VM runs straight from an AsmProgram, without
+#   going through the text and the bytecode. Names are resolved the same way
+#   the Assembler does, but operands are never limited to the width of their
+#   encoding, so pair operands are never unfused and no EXTENDED_ARG is
+#   needed. Instructions are left empty, the VM fills them with its handlers.
+#
+class BytecodeBuilder:
+    def __init__(self, program: AsmProgram) -> None:
+        self._program: AsmProgram = program
+        self._code: Code = Code()
+
+        self._fnDict: Dict[str, int] = {f.name: i for i, f in enumerate(program.functions)}
+
+        # globals are the locals of main, which is always the first function
+        self._globalVarDict: Dict[str, int] = None
+
+
+    def getCodeObj(self) -> Code:
+        self._makeConstPool()
+
+        localVarDicts: List[Dict[str, int]] = []
+        for f in self._program.functions:
+            localVarDict: Dict[str, int] = dict()
+            if self._globalVarDict == None:
+                self._globalVarDict = localVarDict
+            self._code.addToFP(self._makeFunc(f, localVarDict))
+            localVarDicts.append(localVarDict)
+
+        # functions can add globals after main was built, so the local
+        #   counts are only known at the end
+        for f, localVarDict in zip(self._code.func_pool, localVarDicts):
+            f.localc = len(localVarDict)
+
+        return self._code
+
+
+    # function names indexed by function pool index
+    def getFunctionNames(self) -> List[str]:
+        return [f.name for f in self._program.functions]
+
+
+    def _makeConstPool(self) -> None:
+        for line in self._program.constants:
+            typ: str = line[0]
+            value: str = line[1:].strip()
+
+            if typ == 'i':
+                self._code.addToCP(cp_info(Tag.CONSTANT_Integer, int(value)))
+            elif typ == 'd':
+                self._code.addToCP(cp_info(Tag.CONSTANT_Double, float(value)))
+            elif typ == 's':
+                self._code.addToCP(cp_info(Tag.CONSTANT_String, value[1:-1]))
+
+
+    def _makeFunc(self, fn: AsmFunction, localVarDict: Dict[str, int]) -> func_info:
+        f = func_info()
+        f.argc = fn.argc
+
+        # params are the first locals
+        for p in fn.params:
+            localVarDict[p] = len(localVarDict)
+
+        # label -> index of the instruction it marks
+        labels: Dict[str, int] = dict()
+        for ins in fn.body:
+            if ins[0][0] == '.':
+                labels[ins[0][1:]] = len(f.ops)
+                continue
+            f.ops.append(self._makeOp(ins, localVarDict))
+
+        for idx, (op, arg) in enumerate(f.ops):
+            if op in jumpOpcodes:
+                f.ops[idx] = (op, labels[arg])
+
+        return f
+
+
+    # (opcode, operand) of an instruction, jumps keep their label for now
+    def _makeOp(self, ins: List[str], localVarDict: Dict[str, int]) -> Tuple[int, Any]:
+        op: int = opcodeNameDict[ins[0]]
+        operands: List[Any] = ins[1:]
+
+        for i in localOperandDict.get(ins[0], []):
+            if ins[i] not in localVarDict:
+                localVarDict[ins[i]] = len(localVarDict)
+            operands[i - 1] = localVarDict[ins[i]]
+
+        for i in globalOperandDict.get(ins[0], []):
+            if ins[i] not in self._globalVarDict:
+                self._globalVarDict[ins[i]] = len(self._globalVarDict)
+            operands[i - 1] = self._globalVarDict[ins[i]]
+
+        if op in jumpOpcodes:
+            return (op, operands[0])
+
+        for i, o in enumerate(operands):
+            if isinstance(o, str):
+                operands[i] = self._fnDict[o] if o in self._fnDict else int(o)
+
+        if op in pairOperandOpcodes:
+            return (op, (operands[0], operands[1]))
+        if opcodeSizeDict[ins[0]] == 1:
+            return (op, 0)
+        return (op, operands[0])
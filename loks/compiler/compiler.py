@@ -1,62 +1,138 @@
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Tuple, Any
 
 from ..parser.ast import ASTNode
 from ..nodevisitor import NodeVisitor
 from ..stdlib import builtinFunctionInfo
+from ..VM.code.code import Tag, cp_info, reg_func_info, RegisterCode
+from ..assembler.builder import AsmFunction, AsmProgram
+
+
+#
+# Typed instructions for operations whose operand types were proven by the
+#   SemanticAnalyzer (see loks/analyzer/typeinference.py), they skip the
+#   runtime type checks.
+# (instruction, left type, right type) -> typed instruction
+#
+typedInstructions: Dict[Tuple[str, str, str], str] = {
+    ("BINARY_ADD", "number", "number"): "NUM_ADD",
+    ("BINARY_ADD", "string", "string"): "STR_ADD",
+    ("BINARY_SUBTRACT", "number", "number"): "NUM_SUB",
+    ("BINARY_MULTIPLY", "number", "number"): "NUM_MUL",
+    ("BINARY_DIVIDE", "number", "number"): "NUM_DIV",
+    ("BINARY_MODULO", "number", "number"): "NUM_MOD",
+}
+
+for _c in ["EQ", "NE", "GT", "LT", "GE", "LE"]:
+    typedInstructions[(f"CMP{_c}", "number", "number")] = f"NUM_CMP{_c}"
 
 
 class Compiler(NodeVisitor):
     def __init__(self) -> None:
         self._constantPool: List[str] = []
 
-        self._functions: Dict[str] = {
-            "main": ""
+        # function -> [typed, all] arithmetic and comparison instructions
+        self.typedCounts: Dict[str, List[int]] = {
+            "main": [0, 0]
+        }
+
+        self._functions: Dict[str, AsmFunction] = {
+            "main": AsmFunction("main", 0, [])
         }
         self._currentFn: str = "main"
 
         self._globalVars: List[str] = []
+        # params and variables declared in the function being compiled
+        self._localVars: List[str] = []
         self._labelCtr: int = -1
-        
-        self._initCode()
 
 
-    def getCode(self) -> str:
-        cpStr: str = f"cpc {len(self._constantPool)}\n"
-        for s in self._constantPool:
-            cpStr += s + '\n'
+    #
+    # The generated code in memory, for the optimizer passes and the
+    #   BytecodeBuilder (see loks/assembler/builder.py). Call after visiting
+    #   the whole program.
+    #
+    def getProgram(self) -> AsmProgram:
+        main: AsmFunction = self._functions["main"]
+        functions: List[AsmFunction] = [AsmFunction("main", 0, [], main.body + [["END"]])]
+        functions += [f for name, f in self._functions.items() if name != "main"]
+        return AsmProgram(list(self._constantPool), functions)
 
-        output: str = cpStr + '\n'  
 
-        self._functions["main"] += "    END"
-        for f in self._functions:
-            output += self._functions[f] + '\n\n'
-
-        return output
-
-
-    def _initCode(self) -> None:
-        self._functions[self._currentFn] += "fn main\nargc 0\n"
+    # the generated code as textual assembly
+    def getCode(self) -> str:
+        return self.getProgram().getText()
 
 
-    def _emit(self, c: str, fmt: bool = True) -> None:
-        if fmt:
-            self._functions[self._currentFn] += f"    {c}\n"
-        else:
-            self._functions[self._currentFn] += f"    {c}\n"
+    def _emit(self, c: str) -> None:
+        self._functions[self._currentFn].body.append(c.split(' '))
 
 
     def _addConstant(self, c: str) -> None:
         self._constantPool.append(c)
 
 
+    # locals shadow globals with the same name
+    def _isGlobal(self, name: str) -> bool:
+        return name in self._globalVars and name not in self._localVars
+
+
     def _generateLabel(self) -> str:
         self._labelCtr += 1
         return f"L{self._labelCtr}"
 
 
+    # emit the typed version of a binary instruction if the operand types are proven
+    def _emitBinary(self, name: str, node) -> None:
+        typed: str = typedInstructions.get((name, node.left.staticType, node.right.staticType))
+        self._countTyped(typed != None)
+        self._emit(typed or name)
+
+
+    def _countTyped(self, typed: bool) -> None:
+        counts: List[int] = self.typedCounts[self._currentFn]
+        counts[1] += 1
+        if typed:
+            counts[0] += 1
+
+
+    # per function report of the typed instructions, for --stats
+    def getTypedReport(self) -> str:
+        output: str = "static types:\n"
+        for fn, (typed, total) in self.typedCounts.items():
+            output += f"  {fn:<16}{typed} of {total} operations typed\n"
+        return output
+
+
+    #
+    # Compile a statement. Values of expression statements are popped, so the
+    #   operand stack is empty between statements.
+    #
+    def _statement(self, node, startLabl: str = None, endLabl: str = None) -> None:
+        if type(node).__name__ == "ContinueNode":
+            assert startLabl != None
+            self._emit(f"GOTO {startLabl}")
+
+        elif type(node).__name__ == "BreakNode":
+            assert endLabl != None
+            self._emit(f"GOTO {endLabl}")
+
+        elif type(node).__name__ == "BlockNode":
+            self.visit_BlockNode(node, startLabl, endLabl)
+
+        elif type(node).__name__ == "IfNode":
+            self.visit_IfNode(node, startLabl, endLabl)
+
+        elif type(node).__name__ in ["VarDeclNode", "FunDeclNode", "AssignNode", "WhileNode", "ReturnNode"]:
+            self.visit(node)
+
+        else:
+            self.visit(node)
+            self._emit("POP_TOP")
+
+
     def visit_ProgramNode(self, node) -> None:
         for d in node.declarationList:
-            self.visit(d)
+            self._statement(d)
 
 
     def visit_NumberNode(self, node) -> None:
@@ -66,7 +142,8 @@ class Compiler(NodeVisitor):
             self._emit(f"LOAD_CONST {len(self._constantPool)-1}")
             return
 
-        if v < 256:
+        # negative numbers come from constant folding
+        if 0 <= v < 256:
             self._emit(f"BIPUSH {v}")
         else:
             self._addConstant(f"i {v}")
@@ -97,7 +174,7 @@ class Compiler(NodeVisitor):
 
 
     def visit_IdentifierNode(self, node) -> None:
-        if node.token.value in self._globalVars:
+        if self._isGlobal(node.token.value):
             self._emit(f"LOAD_GLOBAL {node.token.value}")
         else:
             self._emit(f"LOAD_LOCAL {node.token.value}")
@@ -123,33 +200,34 @@ class Compiler(NodeVisitor):
             self._emit(f"LOAD_CONST {len(self._constantPool)-1}")
         else:
             self.visit(node.node)
-            self._emit("UNARY_NEGATIVE")
+            self._countTyped(node.node.staticType == "number")
+            self._emit("NUM_NEG" if node.node.staticType == "number" else "UNARY_NEGATIVE")
 
 
     def visit_AddNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("BINARY_ADD")
+        self._emitBinary("BINARY_ADD", node)
 
     def visit_SubNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("BINARY_SUBTRACT")
+        self._emitBinary("BINARY_SUBTRACT", node)
 
     def visit_MulNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("BINARY_MULTIPLY")
+        self._emitBinary("BINARY_MULTIPLY", node)
 
     def visit_DivNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("BINARY_DIVIDE")
+        self._emitBinary("BINARY_DIVIDE", node)
 
     def visit_ModNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("BINARY_MODULO")
+        self._emitBinary("BINARY_MODULO", node)
 
 
     def visit_VarDeclNode(self, node) -> None:
@@ -160,6 +238,8 @@ class Compiler(NodeVisitor):
 
         if self._currentFn == "main":
             self._globalVars.append(node.id.token.value)
+        else:
+            self._localVars.append(node.id.token.value)
 
         self._emit(f"STORE_LOCAL {node.id.token.value}")
 
@@ -169,7 +249,7 @@ class Compiler(NodeVisitor):
 
         if type(node.lvalue).__name__ == "IdentifierNode":
             n: str = node.lvalue.token.value
-            if n in self._globalVars:
+            if self._isGlobal(n):
                 self._emit(f"STORE_GLOBAL {n}")
             else:
                 self._emit(f"STORE_LOCAL {n}")
@@ -181,84 +261,101 @@ class Compiler(NodeVisitor):
 
     def visit_BlockNode(self, node, startLabl: str = None, endLabl: str = None) -> None:
         for s in node.stmtList:
-            if type(s).__name__ == "ContinueNode":
-                self._emit(f"GOTO {startLabl}")
-                continue
-
-            if type(s).__name__ == "BreakNode":
-                self._emit(f"GOTO {endLabl}")
-                continue
-            
-            if type(s).__name__ == "IfNode":
-                self.visit_IfNode(s, startLabl, endLabl)
-            else:
-                self.visit(s)
+            self._statement(s, startLabl, endLabl)
 
 
     def visit_EqualNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPEQ")
+        self._emitBinary("CMPEQ", node)
 
     def visit_NotEqualNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPNE")
+        self._emitBinary("CMPNE", node)
 
     def visit_GreaterThanNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPGT")
+        self._emitBinary("CMPGT", node)
 
     def visit_LessThanNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPLT")
+        self._emitBinary("CMPLT", node)
 
     def visit_GreaterThanEqualNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPGE")
+        self._emitBinary("CMPGE", node)
 
     def visit_LessThanEqualNode(self, node) -> None:
         self.visit(node.left)
         self.visit(node.right)
-        self._emit("CMPLE")
+        self._emitBinary("CMPLE", node)
 
-    def visit_AndNode(self, node) -> str:
-        self.visit(node.left)
-        self.visit(node.right)
-        self._emit("BINARY_AND")
+    # and/or only evaluate their right operand if the left one doesn't decide
+    #   the result, which is a Boolean like in the tree walk interpreter
+    def visit_AndNode(self, node) -> None:
+        self._materialize(node)
 
-    def visit_OrNode(self, node) -> str:
-        self.visit(node.left)
-        self.visit(node.right)
-        self._emit("BINARY_OR")
+    def visit_OrNode(self, node) -> None:
+        self._materialize(node)
 
 
-    def visit_ConditionalNode(self, node, startLabl: str = None, endLabl: str = None) -> str:
-        next: str = self._generateLabel()
-        n = self.visit(node.condition)
-        if not n:
-            self._emit(f"POP_JMP_IF_FALSE {next}")
+    # push the truth value of cond as a Boolean, computed by branches
+    def _materialize(self, cond) -> None:
+        falseLabl: str = self._generateLabel()
+        endLabl: str = self._generateLabel()
 
-        
-        if type(node.statement).__name__ == "ContinueNode":
-            assert startLabl != None
-            self._emit(f"GOTO {startLabl}")
+        self._branch(cond, falseLabl, False)
+        self._emit("LOAD_TRUE")
+        self._emit(f"GOTO {endLabl}")
+        self._emit(f".{falseLabl}")
+        self._emit("LOAD_FALSE")
+        self._emit(f".{endLabl}")
+
+
+    #
+    # Jump to label if the truth value of cond is jumpIf, fall through
+    #   otherwise. and/or/! become branches and comparisons jump on their
+    #   operands (fused into JMP_IF_NOT_xx), so no Boolean is materialized.
+    #
+    def _branch(self, cond, label: str, jumpIf: bool) -> None:
+        typ: str = type(cond).__name__
+
+        if typ == "NotNode":
+            self._branch(cond.node, label, not jumpIf)
+
+        elif typ in ["AndNode", "OrNode"]:
+            # and jumps early on a false left operand, or on a true one
+            early: bool = typ == "OrNode"
+            if jumpIf == early:
+                self._branch(cond.left, label, jumpIf)
+                self._branch(cond.right, label, jumpIf)
+            else:
+                skipLabl: str = self._generateLabel()
+                self._branch(cond.left, skipLabl, early)
+                self._branch(cond.right, label, jumpIf)
+                self._emit(f".{skipLabl}")
+
+        # a == b is true exactly when a != b is false
+        elif typ in ["EqualNode", "NotEqualNode"] and jumpIf:
+            self.visit(cond.left)
+            self.visit(cond.right)
+            self._emitBinary("CMPNE" if typ == "EqualNode" else "CMPEQ", cond)
+            self._emit(f"POP_JMP_IF_FALSE {label}")
 
-        elif type(node.statement).__name__ == "BreakNode":
-            assert endLabl != None
-            self._emit(f"GOTO {endLabl}")
+        else:
+            self.visit(cond)
+            self._emit(f"POP_JMP_IF_{'TRUE' if jumpIf else 'FALSE'} {label}")
 
-        elif type(node.statement).__name__ == "BlockNode":
-            self.visit_BlockNode(node.statement, startLabl, endLabl)
 
-        else:
-            self.visit(node.statement)
+    def visit_ConditionalNode(self, node, startLabl: str = None, endLabl: str = None) -> str:
+        next: str = self._generateLabel()
+        self._branch(node.condition, next, False)
 
-        if n:
-            return n
+        self._statement(node.statement, startLabl, endLabl)
 
         return next
 
@@ -276,19 +373,7 @@ class Compiler(NodeVisitor):
             self._emit(f".{skipElsifLabl}")
 
         if node.elseBlock:
-            if type(node.elseBlock).__name__ == "ContinueNode":
-                assert startLabl != None
-                self._emit(f"GOTO {startLabl}")
-
-            elif type(node.elseBlock).__name__ == "BreakNode":
-                assert startLabl != None
-                self._emit(f"GOTO {endLabl}")
-
-            elif type(node.elseBlock).__name__ == "BlockNode":
-                self.visit_BlockNode(node.elseBlock, startLabl, endLabl)
-
-            else:
-                self.visit(node.elseBlock)
+            self._statement(node.elseBlock, startLabl, endLabl)
 
         self._emit(f".{endifLabl}")
 
@@ -298,13 +383,9 @@ class Compiler(NodeVisitor):
         endLoop: str = self._generateLabel()
 
         self._emit(f".{loop}")
-        self.visit(node.condition)
-        self._emit(f"POP_JMP_IF_FALSE {endLoop}")
+        self._branch(node.condition, endLoop, False)
 
-        if type(node.statement).__name__ in ["BlockNode", "IfNode"]:
-            self.visit_BlockNode(node.statement, loop, endLoop)
-        else:
-            self.visit(node.statement)
+        self._statement(node.statement, loop, endLoop)
 
         self._emit(f"GOTO {loop}")
 
@@ -312,25 +393,41 @@ class Compiler(NodeVisitor):
 
 
     def visit_ReturnNode(self, node) -> None:
+        # return f(...) in a function reuses the frame of the caller
+        if self._isTailCall(node) and self._currentFn != "main":
+            for a in node.expr.argList:
+                self.visit(a)
+            self._emit(f"TAIL_CALL {node.expr.nameNode.token.value}")
+            return
+
         self.visit(node.expr)
         self._emit("RETURN_VALUE")
 
 
+    def _isTailCall(self, node) -> bool:
+        return type(node.expr).__name__ == "FunctionCallNode" and \
+            node.expr.nameNode.token.value not in builtinFunctionInfo
+
+
     def visit_FunDeclNode(self, node) -> None:
         oldFn: str = self._currentFn
+        oldLocals: List[str] = self._localVars
         self._currentFn = node.id.token.value
+        self._localVars = [a.value for a in node.paramList]
+        self.typedCounts[self._currentFn] = [0, 0]
 
-        self._functions[self._currentFn] = f"fn {self._currentFn}\nargc {len(node.paramList)}\n"
-
-        for a in node.paramList:
-            self._emit(f"STORE_LOCAL {a.value}")
+        # the arguments are the first locals of the callee, in order
+        self._functions[self._currentFn] = AsmFunction(
+            self._currentFn, len(node.paramList), [a.value for a in node.paramList]
+        )
         self.visit(node.blockNode)
 
-        if "RETURN_VALUE" not in self._functions[self._currentFn]:
-            self._emit("LOAD_NIL")
-            self._emit("RETURN_VALUE")
+        # functions that end without a return statement return nil
+        self._emit("LOAD_NIL")
+        self._emit("RETURN_VALUE")
 
         self._currentFn = oldFn
+        self._localVars = oldLocals
 
 
     def visit_FunctionCallNode(self, node) -> None:
@@ -344,3 +441,539 @@ class Compiler(NodeVisitor):
 
         self._emit(f"CALL_FUNCTION {node.nameNode.token.value}")
         
+
+
+#
+# Compiles the AST for the register VM in loks/VM/regvm.py.
+# Every function gets its own register file: params are the first registers,
+#   followed by the variables declared in the function and then temporaries.
+#   Temporaries are allocated like a stack and released after each expression.
+# The variables of main are the globals, other functions access them with
+#   GETGLOBAL and SETGLOBAL.
+#
+class RegisterCompiler(NodeVisitor):
+    def __init__(self) -> None:
+        self._code: RegisterCode = RegisterCode()
+        self._constIdx: Dict[Tuple[int, Any], int] = dict()
+
+        self._fnIdx: Dict[str, int] = dict()
+        self._globalVars: Dict[str, int] = dict()
+
+        # state of the function being compiled
+        self._fn: reg_func_info = None
+        self._vars: Dict[str, int] = dict()
+        # registers of the variables that are not declared yet
+        self._reserved: Dict[str, int] = dict()
+        # number of registers below the temporaries
+        self._varc: int = 0
+        self._temp: int = 0
+        self._labels: Dict[str, int] = dict()
+        # (start label, end label) of the enclosing loops
+        self._loops: List[Tuple[str, str]] = []
+
+        # register the current expression should be stored in, None for any
+        self._dst: int = None
+
+        self._labelCtr: int = -1
+
+        self._beginFunction("main", [])
+
+
+    def getCode(self) -> RegisterCode:
+        return self._code
+
+
+    def _emit(self, name: str, a: Any = None, b: Any = None, c: Any = None) -> None:
+        self._fn.code.append((name, a, b, c))
+
+
+    def _generateLabel(self) -> str:
+        self._labelCtr += 1
+        return f"L{self._labelCtr}"
+
+
+    def _placeLabel(self, l: str) -> None:
+        self._labels[l] = len(self._fn.code)
+
+
+    def _addConstant(self, tag: int, v: Any) -> int:
+        if (tag, v) not in self._constIdx:
+            self._constIdx[(tag, v)] = len(self._code.const_pool)
+            self._code.const_pool.append(cp_info(tag, v))
+        return self._constIdx[(tag, v)]
+
+
+    def _newTemp(self) -> int:
+        r: int = self._temp
+        self._temp += 1
+        self._fn.regc = max(self._fn.regc, self._temp)
+        return r
+
+
+    # register for a new variable, only called before the first statement of
+    #   a function so the variables stay below the temporaries
+    def _newVar(self, name: str) -> int:
+        r: int = self._newTemp()
+        self._vars[name] = r
+        if self._fn.name == "main":
+            self._globalVars[name] = r
+        return r
+
+
+    def _beginFunction(self, name: str, params: List[str]) -> None:
+        self._fn = reg_func_info(name, len(params))
+        self._fnIdx[name] = len(self._code.func_pool)
+        self._code.func_pool.append(self._fn)
+
+        self._vars = dict()
+        self._reserved = dict()
+        self._temp = 0
+        self._labels = dict()
+        self._loops = []
+
+        for p in params:
+            self._newVar(p)
+        self._varc = self._temp
+
+
+    #
+    # Reserve registers for every variable a function body declares or
+    #   assigns before compiling it. A variable declared in a loop would
+    #   otherwise get a register above the temporaries of the code before
+    #   it, like the loop condition, which overwrite it on the next iteration.
+    # The names are only declared when the compiler gets to them, code
+    #   before that still refers to the globals.
+    #
+    def _reserveVars(self, body) -> None:
+        for n in self._varNames(body, []):
+            if n not in self._vars and n not in self._reserved:
+                self._reserved[n] = self._newTemp()
+        self._varc = self._temp
+
+
+    # names declared or assigned in node, nested functions have their own
+    def _varNames(self, node, names: List[str]) -> List[str]:
+        typ: str = type(node).__name__
+        if typ == "FunDeclNode":
+            return names
+
+        if typ == "VarDeclNode":
+            names.append(node.id.token.value)
+        elif typ == "AssignNode" and type(node.lvalue).__name__ == "IdentifierNode":
+            names.append(node.lvalue.token.value)
+
+        for v in vars(node).values():
+            for n in (v if isinstance(v, list) else [v]):
+                if isinstance(n, ASTNode):
+                    self._varNames(n, names)
+        return names
+
+
+    # replace labels with instruction indices
+    def _endFunction(self) -> None:
+        code = self._fn.code
+        for idx, (name, a, b, c) in enumerate(code):
+            if name == "JMP":
+                code[idx] = (name, self._labels[a], b, c)
+            elif name in ["JMPIF", "JMPIFNOT"]:
+                code[idx] = (name, a, self._labels[b], c)
+            elif name.startswith("JMPIFNOT"):
+                code[idx] = (name, a, b, self._labels[c])
+
+
+    #
+    # Compile an expression, returns the register that holds its value.
+    # If dst is given the value is stored in dst.
+    #
+    def _expr(self, node, dst: int = None) -> int:
+        self._dst = dst
+        return self.visit(node)
+
+
+    def _takeDst(self) -> int:
+        dst: int = self._dst
+        self._dst = None
+        return dst
+
+
+    def _result(self, dst: int) -> int:
+        if dst == None:
+            return self._newTemp()
+        return dst
+
+
+    def _hasCall(self, node) -> bool:
+        if type(node).__name__ == "FunctionCallNode":
+            return True
+        return any(self._hasCall(n) for n in vars(node).values() if isinstance(n, ASTNode)) or \
+            any(self._hasCall(n) for l in vars(node).values() if isinstance(l, list) for n in l if isinstance(n, ASTNode))
+
+
+    #
+    # Compile two operands. Variables are used in place, unless the second
+    #   operand calls a function that could change the first one.
+    #
+    def _operands(self, left, right) -> Tuple[int, int]:
+        l: int = self._expr(left)
+        if l in self._vars.values() and self._hasCall(right):
+            t: int = self._newTemp()
+            self._emit("MOVE", t, l)
+            l = t
+        r: int = self._expr(right)
+        return l, r
+
+
+    def _binary(self, name: str, node) -> int:
+        dst: int = self._takeDst()
+        t: int = self._temp
+        l, r = self._operands(node.left, node.right)
+        self._temp = t
+        dst = self._result(dst)
+        self._emit(name, dst, l, r)
+        return dst
+
+
+    # compile expressions into consecutive registers, returns the first one
+    def _sequence(self, nodes: List[ASTNode]) -> int:
+        base: int = self._temp
+        for n in nodes:
+            r: int = self._newTemp()
+            self._expr(n, r)
+            self._temp = r + 1
+        return base
+
+
+    #
+    # Jump to label if the truth value of cond is jumpIf. and/or/! become
+    #   branches and comparisons jump on their operands directly, without
+    #   materializing a Boolean.
+    #
+    def _branch(self, cond, label: str, jumpIf: bool) -> None:
+        typ: str = type(cond).__name__
+        cmp: str = {
+            "EqualNode": "EQ", "NotEqualNode": "NE",
+            "GreaterThanNode": "GT", "LessThanNode": "LT",
+            "GreaterThanEqualNode": "GE", "LessThanEqualNode": "LE",
+        }.get(typ)
+        t: int = self._temp
+
+        if typ == "NotNode":
+            self._branch(cond.node, label, not jumpIf)
+
+        elif typ in ["AndNode", "OrNode"]:
+            # and jumps early on a false left operand, or on a true one
+            early: bool = typ == "OrNode"
+            if jumpIf == early:
+                self._branch(cond.left, label, jumpIf)
+                self._branch(cond.right, label, jumpIf)
+            else:
+                skipLabl: str = self._generateLabel()
+                self._branch(cond.left, skipLabl, early)
+                self._branch(cond.right, label, jumpIf)
+                self._placeLabel(skipLabl)
+
+        # a == b is true exactly when a != b is false
+        elif cmp in ["EQ", "NE"] and jumpIf:
+            l, r = self._operands(cond.left, cond.right)
+            self._emit(f"JMPIFNOT{'NE' if cmp == 'EQ' else 'EQ'}", l, r, label)
+
+        elif cmp != None and not jumpIf:
+            l, r = self._operands(cond.left, cond.right)
+            self._emit(f"JMPIFNOT{cmp}", l, r, label)
+
+        else:
+            self._emit("JMPIF" if jumpIf else "JMPIFNOT", self._expr(cond), label)
+
+        self._temp = t
+
+
+    def _statement(self, node) -> None:
+        if type(node).__name__ == "ContinueNode":
+            self._emit("JMP", self._loops[-1][0])
+        elif type(node).__name__ == "BreakNode":
+            self._emit("JMP", self._loops[-1][1])
+        elif type(node).__name__ in ["BlockNode", "IfNode", "WhileNode", "ReturnNode", "VarDeclNode", "AssignNode", "FunDeclNode"]:
+            self.visit(node)
+        else:
+            self._expr(node)
+
+        # temporaries don't live across statements
+        self._temp = self._varc
+
+
+    def visit_ProgramNode(self, node) -> None:
+        self._reserveVars(node)
+        for d in node.declarationList:
+            self._statement(d)
+        self._emit("END")
+        self._endFunction()
+
+
+    def visit_BlockNode(self, node) -> None:
+        for s in node.stmtList:
+            self._statement(s)
+
+
+    def visit_NumberNode(self, node) -> int:
+        dst: int = self._result(self._takeDst())
+        v: Union[int, float] = node.token.value
+        tag: int = Tag.CONSTANT_Double if type(v).__name__ == "float" else Tag.CONSTANT_Integer
+        self._emit("LOADK", dst, self._addConstant(tag, v))
+        return dst
+
+
+    def visit_StringNode(self, node) -> int:
+        dst: int = self._result(self._takeDst())
+        self._emit("LOADK", dst, self._addConstant(Tag.CONSTANT_String, node.token.value))
+        return dst
+
+
+    def visit_NilNode(self, node) -> int:
+        dst: int = self._result(self._takeDst())
+        self._emit("LOADNIL", dst)
+        return dst
+
+
+    def visit_TrueNode(self, node) -> int:
+        dst: int = self._result(self._takeDst())
+        self._emit("LOADTRUE", dst)
+        return dst
+
+
+    def visit_FalseNode(self, node) -> int:
+        dst: int = self._result(self._takeDst())
+        self._emit("LOADFALSE", dst)
+        return dst
+
+
+    def visit_ArrayNode(self, node) -> int:
+        dst: int = self._takeDst()
+        base: int = self._sequence(node.elements)
+        self._temp = base
+        dst = self._result(dst)
+        self._emit("NEWLIST", dst, base, len(node.elements))
+        return dst
+
+
+    def visit_IdentifierNode(self, node) -> int:
+        dst: int = self._takeDst()
+        n: str = node.token.value
+
+        if n in self._vars:
+            if dst == None or dst == self._vars[n]:
+                return self._vars[n]
+            self._emit("MOVE", dst, self._vars[n])
+            return dst
+
+        dst = self._result(dst)
+        if n in self._globalVars:
+            self._emit("GETGLOBAL", dst, self._globalVars[n])
+        else:
+            # never assigned
+            self._emit("LOADNIL", dst)
+        return dst
+
+
+    def visit_ArrayAccessNode(self, node) -> int:
+        dst: int = self._takeDst()
+        t: int = self._temp
+        b, i = self._operands(node.base, node.index)
+        self._temp = t
+        dst = self._result(dst)
+        self._emit("GETINDEX", dst, b, i)
+        return dst
+
+
+    def visit_NotNode(self, node) -> int:
+        dst: int = self._takeDst()
+        t: int = self._temp
+        r: int = self._expr(node.node)
+        self._temp = t
+        dst = self._result(dst)
+        self._emit("NOT", dst, r)
+        return dst
+
+
+    def visit_NegationNode(self, node) -> int:
+        if type(node.node).__name__ == "NumberNode":
+            dst: int = self._result(self._takeDst())
+            v: Union[int, float] = node.node.token.value
+            tag: int = Tag.CONSTANT_Double if type(v).__name__ == "float" else Tag.CONSTANT_Integer
+            self._emit("LOADK", dst, self._addConstant(tag, -v))
+            return dst
+
+        dst: int = self._takeDst()
+        t: int = self._temp
+        r: int = self._expr(node.node)
+        self._temp = t
+        dst = self._result(dst)
+        self._emit("NEG", dst, r)
+        return dst
+
+
+    def visit_AddNode(self, node) -> int:
+        return self._binary("ADD", node)
+
+    def visit_SubNode(self, node) -> int:
+        return self._binary("SUB", node)
+
+    def visit_MulNode(self, node) -> int:
+        return self._binary("MUL", node)
+
+    def visit_DivNode(self, node) -> int:
+        return self._binary("DIV", node)
+
+    def visit_ModNode(self, node) -> int:
+        return self._binary("MOD", node)
+
+    def visit_EqualNode(self, node) -> int:
+        return self._binary("EQ", node)
+
+    def visit_NotEqualNode(self, node) -> int:
+        return self._binary("NE", node)
+
+    def visit_GreaterThanNode(self, node) -> int:
+        return self._binary("GT", node)
+
+    def visit_LessThanNode(self, node) -> int:
+        return self._binary("LT", node)
+
+    def visit_GreaterThanEqualNode(self, node) -> int:
+        return self._binary("GE", node)
+
+    def visit_LessThanEqualNode(self, node) -> int:
+        return self._binary("LE", node)
+
+    # and/or only evaluate their right operand if the left one doesn't decide
+    #   the result
+    def visit_AndNode(self, node) -> int:
+        return self._materialize(node)
+
+    def visit_OrNode(self, node) -> int:
+        return self._materialize(node)
+
+
+    # truth value of cond as a Boolean, computed by branches
+    def _materialize(self, cond) -> int:
+        dst: int = self._result(self._takeDst())
+        falseLabl: str = self._generateLabel()
+        endLabl: str = self._generateLabel()
+
+        # dst is only written after the operands were read
+        self._branch(cond, falseLabl, False)
+        self._emit("LOADTRUE", dst)
+        self._emit("JMP", endLabl)
+        self._placeLabel(falseLabl)
+        self._emit("LOADFALSE", dst)
+        self._placeLabel(endLabl)
+        return dst
+
+
+    def visit_VarDeclNode(self, node) -> None:
+        n: str = node.id.token.value
+
+        # the initializer is compiled before the name is declared, so it
+        #   still refers to a global with the same name
+        r: int = self._vars[n] if n in self._vars else self._reserved[n]
+
+        if node.exprNode != None:
+            self._expr(node.exprNode, r)
+        else:
+            self._emit("LOADNIL", r)
+
+        self._vars[n] = r
+        if self._fn.name == "main":
+            self._globalVars[n] = r
+
+
+    def visit_AssignNode(self, node) -> None:
+        if type(node.lvalue).__name__ == "ArrayAccessNode":
+            v: int = self._expr(node.exprNode)
+            if v in self._vars.values() and (self._hasCall(node.lvalue.base) or self._hasCall(node.lvalue.index)):
+                t: int = self._newTemp()
+                self._emit("MOVE", t, v)
+                v = t
+            b, i = self._operands(node.lvalue.base, node.lvalue.index)
+            self._emit("SETINDEX", b, i, v)
+            return
+
+        n: str = node.lvalue.token.value
+        if n in self._vars:
+            self._expr(node.exprNode, self._vars[n])
+        elif n in self._globalVars:
+            self._emit("SETGLOBAL", self._globalVars[n], self._expr(node.exprNode))
+        else:
+            r: int = self._reserved[n]
+            self._expr(node.exprNode, r)
+            self._vars[n] = r
+
+
+    def visit_IfNode(self, node) -> None:
+        endifLabl: str = self._generateLabel()
+
+        for cs in [node.ifBlock] + node.elsifBloks:
+            skipLabl: str = self._generateLabel()
+            self._branch(cs.condition, skipLabl, False)
+            self._statement(cs.statement)
+            self._emit("JMP", endifLabl)
+            self._placeLabel(skipLabl)
+
+        if node.elseBlock:
+            self._statement(node.elseBlock)
+
+        self._placeLabel(endifLabl)
+
+
+    def visit_WhileNode(self, node) -> None:
+        loop: str = self._generateLabel()
+        endLoop: str = self._generateLabel()
+
+        self._placeLabel(loop)
+        self._branch(node.condition, endLoop, False)
+
+        self._loops.append((loop, endLoop))
+        self._statement(node.statement)
+        self._loops.pop()
+
+        self._emit("JMP", loop)
+        self._placeLabel(endLoop)
+
+
+    def visit_ReturnNode(self, node) -> None:
+        # return f(...) in a function replaces the registers of the caller
+        if type(node.expr).__name__ == "FunctionCallNode" and self._fn.name != "main" and \
+                node.expr.nameNode.token.value not in builtinFunctionInfo:
+            base: int = self._sequence(node.expr.argList)
+            self._emit("TAILCALL", self._fnIdx[node.expr.nameNode.token.value], base)
+            return
+
+        self._emit("RETURN", self._expr(node.expr))
+
+
+    def visit_FunDeclNode(self, node) -> None:
+        old = (self._fn, self._vars, self._reserved, self._varc, self._temp, self._labels, self._loops)
+
+        self._beginFunction(node.id.token.value, [a.value for a in node.paramList])
+        self._reserveVars(node.blockNode)
+        self._statement(node.blockNode)
+
+        r: int = self._newTemp()
+        self._emit("LOADNIL", r)
+        self._emit("RETURN", r)
+        self._endFunction()
+
+        self._fn, self._vars, self._reserved, self._varc, self._temp, self._labels, self._loops = old
+
+
+    def visit_FunctionCallNode(self, node) -> int:
+        dst: int = self._takeDst()
+        base: int = self._sequence(node.argList)
+        self._temp = base
+        dst = self._result(dst)
+
+        n: str = node.nameNode.token.value
+        if n in builtinFunctionInfo:
+            self._emit("CALLNATIVE", dst, builtinFunctionInfo[n][0], base)
+        else:
+            self._emit("CALL", dst, self._fnIdx[n], base)
+        return dst
@@ -5,6 +5,7 @@ class opcode(Enum):
     LOAD_NIL = 0x01
     LOAD_TRUE = 0x02
     LOAD_FALSE = 0x03
+    POP_TOP = 0x04
     LOAD_CONST = 0x64  #arg = u8 x2
 
     BINARY_ADD = 0x17
@@ -45,6 +46,50 @@ class opcode(Enum):
     CALL_FUNCTION = 0x83  #arg= u8
     CALL_NATIVE = 0x84  #arg= u8
     RETURN_VALUE = 0x53
+    TAIL_CALL = 0x85  #arg= u8, call and return its value, reusing the frame
+
+    # superinstructions, generated by loks/optimizer/superinstructions.py
+    # compare and POP_JMP_IF_FALSE, arg = u8 x2
+    JMP_IF_NOT_EQ = 0xb0
+    JMP_IF_NOT_NE = 0xb1
+    JMP_IF_NOT_GT = 0xb2
+    JMP_IF_NOT_LT = 0xb3
+    JMP_IF_NOT_GE = 0xb4
+    JMP_IF_NOT_LE = 0xb5
+
+    ADD_LOCALS = 0xb6  #arg = u8, u8 (two locals)
+    INC_LOCAL = 0xb7  #arg = u8, u8 (local, increment)
+
+    # typed instructions, emitted for operands whose types the
+    #   SemanticAnalyzer proved, they don't check the types at runtime
+    NUM_ADD = 0xc0
+    NUM_SUB = 0xc1
+    NUM_MUL = 0xc2
+    NUM_DIV = 0xc3
+    NUM_MOD = 0xc4
+    NUM_NEG = 0xc5
+    STR_ADD = 0xc6
+
+    NUM_CMPEQ = 0xc7
+    NUM_CMPNE = 0xc8
+    NUM_CMPGT = 0xc9
+    NUM_CMPLT = 0xca
+    NUM_CMPGE = 0xcb
+    NUM_CMPLE = 0xcc
+
+    # typed superinstructions, arg = u8 x2
+    NUM_JMP_IF_NOT_EQ = 0xcd
+    NUM_JMP_IF_NOT_NE = 0xce
+    NUM_JMP_IF_NOT_GT = 0xcf
+    NUM_JMP_IF_NOT_LT = 0xd0
+    NUM_JMP_IF_NOT_GE = 0xd1
+    NUM_JMP_IF_NOT_LE = 0xd2
+
+    NUM_ADD_LOCALS = 0xd3  #arg = u8, u8 (two locals)
+
+    # arg = u8, the operand of the next instruction is the operands of its
+    #   EXTENDED_ARG prefixes followed by its own, in big-endian order
+    EXTENDED_ARG = 0x90
 
 
 def makeOpcodeDict():
@@ -66,11 +111,38 @@ def makeOpcodeNameDict():
 
 opcodeDict = makeOpcodeDict()
 opcodeNameDict = makeOpcodeNameDict()
+
+# opcodes whose operand is the location of another instruction
+jumpOpcodes = {
+    opcode.GOTO.value,
+    opcode.POP_JMP_IF_TRUE.value,
+    opcode.POP_JMP_IF_FALSE.value,
+    opcode.JMP_IF_NOT_EQ.value,
+    opcode.JMP_IF_NOT_NE.value,
+    opcode.JMP_IF_NOT_GT.value,
+    opcode.JMP_IF_NOT_LT.value,
+    opcode.JMP_IF_NOT_GE.value,
+    opcode.JMP_IF_NOT_LE.value,
+    opcode.NUM_JMP_IF_NOT_EQ.value,
+    opcode.NUM_JMP_IF_NOT_NE.value,
+    opcode.NUM_JMP_IF_NOT_GT.value,
+    opcode.NUM_JMP_IF_NOT_LT.value,
+    opcode.NUM_JMP_IF_NOT_GE.value,
+    opcode.NUM_JMP_IF_NOT_LE.value,
+}
+
+# opcodes with two u8 operands instead of a single u16 one
+pairOperandOpcodes = {
+    opcode.ADD_LOCALS.value,
+    opcode.INC_LOCAL.value,
+    opcode.NUM_ADD_LOCALS.value,
+}
 opcodeSizeDict = {
     "END" : 1,
     "LOAD_NIL" : 1,
     "LOAD_TRUE" : 1,
     "LOAD_FALSE" : 1,
+    "POP_TOP" : 1,
     "LOAD_CONST" : 3, #arg : u8 x2
 
     "BINARY_ADD" : 1,
@@ -110,4 +182,45 @@ opcodeSizeDict = {
     "CALL_FUNCTION" : 2,  #arg: u8
     "CALL_NATIVE": 2,
     "RETURN_VALUE" : 1,
+    "TAIL_CALL" : 2,  #arg: u8
+
+    #arg : u8 x2
+    "JMP_IF_NOT_EQ" : 3,
+    "JMP_IF_NOT_NE" : 3,
+    "JMP_IF_NOT_GT" : 3,
+    "JMP_IF_NOT_LT" : 3,
+    "JMP_IF_NOT_GE" : 3,
+    "JMP_IF_NOT_LE" : 3,
+
+    #arg : u8, u8
+    "ADD_LOCALS" : 3,
+    "INC_LOCAL" : 3,
+
+    "NUM_ADD" : 1,
+    "NUM_SUB" : 1,
+    "NUM_MUL" : 1,
+    "NUM_DIV" : 1,
+    "NUM_MOD" : 1,
+    "NUM_NEG" : 1,
+    "STR_ADD" : 1,
+
+    "NUM_CMPEQ" : 1,
+    "NUM_CMPNE" : 1,
+    "NUM_CMPGT" : 1,
+    "NUM_CMPLT" : 1,
+    "NUM_CMPGE" : 1,
+    "NUM_CMPLE" : 1,
+
+    #arg : u8 x2
+    "NUM_JMP_IF_NOT_EQ" : 3,
+    "NUM_JMP_IF_NOT_NE" : 3,
+    "NUM_JMP_IF_NOT_GT" : 3,
+    "NUM_JMP_IF_NOT_LT" : 3,
+    "NUM_JMP_IF_NOT_GE" : 3,
+    "NUM_JMP_IF_NOT_LE" : 3,
+
+    #arg : u8, u8
+    "NUM_ADD_LOCALS" : 3,
+
+    "EXTENDED_ARG" : 2,  #arg : u8
 }
@@ -0,0 +1,604 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+from ..nodevisitor import NodeVisitor
+
+from .interpreter import TailCall, comparableTypes
+from ..types import LObject, Array, String, Function, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
+from ..stdlib import builtinFunctionTable
+
+from ..error import TypeErr, ZeroDivErr, SyntaxErr, IndexErr
+
+
+#
+# Variables of one activation, like ActivationRecord in memory.py.
+# A function's scope encloses the scope of its caller, names that are not
+#   found in a scope are looked up in the enclosing ones.
+#
+class Scope:
+    __slots__ = ("vars", "enclosing")
+
+    def __init__(self, enclosing: "Scope" = None) -> None:
+        self.vars: Dict[str, Any] = dict()
+        self.enclosing: Scope = enclosing
+
+
+def lookup(scope: Scope, name: str) -> Any:
+    while True:
+        v = scope.vars.get(name)
+        if v is not None or scope.enclosing is None:
+            return v
+        scope = scope.enclosing
+
+
+# compiled node, called with the scope it runs in
+Closure = Callable[[Scope], Any]
+
+# results of 'continue' and 'break' statements
+CONTINUE: str = "continue"
+BREAK: str = "break"
+
+
+# line of a node for error messages, None if it has no token
+def _line(node) -> int:
+    token = getattr(node, "token", None)
+    return token.line if token is not None else None
+
+
+def _typeName(v: LObject) -> str:
+    return type(v).__name__
+
+
+# functions are false here, like in the tree walk interpreter
+def _isTruthy(obj: LObject) -> bool:
+    if obj.tag == TypeTag.FUNCTION:
+        return False
+    return isTruthy(obj)
+
+
+#
+# Second tree walk interpreter, with the same behavior as Interpeter in
+#   interpreter.py, statement results included.
+# Instead of visiting the AST every time code runs, the AST is visited
+#   once and every node is turned into a python closure specialized for it:
+#   operands are closures of the child nodes, and names, constants, line
+#   numbers and the checks that only depend on the node are resolved while
+#   compiling. Running the program is calling the closure of ProgramNode.
+#
+class ClosureCompiler(NodeVisitor):
+    def __init__(self) -> None:
+        # True while compiling the body of a function
+        self._inFunction: bool = False
+
+
+    def compile(self, ast) -> Closure:
+        return self.visit(ast)
+
+
+    def run(self, ast) -> None:
+        self.compile(ast)(Scope())
+
+
+    #
+    # Visit methods, each one returns the closure of its node
+    #
+
+    def visit_ProgramNode(self, node) -> Closure:
+        decls: Tuple[Closure, ...] = tuple(self.visit(d) for d in node.declarationList)
+
+        def program(scope: Scope) -> None:
+            for d in decls:
+                d(scope)
+
+        return program
+
+
+    def visit_NumberNode(self, node) -> Closure:
+        v: LObject = makeNumber(node.token.value)
+        return lambda scope: v
+
+
+    def visit_NilNode(self, node) -> Closure:
+        return lambda scope: NIL
+
+
+    def visit_TrueNode(self, node) -> Closure:
+        return lambda scope: TRUE
+
+
+    def visit_FalseNode(self, node) -> Closure:
+        return lambda scope: FALSE
+
+
+    def visit_StringNode(self, node) -> Closure:
+        v: LObject = String(node.token.value)
+        return lambda scope: v
+
+
+    def visit_ArrayNode(self, node) -> Closure:
+        elements: Tuple[Closure, ...] = tuple(self.visit(e) for e in node.elements)
+
+        def array(scope: Scope) -> Array:
+            arr: Array = Array()
+            for e in elements:
+                arr.addEl(e(scope))
+            return arr
+
+        return array
+
+
+    def visit_ArrayAccessNode(self, node) -> Closure:
+        base: Closure = self.visit(node.base)
+        index: Closure = self.visit(node.index)
+        line: int = _line(node.base)
+
+        def arrayAccess(scope: Scope) -> LObject:
+            arrObj = base(scope)
+            if arrObj.tag != TypeTag.ARRAY:
+                raise TypeErr(f"Type '{_typeName(arrObj)}' is not subscriptable", line)
+
+            idx = index(scope)
+            if idx.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Array indices must be integers, not '{_typeName(idx)}'", line)
+
+            if type(idx.value) is float:
+                raise TypeErr(f"Array indices must be integers, not float", line)
+
+            el = arrObj.getEL(idx.value)
+            if el == None:
+                raise IndexErr(line)
+            return el
+
+        return arrayAccess
+
+
+    # main's scope never has an enclosing scope, so its names need no lookup
+    def visit_IdentifierNode(self, node) -> Closure:
+        name: str = node.token.value
+
+        if not self._inFunction:
+            return lambda scope: scope.vars.get(name)
+
+        return lambda scope: lookup(scope, name)
+
+
+    def visit_VarDeclNode(self, node) -> Closure:
+        name: str = node.id.token.value
+
+        if not node.exprNode:
+            def varDeclNil(scope: Scope) -> None:
+                scope.vars[name] = NIL
+            return varDeclNil
+
+        expr: Closure = self.visit(node.exprNode)
+
+        def varDecl(scope: Scope) -> None:
+            scope.vars[name] = expr(scope)
+
+        return varDecl
+
+
+    def visit_AssignNode(self, node) -> Closure:
+        expr: Closure = self.visit(node.exprNode)
+        lvalue = node.lvalue
+
+        if type(lvalue).__name__ == "IdentifierNode":
+            name: str = lvalue.token.value
+
+            def assign(scope: Scope) -> None:
+                scope.vars[name] = expr(scope)
+
+            return assign
+
+        # arr[i] = expr, the array can be any expression, like a[i][j] = expr
+        base: Closure = self.visit(lvalue.base)
+        index: Closure = self.visit(lvalue.index)
+        line: int = _line(lvalue.base)
+
+        def assignElement(scope: Scope) -> None:
+            val = expr(scope)
+
+            arrObj = base(scope)
+            if arrObj.tag != TypeTag.ARRAY:
+                raise TypeErr(f"Type '{_typeName(arrObj)}' is not subscriptable", line)
+
+            idx = index(scope)
+            if idx.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Array indices must be integers, not '{_typeName(idx)}'", line)
+
+            if type(idx.value) is float:
+                raise TypeErr(f"Array indices must be integers, not float", line)
+
+            arrObj.setEL(val, idx.value)
+
+        return assignElement
+
+
+    # arithmetic nodes
+    def visit_NegationNode(self, node) -> Closure:
+        operand: Closure = self.visit(node.node)
+        line: int = _line(node.node)
+
+        def negation(scope: Scope) -> LObject:
+            v = operand(scope)
+            if v.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Cannot negate {_typeName(v)}", line)
+            return makeNumber(-v.value)
+
+        return negation
+
+
+    def visit_AddNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def add(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+
+            if l.tag == TypeTag.NUMBER:
+                if r.tag != TypeTag.NUMBER:
+                    raise TypeErr(f"Cannot add {_typeName(r)} to Number", line)
+                return makeNumber(l.value + r.value)
+
+            elif l.tag == TypeTag.STRING:
+                if r.tag != TypeTag.STRING:
+                    raise TypeErr(f"Cannot add {_typeName(r)} to String", line)
+                return String(l.value + r.value)
+
+            raise TypeErr(f"Addition not defined for type '{_typeName(l)}'", line)
+
+        return add
+
+
+    def visit_SubNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def sub(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Cannot subtract {_typeName(r)} from {_typeName(l)}", line)
+            return makeNumber(l.value - r.value)
+
+        return sub
+
+
+    def visit_DivNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def div(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Cannot divide {_typeName(l)} by {_typeName(r)}", line)
+            if r.value == 0:
+                raise ZeroDivErr(line)
+            return makeNumber(l.value / r.value)
+
+        return div
+
+
+    def visit_MulNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def mul(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Cannot multiply {_typeName(l)} by {_typeName(r)}", line)
+            return makeNumber(l.value * r.value)
+
+        return mul
+
+
+    def visit_ModNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def mod(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Invalid operand type for modulo: {_typeName(l)} and {_typeName(r)}", line)
+            if r.value == 0:
+                raise ZeroDivErr(line)
+            return makeNumber(l.value % r.value)
+
+        return mod
+
+
+    # comparision nodes
+    def visit_GreaterThanNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def greaterThan(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Invalid operand type for greater than operator: {_typeName(l)} and {_typeName(r)}", line)
+            return TRUE if l.value > r.value else FALSE
+
+        return greaterThan
+
+
+    def visit_GreaterThanEqualNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def greaterThanEqual(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Invalid operand type for greater than equals operator: {_typeName(l)} and {_typeName(r)}", line)
+            return TRUE if l.value >= r.value else FALSE
+
+        return greaterThanEqual
+
+
+    def visit_LessThanNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def lessThan(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Invalid operand type for less than operator: {_typeName(l)} and {_typeName(r)}", line)
+            return TRUE if l.value < r.value else FALSE
+
+        return lessThan
+
+
+    def visit_LessThanEqualNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def lessThanEqual(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                raise TypeErr(f"Invalid operand type for less than equals operator: {_typeName(l)} and {_typeName(r)}", line)
+            return TRUE if l.value <= r.value else FALSE
+
+        return lessThanEqual
+
+
+    def visit_EqualNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def equal(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag not in comparableTypes or r.tag not in comparableTypes:
+                raise TypeErr(f"Cannot compare {_typeName(l)} and {_typeName(r)}", line)
+            return TRUE if valuesEqual(l, r) else FALSE
+
+        return equal
+
+
+    def visit_NotEqualNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        line: int = _line(node.left)
+
+        def notEqual(scope: Scope) -> LObject:
+            l = left(scope)
+            r = right(scope)
+            if l.tag not in comparableTypes or r.tag not in comparableTypes:
+                raise TypeErr(f"Cannot compare {_typeName(l)} and {_typeName(r)}", line)
+            return FALSE if valuesEqual(l, r) else TRUE
+
+        return notEqual
+
+
+    def visit_NotNode(self, node) -> Closure:
+        operand: Closure = self.visit(node.node)
+        return lambda scope: FALSE if _isTruthy(operand(scope)) else TRUE
+
+
+    def visit_AndNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        return lambda scope: TRUE if _isTruthy(left(scope)) and _isTruthy(right(scope)) else FALSE
+
+
+    def visit_OrNode(self, node) -> Closure:
+        left: Closure = self.visit(node.left)
+        right: Closure = self.visit(node.right)
+        return lambda scope: TRUE if _isTruthy(left(scope)) or _isTruthy(right(scope)) else FALSE
+
+
+    #
+    # Statements return what the visit methods of Interpeter return:
+    #   None or a value, CONTINUE/BREAK, and True/False for the arms of an
+    #   if. A block stops at the first statement that returns something other
+    #   than None or nil, and at return statements.
+    #
+    def visit_BlockNode(self, node) -> Closure:
+        stmts: List[Tuple[Closure, bool]] = [
+            (self.visit(s), type(s).__name__ == "ReturnNode") for s in node.stmtList
+        ]
+
+        # a lone return is the common body of small functions
+        if len(stmts) == 1 and stmts[0][1]:
+            return stmts[0][0]
+
+        stmts: Tuple[Tuple[Closure, bool], ...] = tuple(stmts)
+
+        def block(scope: Scope) -> Any:
+            for s, isReturn in stmts:
+                v = s(scope)
+                if (v is not None and v is not NIL) or isReturn:
+                    return v
+            return NIL
+
+        return block
+
+
+    def visit_ContinueNode(self, node) -> Closure:
+        return lambda scope: CONTINUE
+
+
+    def visit_BreakNode(self, node) -> Closure:
+        return lambda scope: BREAK
+
+
+    def visit_ConditionalNode(self, node) -> Closure:
+        cond: Closure = self.visit(node.condition)
+        stmt: Closure = self.visit(node.statement)
+        isReturn: bool = type(node.statement).__name__ == "ReturnNode"
+
+        def conditional(scope: Scope) -> Any:
+            if not _isTruthy(cond(scope)):
+                return False
+
+            r = stmt(scope)
+            if (r is not None and r is not NIL) or isReturn:
+                return r
+            return True
+
+        return conditional
+
+
+    def visit_IfNode(self, node) -> Closure:
+        ifBlock: Closure = self.visit(node.ifBlock)
+        elsifBlocks: Tuple[Closure, ...] = tuple(self.visit(b) for b in node.elsifBloks)
+        elseBlock: Closure = self.visit(node.elseBlock) if node.elseBlock else None
+
+        def ifStmt(scope: Scope) -> Any:
+            res = ifBlock(scope)
+
+            if res is False:
+                for b in elsifBlocks:
+                    res = b(scope)
+                    if res is True:
+                        break
+
+                    # a return statement was hit
+                    if res is not False:
+                        return res
+
+            if res is False and elseBlock != None:
+                res = elseBlock(scope)
+
+            if res is True or res is False:
+                return None
+            return res
+
+        return ifStmt
+
+
+    def visit_WhileNode(self, node) -> Closure:
+        cond: Closure = self.visit(node.condition)
+        stmt: Closure = self.visit(node.statement)
+
+        def whileStmt(scope: Scope) -> Any:
+            c = cond(scope)
+            while _isTruthy(c):
+                res = stmt(scope)
+                c = cond(scope)
+
+                if res is not None and res is not NIL and res is not CONTINUE:
+                    return res
+
+        return whileStmt
+
+
+    def visit_ReturnNode(self, node) -> Closure:
+        line: int = node.line
+        expr = node.expr
+
+        if not self._inFunction:
+            def returnOutside(scope: Scope) -> None:
+                raise SyntaxErr("'return' outside function", line)
+            return returnOutside
+
+        # return f(...): the call is made by the caller's call closure, so
+        #   tail recursion doesn't grow the python stack
+        if type(expr).__name__ == "FunctionCallNode" and str(expr.nameNode) not in builtinFunctionTable:
+            name: str = expr.nameNode.token.value
+            args: Tuple[Closure, ...] = tuple(self.visit(a) for a in expr.argList)
+
+            def returnTailCall(scope: Scope) -> TailCall:
+                return TailCall(lookup(scope, name), [a(scope) for a in args])
+
+            return returnTailCall
+
+        return self.visit(expr)
+
+
+    # functions keep their compiled body in place of the AST block
+    def visit_FunDeclNode(self, node) -> Closure:
+        name: str = node.id.token.value
+        params: List[str] = [a.value for a in node.paramList]
+
+        inFunction: bool = self._inFunction
+        self._inFunction = True
+        body: Closure = self.visit(node.blockNode)
+        self._inFunction = inFunction
+
+        def funDecl(scope: Scope) -> None:
+            scope.vars[name] = Function(name, params, body)
+
+        return funDecl
+
+
+    def visit_FunctionCallNode(self, node) -> Closure:
+        name: str = str(node.nameNode)
+        args: Tuple[Closure, ...] = tuple(self.visit(a) for a in node.argList)
+
+        if name in builtinFunctionTable:
+            builtin = builtinFunctionTable[name]
+            return lambda scope: builtin([a(scope) for a in args])
+
+        name = node.nameNode.token.value
+
+        def call(scope: Scope) -> Any:
+            # the callee's scope encloses the caller's
+            newScope: Scope = Scope(scope)
+
+            funObj: Function = lookup(scope, name)
+            newVars: Dict[str, Any] = newScope.vars
+            for a, f in zip(funObj.args, args):
+                newVars[a] = f(scope)
+
+            retval = funObj.block(newScope)
+
+            # tail calls replace the scope of the function that made them
+            while type(retval) is TailCall:
+                function: Function = retval.function
+
+                # the new scope encloses the old one, like in an ordinary
+                #   call, unless that can't change any lookup, see
+                #   Interpeter._tailCall
+                enclosing: Scope = newScope.enclosing
+                for n, v in newScope.vars.items():
+                    if n not in function.args and lookup(enclosing, n) is not v:
+                        enclosing = newScope
+                        break
+
+                newScope = Scope(enclosing)
+                newVars = newScope.vars
+                for a, v in zip(function.args, retval.args):
+                    newVars[a] = v
+
+                retval = function.block(newScope)
+
+            return retval
+
+        return call
@@ -1,10 +1,24 @@
+from typing import List
+
 from ..nodevisitor import NodeVisitor
 
 from .memory import CallStack, ActivationRecord, ARType
-from ..types import LObject, Number, Nil, Array, Boolean, String, Function
+from ..types import LObject, Number, Nil, Array, Boolean, String, Function, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
 from ..stdlib import builtinFunctionTable
 
-from ..error import TypeErr, ZeroDivErr, SyntaxErr
+from ..error import TypeErr, ZeroDivErr, SyntaxErr, IndexErr
+
+# a call in tail position, made by the caller's visit_FunctionCallNode after
+#   the current function returned
+class TailCall:
+    def __init__(self, function: Function, args: List[LObject]) -> None:
+        self.function: Function = function
+        self.args: List[LObject] = args
+
+
+# types that '==' and '!=' are defined for
+comparableTypes = (TypeTag.NIL, TypeTag.NUMBER, TypeTag.BOOLEAN, TypeTag.STRING)
+
 
 class Interpeter(NodeVisitor):
     def __init__(self) -> None:
@@ -23,33 +37,12 @@ class Interpeter(NodeVisitor):
     # Check if a LObject is truthy
     #
     def _isTruthy(self, obj: LObject) -> bool:
-        if self._getObjType(obj) == "Number":
-            if obj.value == 0:
-                return False
-            return True
-
-        elif self._getObjType(obj) == "String":
-            if len(obj.value) == 0:
-                return False
-            return True
-
-        elif self._getObjType(obj) == "Nil":
+        # functions are false here, unlike in the VMs
+        if obj.tag == TypeTag.FUNCTION:
             return False
 
-        elif self._getObjType(obj) == "Boolean":
-            if obj.value == "false":
-                return False
-            return True
-
-        elif self._getObjType(obj) == "Array":
-            if obj.getLen() == 0:
-                return False
-            return True
-
-        elif self._getObjType(obj) == "Function":
-            return False
+        return isTruthy(obj)
 
-        return True
 
     #
     # Visit methods
@@ -70,19 +63,19 @@ class Interpeter(NodeVisitor):
             
     
     def visit_NumberNode(self, node) -> Number:
-        return Number(node.token.value)
+        return makeNumber(node.token.value)
 
 
     def visit_NilNode(self, node) -> Nil:
-        return Nil()
+        return NIL
 
 
     def visit_TrueNode(self, node) -> Boolean:
-        return Boolean("true")
+        return TRUE
 
 
     def visit_FalseNode(self, node) -> Boolean:
-        return Boolean("false")
+        return FALSE
 
 
     def visit_StringNode(self, node) -> String:
@@ -100,18 +93,21 @@ class Interpeter(NodeVisitor):
         arrObj = self.visit(node.base)
 
         # check if variable actually holds an array
-        if type(arrObj).__name__ != "Array":
+        if arrObj.tag != TypeTag.ARRAY:
             raise TypeErr(f"Type '{type(arrObj).__name__}' is not subscriptable", node.base.token.line)
 
         idx = self.visit(node.index)  # array index
 
         # check if index is an integer
-        if type(idx).__name__ != "Number":
+        if idx.tag != TypeTag.NUMBER:
             raise TypeErr(f"Array indices must be integers, not '{type(idx).__name__}'", node.base.token.line)
 
-        if type(idx.value).__name__ == "float":
+        if type(idx.value) is float:
             raise TypeErr(f"Array indices must be integers, not float", node.base.token.line)
 
+        if arrObj.getEL(idx.value) == None:
+            raise IndexErr(node.base.token.line)
+
         # everything ok
         return arrObj.getEL(idx.value)
 
@@ -121,7 +117,7 @@ class Interpeter(NodeVisitor):
     
 
     def visit_VarDeclNode(self, node) -> None:
-        val = self.visit(node.exprNode) if node.exprNode else Nil()
+        val = self.visit(node.exprNode) if node.exprNode else NIL
         self._curFrame[node.id.token.value] = val
 
 
@@ -131,15 +127,15 @@ class Interpeter(NodeVisitor):
         if type(node.lvalue).__name__ == "ArrayAccessNode":
             arrObj = self._curFrame[node.lvalue.base.token.value]
             # check if variable holds an array
-            if type(arrObj).__name__ != "Array":
+            if arrObj.tag != TypeTag.ARRAY:
                 raise TypeErr(f"Type '{type(arrObj).__name__}' is not subscriptable", node.lvalue.base.token.line)
 
             idx = self.visit(node.lvalue.index)
             # check if index is an integer
-            if type(idx).__name__ != "Number":
+            if idx.tag != TypeTag.NUMBER:
                 raise TypeErr(f"Array indices must be integers, not '{type(idx).__name__}'", node.lvalue.base.token.line)
 
-            if type(idx.value).__name__ == "float":
+            if type(idx.value) is float:
                 raise TypeErr(f"Array indices must be integers, not float", node.base.token.line)
             
             arrObj.setEL(val, idx.value)
@@ -152,10 +148,10 @@ class Interpeter(NodeVisitor):
     def visit_NegationNode(self, node) -> Number:
         v = self.visit(node.node)
 
-        if self._getObjType(v) != "Number":
+        if v.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot negate {self._getObjType(v)}", node.node.token.line)
 
-        return Number(-v.value)
+        return makeNumber(-v.value)
 
 
     def visit_AddNode(self, node) -> Number:
@@ -163,16 +159,16 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # concat strings
-        if self._getObjType(l) == "String":
-            if self._getObjType(r) != "String":
+        if l.tag == TypeTag.STRING:
+            if r.tag != TypeTag.STRING:
                 raise TypeErr(f"Cannot add {self._getObjType(r)} to String", node.left.token.line)
             return String(l.value + r.value)
 
         # check type for numbers
-        elif self._getObjType(l) == "Number":
-            if self._getObjType(r) != "Number":
+        elif l.tag == TypeTag.NUMBER:
+            if r.tag != TypeTag.NUMBER:
                 raise TypeErr(f"Cannot add {self._getObjType(r)} to Number", node.left.token.line)
-            return Number(l.value + r.value)
+            return makeNumber(l.value + r.value)
         
         # addition is not defined for any other type
         else:
@@ -184,10 +180,10 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # check if both l and r are numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot subtract {self._getObjType(r)} from {self._getObjType(l)}", node.left.token.line)
 
-        return Number(l.value - r.value)
+        return makeNumber(l.value - r.value)
 
 
     def visit_DivNode(self, node) -> Number:
@@ -195,14 +191,14 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # check if both l and r are numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot divide {self._getObjType(l)} by {self._getObjType(r)}", node.left.token.line)
 
         # division by zero
         if r.value == 0:
             raise ZeroDivErr(node.left.token.line)
 
-        return Number(l.value / r.value)
+        return makeNumber(l.value / r.value)
 
 
     def visit_MulNode(self, node) -> Number:
@@ -210,10 +206,10 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # check if both l and r are numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Cannot multiply {self._getObjType(l)} by {self._getObjType(r)}", node.left.token.line)
 
-        return Number(l.value * r.value)
+        return makeNumber(l.value * r.value)
 
 
     def visit_ModNode(self, node) -> Number:
@@ -221,14 +217,14 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # check if both l and r are numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for modulo: {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
         # division by zero
         if r.value == 0:
             raise ZeroDivErr(node.left.token.line)
 
-        return Number(l.value % r.value)
+        return makeNumber(l.value % r.value)
 
 
     # comparision nodes
@@ -237,13 +233,13 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # comparision only valid for numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for greater than operator: {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
         if l.value > r.value:
-            return Boolean("true")
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_GreaterThanEqualNode(self, node) -> Boolean:
@@ -251,13 +247,13 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # comparision only valid for numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for greater than equals operator: {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
         if l.value >= r.value:
-            return Boolean("true")
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_LessThanNode(self, node) -> Boolean:
@@ -265,13 +261,13 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # comparision only valid for numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for less than operator: {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
         if l.value < r.value:
-            return Boolean("true")
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_LessThanEqualNode(self, node) -> Boolean:
@@ -279,86 +275,72 @@ class Interpeter(NodeVisitor):
         r = self.visit(node.right)
 
         # comparision only valid for numbers
-        if self._getObjType(l) != "Number" or self._getObjType(r) != "Number":
+        if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
             raise TypeErr(f"Invalid operand type for less than equals operator: {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
         if l.value <= r.value:
-            return Boolean("true")
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_EqualNode(self, node) -> Boolean:
         l = self.visit(node.left)
         r = self.visit(node.right)
 
-        allowedTypes = [
-            "Nil",
-            "Number",
-            "Boolean",
-            "String",
-        ]
-
-        if self._getObjType(l) not in allowedTypes or self._getObjType(r) not in allowedTypes:
+        if l.tag not in comparableTypes or r.tag not in comparableTypes:
             raise TypeErr(f"Cannot compare {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
-        if l.value == r.value:
-            return Boolean("true")
+        if valuesEqual(l, r):
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_NotEqualNode(self, node) -> Boolean:
         l = self.visit(node.left)
         r = self.visit(node.right)
 
-        allowedTypes = [
-            "Nil",
-            "Number",
-            "Boolean",
-            "String",
-        ]
-
-        if self._getObjType(l) not in allowedTypes or self._getObjType(r) not in allowedTypes:
+        if l.tag not in comparableTypes or r.tag not in comparableTypes:
             raise TypeErr(f"Cannot compare {self._getObjType(l)} and {self._getObjType(r)}", node.left.token.line)
 
-        if l.value != r.value:
-            return Boolean("true")
+        if not valuesEqual(l, r):
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_NotNode(self, node) -> Boolean:
         val = self.visit(node.node)
 
         if self._isTruthy(val):
-            return Boolean("false")
+            return FALSE
 
-        return Boolean("true")
+        return TRUE
 
 
     def visit_AndNode(self, node) -> Boolean:
         l = self._isTruthy(self.visit(node.left))
         if not l:
-            return Boolean("false")
+            return FALSE
 
         r = self._isTruthy(self.visit(node.right))
         if not r:
-            return Boolean("false")
+            return FALSE
 
-        return Boolean("true")
+        return TRUE
 
 
     def visit_OrNode(self, node) -> Boolean:
         l = self._isTruthy(self.visit(node.left))
         if l:
-            return Boolean("true")
+            return TRUE
 
         r = self._isTruthy(self.visit(node.right))
         if r:
-            return Boolean("true")
+            return TRUE
 
-        return Boolean("false")
+        return FALSE
 
 
     def visit_BlockNode(self, node) -> Nil:
@@ -376,7 +358,7 @@ class Interpeter(NodeVisitor):
             if type(s).__name__ == "ReturnNode":
                 return v
 
-        return Nil()
+        return NIL
 
 
     def visit_ContinueNode(self, node) -> str:
@@ -443,6 +425,13 @@ class Interpeter(NodeVisitor):
     def visit_ReturnNode(self, node) -> LObject:
         if self._curFrame.type != ARType.FUNCTION:
             raise SyntaxErr("'return' outside function", node.line)
+
+        # return f(...): let the active visit_FunctionCallNode make the call,
+        #   so tail recursion doesn't grow the python stack
+        if type(node.expr).__name__ == "FunctionCallNode" and str(node.expr.nameNode) not in builtinFunctionTable:
+            funObj = self._curFrame.get(node.expr.nameNode.token.value)
+            return TailCall(funObj, [self.visit(a) for a in node.expr.argList])
+
         return self.visit(node.expr)
 
 
@@ -480,9 +469,41 @@ class Interpeter(NodeVisitor):
         # execute the function
         retval = self.visit(funObj.block)
 
+        # tail calls replace the frame of the function that made them
+        while type(retval).__name__ == "TailCall":
+            retval = self._tailCall(retval)
+
         # pop frame
         self._callStack.pop()
         self._curFrame = self._callStack.peek()
         
         return retval
 
+
+    def _tailCall(self, call) -> LObject:
+        oldFrame: ActivationRecord = self._callStack.pop()
+
+        #
+        # Names are resolved through the frames of the callers, so the new
+        #   frame encloses the old one, like an ordinary call. The old frame
+        #   is only skipped if that can't change any lookup: every name in it
+        #   is a parameter of the callee, which hides it, or has the same
+        #   value in the frames further up. This keeps tail recursion from
+        #   growing the chain of frames.
+        #
+        enclosing = oldFrame.members.enclosingEnv
+        for name, value in oldFrame.members.items():
+            if name not in call.function.args and enclosing.get(name) is not value:
+                enclosing = oldFrame.members
+                break
+
+        newFrame = ActivationRecord(ARType.FUNCTION)
+        newFrame.setEnclosingEnv(enclosing)
+        for a, v in zip(call.function.args, call.args):
+            newFrame[a] = v
+
+        self._callStack.push(newFrame)
+        self._curFrame = newFrame
+
+        return self.visit(call.function.block)
+
@@ -41,6 +41,9 @@ class Environment:
     def __setitem__(self, key, value):
         self._members[key] = value
 
+    def items(self):
+        return self._members.items()
+
     def __str__(self) -> str:
         output = ''
         for v in self._members:
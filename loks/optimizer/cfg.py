@@ -0,0 +1,266 @@
+from typing import List, Dict, Set
+
+from ..assembler.builder import AsmFunction, AsmProgram
+
+
+# instructions whose last operand is a label
+jumpInstructions: Set[str] = {
+    "GOTO", "POP_JMP_IF_TRUE", "POP_JMP_IF_FALSE",
+    "JMP_IF_NOT_EQ", "JMP_IF_NOT_NE", "JMP_IF_NOT_GT",
+    "JMP_IF_NOT_LT", "JMP_IF_NOT_GE", "JMP_IF_NOT_LE",
+    "NUM_JMP_IF_NOT_EQ", "NUM_JMP_IF_NOT_NE", "NUM_JMP_IF_NOT_GT",
+    "NUM_JMP_IF_NOT_LT", "NUM_JMP_IF_NOT_GE", "NUM_JMP_IF_NOT_LE",
+}
+
+# instructions after which execution doesn't continue with the next one
+exitInstructions: Set[str] = {"GOTO", "RETURN_VALUE", "TAIL_CALL", "END"}
+
+# the VM ignores a return in main, execution continues after it
+mainExitInstructions: Set[str] = exitInstructions - {"RETURN_VALUE"}
+
+
+#
+# A straight line of instructions, entered only at the top through one of
+#   its labels (or by falling through from the block before it) and left
+#   only by its last instruction.
+# Instructions are split into opcode and operands.
+#
+class BasicBlock:
+    def __init__(self, exits: Set[str]) -> None:
+        self.labels: List[str] = []
+        self.instructions: List[List[str]] = []
+        self._exits: Set[str] = exits
+
+
+    def last(self) -> List[str]:
+        if len(self.instructions) == 0:
+            return None
+        return self.instructions[-1]
+
+
+    # label the last instruction jumps to, None if it doesn't jump
+    def target(self) -> str:
+        ins: List[str] = self.last()
+        if ins == None or ins[0] not in jumpInstructions:
+            return None
+        return ins[-1]
+
+
+    # True if execution can continue with the next block
+    def fallsThrough(self) -> bool:
+        ins: List[str] = self.last()
+        return ins == None or ins[0] not in self._exits
+
+
+#
+# The basic blocks of one function in the order of the code
+#
+class FunctionCFG:
+    def __init__(self, fn: AsmFunction, isMain: bool = False) -> None:
+        self.fn: AsmFunction = fn
+        self.blocks: List[BasicBlock] = []
+
+        exits: Set[str] = mainExitInstructions if isMain else exitInstructions
+
+        block: BasicBlock = BasicBlock(exits)
+        for ins in fn.body:
+            if ins[0][0] == '.':
+                # a label starts a new block, unless the current one is still empty
+                if len(block.instructions) > 0:
+                    self.blocks.append(block)
+                    block = BasicBlock(exits)
+                block.labels.append(ins[0][1:])
+                continue
+
+            # a copy, jumps are retargeted in place
+            block.instructions.append(list(ins))
+
+            if ins[0] in jumpInstructions or ins[0] in exits:
+                self.blocks.append(block)
+                block = BasicBlock(exits)
+
+        if len(block.labels) > 0 or len(block.instructions) > 0:
+            self.blocks.append(block)
+
+
+    def blockOf(self) -> Dict[str, int]:
+        return {l: i for i, b in enumerate(self.blocks) for l in b.labels}
+
+
+    # the function with the optimized code, labels nothing jumps to are left out
+    def lower(self) -> AsmFunction:
+        used: Set[str] = {b.target() for b in self.blocks}
+
+        body: List[List[str]] = []
+        for b in self.blocks:
+            body += [[f".{l}"] for l in b.labels if l in used]
+            body += b.instructions
+
+        return AsmFunction(self.fn.name, self.fn.argc, self.fn.params, body)
+
+
+#
+# Optimization pass over the code generated by the compiler. Every function
+#   is split into basic blocks, which are simplified and turned back into
+#   assembly:
+#   - branches on a constant, like the 'true' condition of a for loop
+#     without one, become a GOTO or disappear
+#   - jumps to a GOTO jump to its target instead, jumps to the next block
+#     are removed
+#   - blocks that can't be reached from the start of the function are removed
+# Runs before the SuperinstructionFuser, which only fuses within a block.
+#
+class ControlFlowOptimizer:
+    def __init__(self, program: AsmProgram) -> None:
+        self._program: AsmProgram = program
+
+        # truth value of every constant in the pool
+        self._constants: List[bool] = []
+
+        self.foldedBranches: int = 0
+        self.threadedJumps: int = 0
+        self.removedBlocks: int = 0
+
+
+    def getProgram(self) -> AsmProgram:
+        for c in self._program.constants:
+            self._addConstant(c)
+
+        functions: List[AsmFunction] = []
+        # main is always the first function
+        for i, fn in enumerate(self._program.functions):
+            f: FunctionCFG = FunctionCFG(fn, i == 0)
+            self._foldBranches(f)
+
+            # threading and removing blocks make room for each other
+            self._mergeEmpty(f)
+            self._removeUnreachable(f)
+            while self._threadJumps(f):
+                self._mergeEmpty(f)
+                self._removeUnreachable(f)
+
+            functions.append(f.lower())
+
+        return AsmProgram(self._program.constants, functions)
+
+
+    def _addConstant(self, line: str) -> None:
+        typ: str = line[0]
+        value: str = line[1:].strip()
+        if typ == 'i':
+            self._constants.append(int(value) != 0)
+        elif typ == 'd':
+            self._constants.append(float(value) != 0)
+        else:
+            self._constants.append(len(value) > 2)
+
+
+    # truth value pushed by ins, None if it isn't known at compile time
+    def _truthValue(self, ins: List[str]) -> bool:
+        if ins[0] == "LOAD_TRUE":
+            return True
+        if ins[0] in ["LOAD_FALSE", "LOAD_NIL"]:
+            return False
+        if ins[0] == "BIPUSH":
+            return int(ins[1]) != 0
+        if ins[0] == "LOAD_CONST":
+            return self._constants[int(ins[1])]
+        return None
+
+
+    def _foldBranches(self, f: FunctionCFG) -> None:
+        for b in f.blocks:
+            if len(b.instructions) < 2 or b.last()[0] not in ["POP_JMP_IF_TRUE", "POP_JMP_IF_FALSE"]:
+                continue
+
+            value: bool = self._truthValue(b.instructions[-2])
+            if value == None:
+                continue
+
+            branch: List[str] = b.instructions.pop()
+            b.instructions.pop()
+            if value == (branch[0] == "POP_JMP_IF_TRUE"):
+                b.instructions.append(["GOTO", branch[1]])
+            self.foldedBranches += 1
+
+
+    # blocks without instructions pass their labels on to the next block
+    def _mergeEmpty(self, f: FunctionCFG) -> None:
+        blocks: List[BasicBlock] = []
+        labels: List[str] = []
+
+        for b in f.blocks:
+            if len(b.instructions) == 0:
+                labels += b.labels
+                continue
+            b.labels = labels + b.labels
+            labels = []
+            blocks.append(b)
+
+        # labels at the end of the function are only jumped to from dead code
+        f.blocks = blocks
+
+
+    # block that is executed first when jumping to block i
+    def _destination(self, f: FunctionCFG, i: int) -> int:
+        seen: Set[int] = set()
+        blockOf: Dict[str, int] = f.blockOf()
+
+        while i not in seen and len(f.blocks[i].instructions) == 1 and f.blocks[i].last()[0] == "GOTO":
+            seen.add(i)
+            i = blockOf[f.blocks[i].target()]
+
+        return i
+
+
+    # returns True if a jump was changed
+    def _threadJumps(self, f: FunctionCFG) -> bool:
+        changed: bool = False
+        blockOf: Dict[str, int] = f.blockOf()
+
+        for i, b in enumerate(f.blocks):
+            target: str = b.target()
+            if target == None:
+                continue
+
+            dest: int = self._destination(f, blockOf[target])
+            if dest != blockOf[target]:
+                b.last()[-1] = f.blocks[dest].labels[0]
+                self.threadedJumps += 1
+                changed = True
+
+            # a jump to the next block only has to pop its condition
+            if dest == i + 1:
+                if b.last()[0] == "GOTO":
+                    b.instructions.pop()
+                elif b.last()[0] in ["POP_JMP_IF_TRUE", "POP_JMP_IF_FALSE"]:
+                    b.instructions[-1] = ["POP_TOP"]
+                else:
+                    continue
+                self.threadedJumps += 1
+                changed = True
+
+        return changed
+
+
+    def _removeUnreachable(self, f: FunctionCFG) -> None:
+        blockOf: Dict[str, int] = f.blockOf()
+        reached: Set[int] = set()
+        work: List[int] = [0]
+
+        while len(work) > 0:
+            i: int = work.pop()
+            if i in reached or i >= len(f.blocks):
+                continue
+            reached.add(i)
+
+            b: BasicBlock = f.blocks[i]
+            if b.target() != None:
+                work.append(blockOf[b.target()])
+            if b.fallsThrough():
+                work.append(i + 1)
+
+        # END stays at the end of main
+        kept: List[BasicBlock] = [b for i, b in enumerate(f.blocks) if i in reached or b.last() == ["END"]]
+        self.removedBlocks += len(f.blocks) - len(kept)
+        f.blocks = kept
@@ -0,0 +1,376 @@
+from typing import Callable, Union
+
+from ..nodevisitor import NodeVisitor
+from ..parser.ast import ASTNode, NumberNode, StringNode, TrueNode, FalseNode, NilNode
+from ..lexer.token import Token, TokenType
+from ..types import LObject, String, NIL, TRUE, FALSE, makeNumber, TypeTag, isTruthy, valuesEqual
+
+
+# range of the integer constants in the constant pool
+INT_MIN: int = -2**63
+INT_MAX: int = 2**63 - 1
+
+
+# first token of an expression, for the line of folded nodes
+def _firstToken(node) -> Token:
+    while not hasattr(node, "token"):
+        if hasattr(node, "left"):
+            node = node.left
+        elif hasattr(node, "node"):
+            node = node.node
+        else:
+            return None
+    return node.token
+
+
+#
+# AST optimization pass, run between the SemanticAnalyzer and the compilers.
+# Operations on literals are evaluated at compile time, with the semantics
+#   of the VMs:
+#   - arithmetic, string concatenation, comparisons, '!', unary '-', 'and'
+#     and 'or'
+#   - x * 1, 1 * x and x - 0 become x if x is known to be a number, x + 0
+#     and 0 + x only if x is known to be an integer (-0.0 + 0 is 0.0)
+# Operations that fail at runtime, like type errors and division by zero,
+#   are left alone so they still fail at runtime. So are results that don't
+#   fit in the constant pool.
+# Statements are changed in place, every visit method returns the node that
+#   replaces the visited one.
+#
+class ConstantFolder(NodeVisitor):
+    def __init__(self) -> None:
+        # number of nodes that were replaced
+        self.foldedCount: int = 0
+
+
+    def fold(self, ast: ASTNode) -> ASTNode:
+        return self.visit(ast)
+
+
+    # literal node -> value, None if the node is not a literal
+    def _value(self, node: ASTNode) -> LObject:
+        typ: str = type(node).__name__
+
+        if typ == "NumberNode":
+            return makeNumber(node.token.value)
+        if typ == "StringNode":
+            return String(node.token.value)
+        if typ == "TrueNode":
+            return TRUE
+        if typ == "FalseNode":
+            return FALSE
+        if typ == "NilNode":
+            return NIL
+        return None
+
+
+    # value -> literal node replacing node, None if it can't be a constant
+    def _literal(self, v: LObject, node: ASTNode) -> ASTNode:
+        tok: Token = _firstToken(node)
+        line: int = tok.line if tok is not None else 0
+        pos: int = tok.position if tok is not None else 0
+
+        if v.tag == TypeTag.NUMBER:
+            if type(v.value) is int and not INT_MIN <= v.value <= INT_MAX:
+                return None
+            return NumberNode(Token(TokenType.NUMBER, v.value, line, pos))
+
+        if v.tag == TypeTag.STRING:
+            return StringNode(Token(TokenType.STRING, v.value, line, pos))
+
+        if v.tag == TypeTag.BOOLEAN:
+            if v.value:
+                return TrueNode(Token(TokenType.TRUE, "true", line, pos))
+            return FalseNode(Token(TokenType.FALSE, "false", line, pos))
+
+        return NilNode(Token(TokenType.NIL, "nil", line, pos))
+
+
+    def _replace(self, node: ASTNode, v: LObject) -> ASTNode:
+        if v == None:
+            return node
+
+        literal: ASTNode = self._literal(v, node)
+        if literal == None:
+            return node
+
+        self.foldedCount += 1
+        return literal
+
+
+    # True if node always evaluates to a number (or fails)
+    def _isNumber(self, node: ASTNode) -> bool:
+        typ: str = type(node).__name__
+
+        if typ in ["NumberNode", "SubNode", "MulNode", "DivNode", "ModNode", "NegationNode"]:
+            return True
+        if typ == "AddNode":
+            return self._isNumber(node.left) and self._isNumber(node.right)
+        return False
+
+
+    # True if node always evaluates to an integer (or fails)
+    def _isInteger(self, node: ASTNode) -> bool:
+        typ: str = type(node).__name__
+
+        if typ == "NumberNode":
+            return type(node.token.value) is int
+        if typ in ["AddNode", "SubNode", "MulNode", "ModNode"]:
+            return self._isInteger(node.left) and self._isInteger(node.right)
+        if typ == "NegationNode":
+            return self._isInteger(node.node)
+        return False
+
+
+    # True if node is the integer literal n
+    def _isIntLiteral(self, node: ASTNode, n: int) -> bool:
+        return type(node).__name__ == "NumberNode" and type(node.token.value) is int and node.token.value == n
+
+
+    # fold a binary operation, op returns None if it can't be folded
+    def _binary(self, node, op: Callable[[LObject, LObject], LObject]) -> ASTNode:
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+
+        l: LObject = self._value(node.left)
+        r: LObject = self._value(node.right)
+        if l == None or r == None:
+            return node
+
+        return self._replace(node, op(l, r))
+
+
+    # op on two numbers, None for any other operands
+    def _numeric(self, node, op: Callable[[Union[int, float], Union[int, float]], Union[int, float]]) -> ASTNode:
+        def fold(l: LObject, r: LObject) -> LObject:
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                return None
+
+            v: Union[int, float] = op(l.value, r.value)
+            return makeNumber(v) if v != None else None
+
+        return self._binary(node, fold)
+
+
+    # comparison of two numbers, None for any other operands
+    def _compare(self, node, op: Callable[[Union[int, float], Union[int, float]], bool]) -> ASTNode:
+        def fold(l: LObject, r: LObject) -> LObject:
+            if l.tag != TypeTag.NUMBER or r.tag != TypeTag.NUMBER:
+                return None
+            return TRUE if op(l.value, r.value) else FALSE
+
+        return self._binary(node, fold)
+
+
+    # an operand replaces the whole operation
+    def _simplify(self, node, operand: ASTNode) -> ASTNode:
+        self.foldedCount += 1
+        return operand
+
+
+    #
+    # Statements
+    #
+
+    def visit_ProgramNode(self, node) -> ASTNode:
+        node.declarationList = [self.visit(d) for d in node.declarationList]
+        return node
+
+
+    def visit_BlockNode(self, node) -> ASTNode:
+        node.stmtList = [self.visit(s) for s in node.stmtList]
+        return node
+
+
+    def visit_VarDeclNode(self, node) -> ASTNode:
+        if node.exprNode != None:
+            node.exprNode = self.visit(node.exprNode)
+        return node
+
+
+    def visit_FunDeclNode(self, node) -> ASTNode:
+        node.blockNode = self.visit(node.blockNode)
+        return node
+
+
+    def visit_AssignNode(self, node) -> ASTNode:
+        node.lvalue = self.visit(node.lvalue)
+        node.exprNode = self.visit(node.exprNode)
+        return node
+
+
+    def visit_ConditionalNode(self, node) -> ASTNode:
+        node.condition = self.visit(node.condition)
+        node.statement = self.visit(node.statement)
+        return node
+
+
+    def visit_WhileNode(self, node) -> ASTNode:
+        return self.visit_ConditionalNode(node)
+
+
+    def visit_IfNode(self, node) -> ASTNode:
+        node.ifBlock = self.visit(node.ifBlock)
+        node.elsifBloks = [self.visit(b) for b in node.elsifBloks]
+        if node.elseBlock != None:
+            node.elseBlock = self.visit(node.elseBlock)
+        return node
+
+
+    def visit_ReturnNode(self, node) -> ASTNode:
+        node.expr = self.visit(node.expr)
+        return node
+
+
+    def visit_ContinueNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_BreakNode(self, node) -> ASTNode:
+        return node
+
+
+    #
+    # Expressions
+    #
+
+    def visit_NumberNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_StringNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_TrueNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_FalseNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_NilNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_IdentifierNode(self, node) -> ASTNode:
+        return node
+
+
+    def visit_ArrayNode(self, node) -> ASTNode:
+        node.elements = [self.visit(e) for e in node.elements]
+        return node
+
+
+    def visit_ArrayAccessNode(self, node) -> ASTNode:
+        node.base = self.visit(node.base)
+        node.index = self.visit(node.index)
+        return node
+
+
+    def visit_FunctionCallNode(self, node) -> ASTNode:
+        node.argList = [self.visit(a) for a in node.argList]
+        return node
+
+
+    def visit_AddNode(self, node) -> ASTNode:
+        def fold(l: LObject, r: LObject) -> LObject:
+            if l.tag == TypeTag.NUMBER and r.tag == TypeTag.NUMBER:
+                return makeNumber(l.value + r.value)
+            if l.tag == TypeTag.STRING and r.tag == TypeTag.STRING:
+                return String(l.value + r.value)
+            return None
+
+        node = self._binary(node, fold)
+        if type(node).__name__ != "AddNode":
+            return node
+
+        if self._isIntLiteral(node.right, 0) and self._isInteger(node.left):
+            return self._simplify(node, node.left)
+        if self._isIntLiteral(node.left, 0) and self._isInteger(node.right):
+            return self._simplify(node, node.right)
+        return node
+
+
+    def visit_SubNode(self, node) -> ASTNode:
+        node = self._numeric(node, lambda l, r: l - r)
+        if type(node).__name__ != "SubNode":
+            return node
+
+        if self._isIntLiteral(node.right, 0) and self._isNumber(node.left):
+            return self._simplify(node, node.left)
+        return node
+
+
+    def visit_MulNode(self, node) -> ASTNode:
+        node = self._numeric(node, lambda l, r: l * r)
+        if type(node).__name__ != "MulNode":
+            return node
+
+        if self._isIntLiteral(node.right, 1) and self._isNumber(node.left):
+            return self._simplify(node, node.left)
+        if self._isIntLiteral(node.left, 1) and self._isNumber(node.right):
+            return self._simplify(node, node.right)
+        return node
+
+
+    # division and modulo by zero are runtime errors
+    def visit_DivNode(self, node) -> ASTNode:
+        return self._numeric(node, lambda l, r: l / r if r != 0 else None)
+
+
+    def visit_ModNode(self, node) -> ASTNode:
+        return self._numeric(node, lambda l, r: l % r if r != 0 else None)
+
+
+    def visit_GreaterThanNode(self, node) -> ASTNode:
+        return self._compare(node, lambda l, r: l > r)
+
+
+    def visit_GreaterThanEqualNode(self, node) -> ASTNode:
+        return self._compare(node, lambda l, r: l >= r)
+
+
+    def visit_LessThanNode(self, node) -> ASTNode:
+        return self._compare(node, lambda l, r: l < r)
+
+
+    def visit_LessThanEqualNode(self, node) -> ASTNode:
+        return self._compare(node, lambda l, r: l <= r)
+
+
+    def visit_EqualNode(self, node) -> ASTNode:
+        return self._binary(node, lambda l, r: TRUE if valuesEqual(l, r) else FALSE)
+
+
+    def visit_NotEqualNode(self, node) -> ASTNode:
+        return self._binary(node, lambda l, r: FALSE if valuesEqual(l, r) else TRUE)
+
+
+    def visit_AndNode(self, node) -> ASTNode:
+        return self._binary(node, lambda l, r: TRUE if isTruthy(l) and isTruthy(r) else FALSE)
+
+
+    def visit_OrNode(self, node) -> ASTNode:
+        return self._binary(node, lambda l, r: TRUE if isTruthy(l) or isTruthy(r) else FALSE)
+
+
+    def visit_NotNode(self, node) -> ASTNode:
+        node.node = self.visit(node.node)
+
+        v: LObject = self._value(node.node)
+        if v == None:
+            return node
+
+        return self._replace(node, FALSE if isTruthy(v) else TRUE)
+
+
+    def visit_NegationNode(self, node) -> ASTNode:
+        node.node = self.visit(node.node)
+
+        v: LObject = self._value(node.node)
+        if v == None or v.tag != TypeTag.NUMBER:
+            return node
+
+        return self._replace(node, makeNumber(-v.value))
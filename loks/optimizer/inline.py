@@ -0,0 +1,432 @@
+import copy
+from typing import Dict, List, Set, Tuple
+
+from ..nodevisitor import NodeVisitor
+from ..parser.ast import ASTNode, BlockNode, VarDeclNode, AssignNode, WhileNode, BreakNode
+from ..parser.ast import IdentifierNode, TrueNode, NilNode
+from ..lexer.token import Token, TokenType
+from ..stdlib import builtinFunctionInfo
+from ..analyzer.typeinference import TypeInference
+
+
+_literalNodes: Set[str] = {"NumberNode", "StringNode", "TrueNode", "FalseNode", "NilNode"}
+
+
+# child nodes of any node, calls don't include their name
+def _children(node) -> List[ASTNode]:
+    if type(node).__name__ == "FunctionCallNode":
+        return list(node.argList)
+
+    children: List[ASTNode] = []
+    for v in vars(node).values():
+        if isinstance(v, ASTNode):
+            children.append(v)
+        elif isinstance(v, list):
+            children += [n for n in v if isinstance(n, ASTNode)]
+    return children
+
+
+def _walk(node) -> List[ASTNode]:
+    nodes: List[ASTNode] = [node]
+    for c in _children(node):
+        nodes += _walk(c)
+    return nodes
+
+
+def _ident(name: str) -> IdentifierNode:
+    return IdentifierNode(Token(TokenType.ID, name, 0, 0))
+
+
+#
+# What the Inliner knows about a function declared in main
+#
+class InlineInfo:
+    def __init__(self, node) -> None:
+        self.node = node
+        self.name: str = node.id.token.value
+        self.params: List[str] = [p.value for p in node.paramList]
+
+        nodes: List[ASTNode] = _walk(node.blockNode)
+        types: List[str] = [type(n).__name__ for n in nodes]
+
+        self.size: int = len(nodes)
+
+        self.locals: Set[str] = set(self.params)
+        self.locals |= {n.id.token.value for n in nodes if type(n).__name__ == "VarDeclNode"}
+
+        # variables the function assigns, and the globals it uses
+        self.assigned: Set[str] = {
+            n.lvalue.token.value for n in nodes
+            if type(n).__name__ == "AssignNode" and type(n.lvalue).__name__ == "IdentifierNode"
+        }
+        self.globals: Set[str] = {
+            n.token.value for n in nodes
+            if type(n).__name__ == "IdentifierNode" and n.token.value not in self.locals
+        }
+
+        # user functions it calls
+        self.calls: Set[str] = {
+            n.nameNode.token.value for n in nodes
+            if type(n).__name__ == "FunctionCallNode" and n.nameNode.token.value not in builtinFunctionInfo
+        }
+
+        # True if it can assign a global, directly or through a call, set by the Inliner
+        self.writesGlobals: bool = len(self.assigned - self.locals) > 0
+
+        self.recursive: bool = self.name in self.calls
+        self.hasFunDecl: bool = "FunDeclNode" in types
+
+        # "none" without a return statement, "last" if the last statement is
+        #   the only one, "any" otherwise
+        returns: int = types.count("ReturnNode")
+        stmts: List[ASTNode] = node.blockNode.stmtList
+        if returns == 0:
+            self.returnShape: str = "none"
+        elif returns == 1 and type(stmts[-1]).__name__ == "ReturnNode":
+            self.returnShape: str = "last"
+        else:
+            self.returnShape: str = "any"
+
+        self.returnInLoop: bool = any(
+            "ReturnNode" in [type(m).__name__ for m in _walk(n.statement)]
+            for n in nodes if type(n).__name__ == "WhileNode"
+        )
+
+
+#
+# Inlining, an AST pass run after the ConstantFolder. Calls to small
+#   functions declared in main are replaced by their body, which saves the
+#   frame, the argument copies and the return of a call.
+# The locals of the inlined function are renamed to names no program can
+#   use ($<function><site>_<name>), params become variables initialized with
+#   the arguments, or are replaced by the argument if it is a literal or a
+#   variable neither the function nor the call can change. The result is
+#   stored in $<function><site>. If the function returns before its last
+#   statement, the body is wrapped in 'while (true) { ... break; }' and every
+#   return becomes an assignment and a break, the ControlFlowOptimizer
+#   removes the loop again. Functions that return inside a loop, call
+#   themselves or declare functions are not inlined.
+# The body runs before the statement containing the call, so only calls that
+#   are evaluated first in the statement are inlined: nothing but variables,
+#   literals and other inlined calls may come before them, and the variables
+#   may not be globals the call can assign. Calls in the condition of a
+#   loop, an elsif or the right operand of 'and'/'or' are not inlined either.
+# Functions are declared before they are called, so the bodies of the
+#   functions a function calls are already inlined when it is inlined itself.
+#   The types of the program are inferred again afterwards, since arguments
+#   now flow into the inlined code.
+#
+class Inliner(NodeVisitor):
+    def __init__(self, maxSize: int = 40) -> None:
+        # functions with more AST nodes in their body are not inlined
+        self.maxSize: int = maxSize
+
+        # (function, caller, line) of every inlined call
+        self.inlinedSites: List[Tuple[str, str, int]] = []
+
+        self._functions: Dict[str, InlineInfo] = dict()
+        self._siteCtr: int = -1
+
+        # function being optimized, and its locals, None in main
+        self._caller: str = "main"
+        self._callerLocals: Set[str] = None
+
+        # statements that have to run before the statement being optimized
+        self._prefix: List[ASTNode] = []
+
+        # True while only variables, literals and inlined calls were
+        #   evaluated in the expression, and if one of the variables was a global
+        self._clean: bool = True
+        self._readGlobal: bool = False
+
+
+    def inline(self, ast: ASTNode) -> ASTNode:
+        self.visit(ast)
+        if len(self.inlinedSites) > 0:
+            TypeInference().visit(ast)
+        return ast
+
+
+    # list of inlined call sites, for --stats
+    def getReport(self) -> str:
+        output: str = f"inlining: {len(self.inlinedSites)} call sites inlined\n"
+        for fn, caller, line in self.inlinedSites:
+            output += f"  {fn} into {caller}, line {line}\n"
+        return output
+
+
+    #
+    # Statements, every statement is replaced by a list of statements: the
+    #   inlined bodies of its calls followed by the statement itself.
+    #
+
+    def visit_ProgramNode(self, node) -> None:
+        node.declarationList = self._statements(node.declarationList)
+
+
+    def visit_BlockNode(self, node) -> None:
+        node.stmtList = self._statements(node.stmtList)
+
+
+    def _statements(self, stmts: List[ASTNode]) -> List[ASTNode]:
+        output: List[ASTNode] = []
+        for s in stmts:
+            output += self._statement(s)
+        return output
+
+
+    # statement in a place that takes a single one, like the body of an if
+    def _single(self, stmt: ASTNode) -> ASTNode:
+        stmts: List[ASTNode] = self._statement(stmt)
+        if len(stmts) == 1:
+            return stmts[0]
+        return BlockNode(stmts)
+
+
+    def _statement(self, node) -> List[ASTNode]:
+        typ: str = type(node).__name__
+        self._prefix = []
+
+        if typ in ["ProgramNode", "BlockNode"]:
+            self.visit(node)
+            return [node]
+
+        if typ == "FunDeclNode":
+            self._funDecl(node)
+            return [node]
+
+        if typ == "WhileNode":
+            node.statement = self._single(node.statement)
+            return [node]
+
+        if typ == "IfNode":
+            node.ifBlock.condition = self._extract(node.ifBlock.condition)
+            prefix: List[ASTNode] = self._prefix
+
+            for c in [node.ifBlock] + node.elsifBloks:
+                c.statement = self._single(c.statement)
+            if node.elseBlock != None:
+                node.elseBlock = self._single(node.elseBlock)
+            return prefix + [node]
+
+        if typ == "VarDeclNode":
+            if node.exprNode != None:
+                node.exprNode = self._extract(node.exprNode)
+
+        elif typ == "AssignNode":
+            node.exprNode = self._extract(node.exprNode)
+
+        elif typ == "ReturnNode":
+            node.expr = self._extract(node.expr)
+
+        elif typ not in ["ContinueNode", "BreakNode"]:
+            # expression statement, an inlined call leaves nothing to evaluate
+            node = self._extract(node, False)
+            if node == None or type(node).__name__ in _literalNodes | {"IdentifierNode"}:
+                return self._prefix
+
+        return self._prefix + [node]
+
+
+    def _funDecl(self, node) -> None:
+        outer: Tuple[str, Set[str]] = (self._caller, self._callerLocals)
+
+        self._caller = node.id.token.value
+        self._callerLocals = set(p.value for p in node.paramList)
+        self._callerLocals |= {n.id.token.value for n in _walk(node.blockNode) if type(n).__name__ == "VarDeclNode"}
+
+        self.visit(node.blockNode)
+
+        self._caller, self._callerLocals = outer
+
+        # functions declared in other functions are left alone
+        if self._callerLocals == None:
+            info: InlineInfo = InlineInfo(node)
+            info.writesGlobals = info.writesGlobals or any(self._writesGlobals(f) for f in info.calls - {info.name})
+            self._functions[info.name] = info
+
+
+    #
+    # Expressions. Calls that are evaluated first are inlined: their body is
+    #   added to self._prefix and they are replaced by their result.
+    #
+
+    def _extract(self, node, used: bool = True) -> ASTNode:
+        self._clean = True
+        self._readGlobal = False
+        return self._expr(node, used)
+
+
+    def _expr(self, node, used: bool = True) -> ASTNode:
+        typ: str = type(node).__name__
+
+        if typ == "IdentifierNode":
+            if not self._isCallerLocal(node.token.value):
+                self._readGlobal = True
+            return node
+
+        if typ in _literalNodes:
+            return node
+
+        if typ in ["AndNode", "OrNode"]:
+            node.left = self._expr(node.left)
+            # the right operand is only evaluated if the left one doesn't decide
+            self._clean = False
+            return node
+
+        if typ == "FunctionCallNode":
+            clean: bool = self._clean
+            readGlobal: bool = self._readGlobal
+
+            node.argList = [self._expr(a) for a in node.argList]
+
+            # the arguments and the body run before the variables read so far
+            if clean and self._canInline(node) and not (readGlobal and self._canWriteGlobals(node)):
+                self._clean, self._readGlobal = clean, readGlobal
+                return self._inline(node, used)
+
+            self._clean = False
+            return node
+
+        # other operations, their operands are evaluated in this order
+        if typ in ["NotNode", "NegationNode"]:
+            node.node = self._expr(node.node)
+        elif typ == "ArrayNode":
+            node.elements = [self._expr(e) for e in node.elements]
+        elif typ == "ArrayAccessNode":
+            node.base = self._expr(node.base)
+            node.index = self._expr(node.index)
+        else:
+            node.left = self._expr(node.left)
+            node.right = self._expr(node.right)
+
+        self._clean = False
+        return node
+
+
+    # temporaries and locals of a function can't be changed by the functions it calls
+    def _isCallerLocal(self, name: str) -> bool:
+        return name.startswith("$") or (self._callerLocals != None and name in self._callerLocals)
+
+
+    def _writesGlobals(self, fn: str) -> bool:
+        # functions declared in functions are unknown
+        return fn not in self._functions or self._functions[fn].writesGlobals
+
+
+    def _canWriteGlobals(self, call) -> bool:
+        for n in _walk(call):
+            if type(n).__name__ == "FunctionCallNode" and n.nameNode.token.value not in builtinFunctionInfo:
+                if self._writesGlobals(n.nameNode.token.value):
+                    return True
+        return False
+
+
+    def _canInline(self, call) -> bool:
+        info: InlineInfo = self._functions.get(call.nameNode.token.value)
+        if info == None or info.size > self.maxSize:
+            return False
+        if info.recursive or info.hasFunDecl or info.returnInLoop:
+            return False
+
+        # the globals of the function would be shadowed by the locals of the caller
+        return self._callerLocals == None or len(info.globals & self._callerLocals) == 0
+
+
+    #
+    # Adds the body of the called function to self._prefix, returns the
+    #   expression for its result, None if it isn't used
+    #
+    def _inline(self, call, used: bool) -> ASTNode:
+        info: InlineInfo = self._functions[call.nameNode.token.value]
+
+        self._siteCtr += 1
+        result: str = f"${info.name}{self._siteCtr}"
+        self.inlinedSites.append((info.name, self._caller, call.nameNode.token.line))
+
+        renamed: Dict[str, str] = {l: f"{result}_{l}" for l in info.locals}
+        substituted: Dict[str, ASTNode] = dict()
+
+        for p, a in zip(info.params, call.argList):
+            if self._isSubstitutable(p, a, info):
+                substituted[p] = a
+            else:
+                self._prefix.append(VarDeclNode(_ident(renamed[p]), a))
+
+        body: BlockNode = self._rename(copy.deepcopy(info.node.blockNode), renamed, substituted)
+        stmts: List[ASTNode] = body.stmtList
+
+        if info.returnShape == "none":
+            self._prefix += stmts
+            return NilNode(Token(TokenType.NIL, "nil", 0, 0)) if used else None
+
+        if info.returnShape == "last":
+            self._prefix += stmts[:-1]
+            value: ASTNode = stmts[-1].expr
+            if not used:
+                if type(value).__name__ not in _literalNodes | {"IdentifierNode"}:
+                    self._prefix.append(value)
+                return None
+
+            # locals of the inlined function are only changed by its body
+            if type(value).__name__ in _literalNodes or \
+                (type(value).__name__ == "IdentifierNode" and value.token.value.startswith(result + "_")):
+                return value
+            self._prefix.append(VarDeclNode(_ident(result), value))
+            return _ident(result)
+
+        if used:
+            self._prefix.append(VarDeclNode(_ident(result), NilNode(Token(TokenType.NIL, "nil", 0, 0))))
+        body = self._replaceReturns(body, result if used else None)
+        body.stmtList.append(BreakNode(Token(TokenType.BREAK, "break", 0, 0)))
+        self._prefix.append(WhileNode(TrueNode(Token(TokenType.TRUE, "true", 0, 0)), body))
+        return _ident(result) if used else None
+
+
+    # True if the param can be replaced by the argument in the body
+    def _isSubstitutable(self, param: str, arg, info: InlineInfo) -> bool:
+        if param in info.assigned:
+            return False
+        if type(arg).__name__ in _literalNodes:
+            return True
+        if type(arg).__name__ == "IdentifierNode":
+            return self._isCallerLocal(arg.token.value) or \
+                (arg.token.value not in info.assigned and not info.writesGlobals)
+        return False
+
+
+    # rename the locals in a copy of a function body, and replace params by their arguments
+    def _rename(self, node, renamed: Dict[str, str], substituted: Dict[str, ASTNode]) -> ASTNode:
+        if type(node).__name__ == "IdentifierNode":
+            if node.token.value in substituted:
+                return copy.deepcopy(substituted[node.token.value])
+            if node.token.value in renamed:
+                node.token.value = renamed[node.token.value]
+            return node
+
+        for k, v in vars(node).items():
+            if k == "nameNode":
+                continue
+            if isinstance(v, ASTNode):
+                setattr(node, k, self._rename(v, renamed, substituted))
+            elif isinstance(v, list):
+                setattr(node, k, [self._rename(n, renamed, substituted) if isinstance(n, ASTNode) else n for n in v])
+        return node
+
+
+    # every return stores its value in result and leaves the loop around the body
+    def _replaceReturns(self, node, result: str) -> ASTNode:
+        if type(node).__name__ == "ReturnNode":
+            stmts: List[ASTNode] = []
+            if result != None:
+                stmts.append(AssignNode(_ident(result), node.expr))
+            elif type(node.expr).__name__ not in _literalNodes | {"IdentifierNode"}:
+                stmts.append(node.expr)
+            return BlockNode(stmts + [BreakNode(Token(TokenType.BREAK, "break", node.line, 0))])
+
+        for k, v in vars(node).items():
+            if isinstance(v, ASTNode):
+                setattr(node, k, self._replaceReturns(v, result))
+            elif isinstance(v, list):
+                setattr(node, k, [self._replaceReturns(n, result) if isinstance(n, ASTNode) else n for n in v])
+        return node
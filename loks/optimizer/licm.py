@@ -0,0 +1,374 @@
+from typing import List, Set
+
+from ..nodevisitor import NodeVisitor
+from ..parser.ast import ASTNode, BlockNode, VarDeclNode, IdentifierNode
+from ..lexer.token import Token, TokenType
+from ..stdlib import builtinFunctionInfo
+
+
+# builtins without side effects, their result only depends on the argument
+pureBuiltins: Set[str] = {"len", "str", "int", "isinteger"}
+
+_binaryNodes: Set[str] = {
+    "AddNode", "SubNode", "MulNode", "DivNode", "ModNode",
+    "EqualNode", "NotEqualNode", "GreaterThanNode", "LessThanNode",
+    "GreaterThanEqualNode", "LessThanEqualNode", "AndNode", "OrNode",
+}
+
+
+#
+# Loop-invariant code motion, an AST pass run after the ConstantFolder.
+# Expressions in a while loop that compute the same value in every
+#   iteration are evaluated once before the loop into a temporary ($inv0,
+#   $inv1, ..., names no program can use), and the loop reads the temporary.
+# An expression is invariant if no variable it reads is assigned in the
+#   loop, and it only calls builtins without side effects. Arrays never
+#   change their length, so len(arr) is invariant as long as arr is. A call
+#   to a user function in the loop can assign any global, so then only the
+#   locals of the enclosing function count as not assigned.
+# Code in the loop body may never run, so it is only hoisted if it can't
+#   fail, going by the types the SemanticAnalyzer proved. The condition
+#   always runs at least once: invariant code in it is also hoisted if it
+#   could fail, as long as nothing with a side effect or another failure
+#   runs before it, and it is not the right operand of 'and' or 'or'.
+# Inner loops are handled first, the temporaries they add to the body of
+#   the outer loop can then be hoisted further.
+#
+class LoopInvariantHoister(NodeVisitor):
+    def __init__(self) -> None:
+        # number of expressions moved out of loops
+        self.hoistedCount: int = 0
+
+        self._tempCtr: int = -1
+
+        # locals of the function being optimized so far, None in main
+        self._locals: Set[str] = None
+
+        # declarations of the temporaries of the loop being optimized
+        self._hoisted: List[ASTNode] = []
+
+        # state of the loop being optimized
+        self._assigned: Set[str] = set()
+        self._hasCall: bool = False
+
+        # True once code that has a side effect or can fail was passed in the condition
+        self._effects: bool = False
+
+
+    def hoist(self, ast: ASTNode) -> ASTNode:
+        self.visit(ast)
+        return ast
+
+
+    #
+    # Statements. Every loop can be replaced by the declarations of its
+    #   temporaries followed by the loop, so statements are visited through
+    #   _statement, which returns the list of statements replacing one.
+    #
+
+    def visit_ProgramNode(self, node) -> None:
+        node.declarationList = self._statements(node.declarationList)
+
+
+    def visit_BlockNode(self, node) -> None:
+        node.stmtList = self._statements(node.stmtList)
+
+
+    def _statements(self, stmts: List[ASTNode]) -> List[ASTNode]:
+        output: List[ASTNode] = []
+        for s in stmts:
+            output += self._statement(s)
+        return output
+
+
+    # statement in a place that takes a single one, like the body of an if
+    def _single(self, stmt: ASTNode) -> ASTNode:
+        stmts: List[ASTNode] = self._statement(stmt)
+        if len(stmts) == 1:
+            return stmts[0]
+        return BlockNode(stmts)
+
+
+    def _statement(self, node) -> List[ASTNode]:
+        typ: str = type(node).__name__
+
+        if typ in ["ProgramNode", "BlockNode"]:
+            self.visit(node)
+
+        elif typ == "VarDeclNode":
+            if self._locals != None:
+                self._locals.add(node.id.token.value)
+
+        elif typ == "FunDeclNode":
+            outer: Set[str] = self._locals
+            self._locals = set(p.value for p in node.paramList)
+            self.visit(node.blockNode)
+            self._locals = outer
+
+        elif typ == "IfNode":
+            for c in [node.ifBlock] + node.elsifBloks:
+                c.statement = self._single(c.statement)
+            if node.elseBlock != None:
+                node.elseBlock = self._single(node.elseBlock)
+
+        elif typ == "WhileNode":
+            node.statement = self._single(node.statement)
+            return self._hoistLoop(node) + [node]
+
+        return [node]
+
+
+    def _hoistLoop(self, node) -> List[ASTNode]:
+        self._assigned = set()
+        self._hasCall = False
+
+        # a function declared in a loop is not worth the trouble
+        if not self._scanStatement(node.condition) or not self._scanStatement(node.statement):
+            return []
+
+        if self._runsOnce(node):
+            return []
+
+        self._hoisted = []
+
+        self._effects = False
+        node.condition = self._expr(node.condition, False)
+        self._bodyStatement(node.statement)
+
+        self.hoistedCount += len(self._hoisted)
+        return self._hoisted
+
+
+    # loops around inlined functions end with a break, see loks/optimizer/inline.py
+    def _runsOnce(self, node) -> bool:
+        body: ASTNode = node.statement
+        if type(body).__name__ != "BlockNode" or len(body.stmtList) == 0:
+            return False
+        if type(body.stmtList[-1]).__name__ != "BreakNode":
+            return False
+        return not any(type(n).__name__ == "ContinueNode" for n in self._descendants(body))
+
+
+    def _descendants(self, node) -> List[ASTNode]:
+        nodes: List[ASTNode] = [node]
+        for c in self._children(node):
+            nodes += self._descendants(c)
+        return nodes
+
+
+    #
+    # Collects the variables assigned in the loop and if it calls a user
+    #   function. Returns False if the loop declares a function.
+    #
+    def _scanStatement(self, node) -> bool:
+        typ: str = type(node).__name__
+
+        if typ == "FunDeclNode":
+            return False
+
+        if typ == "VarDeclNode":
+            self._assigned.add(node.id.token.value)
+        elif typ == "AssignNode" and type(node.lvalue).__name__ == "IdentifierNode":
+            self._assigned.add(node.lvalue.token.value)
+        elif typ == "FunctionCallNode" and node.nameNode.token.value not in builtinFunctionInfo:
+            self._hasCall = True
+
+        for child in self._children(node):
+            if not self._scanStatement(child):
+                return False
+        return True
+
+
+    # child nodes of any node, calls don't include their name
+    def _children(self, node) -> List[ASTNode]:
+        if type(node).__name__ == "FunctionCallNode":
+            return list(node.argList)
+
+        children: List[ASTNode] = []
+        for v in vars(node).values():
+            if isinstance(v, ASTNode):
+                children.append(v)
+            elif isinstance(v, list):
+                children += [n for n in v if isinstance(n, ASTNode)]
+        return children
+
+
+    #
+    # Hoist the expressions of every statement in the body, all of them
+    #   speculatively since the body may not run
+    #
+    def _bodyStatement(self, node) -> None:
+        typ: str = type(node).__name__
+
+        if typ == "BlockNode":
+            stmts: List[ASTNode] = []
+            for s in node.stmtList:
+                # the temporary of an inner loop moves out of this loop as a whole
+                if self._isTempDecl(s) and self._isInvariant(s.exprNode) and self._isSafe(s.exprNode):
+                    self._hoisted.append(s)
+                    continue
+                self._bodyStatement(s)
+                stmts.append(s)
+            node.stmtList = stmts
+
+        elif typ == "VarDeclNode":
+            if node.exprNode != None:
+                node.exprNode = self._expr(node.exprNode, True)
+
+        elif typ == "AssignNode":
+            node.exprNode = self._expr(node.exprNode, True)
+            if type(node.lvalue).__name__ == "ArrayAccessNode":
+                self._operands(node.lvalue, True)
+
+        elif typ == "IfNode":
+            for c in [node.ifBlock] + node.elsifBloks:
+                c.condition = self._expr(c.condition, True)
+                self._bodyStatement(c.statement)
+            if node.elseBlock != None:
+                self._bodyStatement(node.elseBlock)
+
+        elif typ == "WhileNode":
+            node.condition = self._expr(node.condition, True)
+            self._bodyStatement(node.statement)
+
+        elif typ == "ReturnNode":
+            node.expr = self._expr(node.expr, True)
+
+        elif typ not in ["ContinueNode", "BreakNode"]:
+            # expression statement, its value is thrown away so only parts of it are hoisted
+            self._operands(node, True)
+
+
+    #
+    # Returns the expression replacing node: a temporary if node is hoisted,
+    #   otherwise node with its operands hoisted where possible.
+    #
+    def _expr(self, node, speculative: bool) -> ASTNode:
+        if self._isWorthHoisting(node) and self._isInvariant(node):
+            if self._isSafe(node) or not (speculative or self._effects):
+                return self._newTemp(node)
+
+        self._operands(node, speculative)
+
+        if not speculative and not (self._isSafe(node) and self._isPure(node)):
+            self._effects = True
+        return node
+
+
+    # hoist the operands of node, in the order they are evaluated
+    def _operands(self, node, speculative: bool) -> None:
+        typ: str = type(node).__name__
+
+        if typ in ["AndNode", "OrNode"]:
+            node.left = self._expr(node.left, speculative)
+            # the right operand is only evaluated if the left one doesn't decide
+            node.right = self._expr(node.right, True)
+
+        elif typ in _binaryNodes:
+            node.left = self._expr(node.left, speculative)
+            node.right = self._expr(node.right, speculative)
+
+        elif typ in ["NotNode", "NegationNode"]:
+            node.node = self._expr(node.node, speculative)
+
+        elif typ == "FunctionCallNode":
+            node.argList = [self._expr(a, speculative) for a in node.argList]
+
+        elif typ == "ArrayNode":
+            node.elements = [self._expr(e, speculative) for e in node.elements]
+
+        elif typ == "ArrayAccessNode":
+            node.base = self._expr(node.base, speculative)
+            node.index = self._expr(node.index, speculative)
+
+
+    # evaluate node once before the loop, returns the temporary that holds its value
+    def _newTemp(self, node) -> ASTNode:
+        self._tempCtr += 1
+        name: str = f"$inv{self._tempCtr}"
+
+        self._hoisted.append(VarDeclNode(IdentifierNode(Token(TokenType.ID, name, 0, 0)), node))
+        if self._locals != None:
+            self._locals.add(name)
+
+        temp: IdentifierNode = IdentifierNode(Token(TokenType.ID, name, 0, 0))
+        temp.staticType = node.staticType
+        return temp
+
+
+    def _isTempDecl(self, node) -> bool:
+        return type(node).__name__ == "VarDeclNode" and node.id.token.value.startswith("$inv")
+
+
+    # variables and literals are as cheap to read as a temporary
+    def _isWorthHoisting(self, node) -> bool:
+        return type(node).__name__ not in [
+            "IdentifierNode", "NumberNode", "StringNode", "TrueNode", "FalseNode", "NilNode",
+        ]
+
+
+    def _isInvariant(self, node) -> bool:
+        typ: str = type(node).__name__
+
+        if typ == "IdentifierNode":
+            name: str = node.token.value
+            if name in self._assigned:
+                return False
+            # a user function can assign globals, but not the locals of its caller
+            return not self._hasCall or (self._locals != None and name in self._locals)
+
+        # a new array every iteration, and array elements can be stored to
+        if typ in ["ArrayNode", "ArrayAccessNode"]:
+            return False
+
+        if typ == "FunctionCallNode" and node.nameNode.token.value not in pureBuiltins:
+            return False
+
+        return all(self._isInvariant(c) for c in self._children(node))
+
+
+    # True if evaluating node has no side effect
+    def _isPure(self, node) -> bool:
+        if type(node).__name__ == "FunctionCallNode" and node.nameNode.token.value not in pureBuiltins:
+            return False
+        return all(self._isPure(c) for c in self._children(node))
+
+
+    # True if evaluating node can't fail, going by the proven types of the operands
+    def _isSafe(self, node) -> bool:
+        typ: str = type(node).__name__
+
+        if typ in ["IdentifierNode", "NumberNode", "StringNode", "TrueNode", "FalseNode", "NilNode"]:
+            return True
+
+        if not all(self._isSafe(c) for c in self._children(node)):
+            return False
+
+        if typ in ["EqualNode", "NotEqualNode", "AndNode", "OrNode", "NotNode", "ArrayNode"]:
+            return True
+
+        if typ == "NegationNode":
+            return node.node.staticType == "number"
+
+        if typ == "AddNode" and node.left.staticType == node.right.staticType == "string":
+            return True
+
+        if typ in ["AddNode", "SubNode", "MulNode", "GreaterThanNode", "LessThanNode",
+                   "GreaterThanEqualNode", "LessThanEqualNode"]:
+            return node.left.staticType == node.right.staticType == "number"
+
+        # division and modulo by a literal other than 0
+        if typ in ["DivNode", "ModNode"]:
+            return node.left.staticType == "number" and \
+                type(node.right).__name__ == "NumberNode" and node.right.token.value != 0
+
+        if typ == "FunctionCallNode":
+            name: str = node.nameNode.token.value
+            if name == "str":
+                return True
+            if name == "len":
+                return node.argList[0].staticType in ["array", "string"]
+            if name == "isinteger":
+                return node.argList[0].staticType == "string"
+
+        return False
@@ -0,0 +1,131 @@
+from typing import List, Tuple, Dict
+
+from ..assembler.builder import AsmFunction, AsmProgram
+
+
+#
+# Fusion patterns, picked from the opcode sequences that are executed most
+#   often (see benchmark/opstats.py).
+# A pattern is a list of instructions, each one an opcode name followed by
+#   placeholders for its operands. A placeholder that appears more than once
+#   must match the same operand every time.
+#
+Pattern = Tuple[List[Tuple[str, ...]], Tuple[str, ...]]
+
+patterns: List[Pattern] = [
+    # x = x + k
+    (
+        [("LOAD_LOCAL", "x"), ("BIPUSH", "k"), ("BINARY_ADD",), ("STORE_LOCAL", "x")],
+        ("INC_LOCAL", "x", "k")
+    ),
+    # a + b
+    (
+        [("LOAD_LOCAL", "a"), ("LOAD_LOCAL", "b"), ("BINARY_ADD",)],
+        ("ADD_LOCALS", "a", "b")
+    ),
+]
+
+# the same on typed instructions, see loks/analyzer/typeinference.py
+patterns += [
+    (
+        [("LOAD_LOCAL", "x"), ("BIPUSH", "k"), ("NUM_ADD",), ("STORE_LOCAL", "x")],
+        ("INC_LOCAL", "x", "k")
+    ),
+    (
+        [("LOAD_LOCAL", "a"), ("LOAD_LOCAL", "b"), ("NUM_ADD",)],
+        ("NUM_ADD_LOCALS", "a", "b")
+    ),
+]
+
+# compare and branch, for loop and if conditions
+for c in ["EQ", "NE", "GT", "LT", "GE", "LE"]:
+    patterns.append((
+        [(f"CMP{c}",), ("POP_JMP_IF_FALSE", "l")],
+        (f"JMP_IF_NOT_{c}", "l")
+    ))
+    patterns.append((
+        [(f"NUM_CMP{c}",), ("POP_JMP_IF_FALSE", "l")],
+        (f"NUM_JMP_IF_NOT_{c}", "l")
+    ))
+
+
+#
+# Peephole pass over the code generated by the compiler that replaces common
+#   instruction sequences with a single superinstruction.
+# Labels are instructions of their own, so a sequence is never fused across
+#   a jump target.
+#
+class SuperinstructionFuser:
+    def __init__(self, program: AsmProgram) -> None:
+        self._program: AsmProgram = program
+
+        # body of the function being fused
+        self._body: List[List[str]] = []
+        self._output: List[List[str]] = []
+
+        # number of sequences replaced by a superinstruction
+        self.fusedCount: int = 0
+
+
+    def getProgram(self) -> AsmProgram:
+        functions: List[AsmFunction] = []
+
+        for fn in self._program.functions:
+            self._body = fn.body
+            self._output = []
+
+            i = 0
+            while i < len(self._body):
+                i = self._fuse(i, fn.name == "main")
+
+            functions.append(AsmFunction(fn.name, fn.argc, fn.params, self._output))
+
+        return AsmProgram(self._program.constants, functions)
+
+
+    #
+    # globals are the locals of main, so inside main *_GLOBAL and *_LOCAL
+    #   address the same variable. Use the local form so main matches the
+    #   same patterns as functions.
+    #
+    def _getIns(self, i: int, inMain: bool) -> List[str]:
+        if i >= len(self._body):
+            return []
+
+        ins: List[str] = self._body[i]
+        if inMain and ins[0] in ["LOAD_GLOBAL", "STORE_GLOBAL"]:
+            return [ins[0].replace("GLOBAL", "LOCAL")] + ins[1:]
+        return ins
+
+
+    # try every pattern at instruction i, returns the index of the next unprocessed one
+    def _fuse(self, i: int, inMain: bool) -> int:
+        for pattern, replacement in patterns:
+            bindings: Dict[str, str] = self._match(pattern, i, inMain)
+            if bindings == None:
+                continue
+
+            self._output.append([replacement[0]] + [bindings[p] for p in replacement[1:]])
+            self.fusedCount += 1
+            return i + len(pattern)
+
+        self._output.append(self._body[i])
+        return i + 1
+
+
+    def _match(self, pattern: List[Tuple[str, ...]], i: int, inMain: bool) -> Dict[str, str]:
+        bindings: Dict[str, str] = dict()
+
+        for n, p in enumerate(pattern):
+            ins: List[str] = self._getIns(i + n, inMain)
+
+            # labels and the end of the function end a sequence
+            if len(ins) != len(p) or ins[0] != p[0]:
+                return None
+
+            for placeholder, operand in zip(p[1:], ins[1:]):
+                if bindings.get(placeholder, operand) != operand:
+                    return None
+                bindings[placeholder] = operand
+
+        return bindings
@@ -3,6 +3,10 @@ from typing import List, Union
 
 # base class for all nodes
 class ASTNode:
+    # type every value of an expression is proven to have, set by the
+    #   SemanticAnalyzer, see loks/analyzer/typeinference.py
+    staticType: str = None
+
     def __repr__(self) -> str:
         return self.__str__()
 
@@ -245,26 +249,36 @@ class PrimaryNode(ASTNode):
 
 
 class TrueNode(PrimaryNode):
+    staticType: str = "boolean"
+
     def __init__(self, tok: Token) -> None:
         super().__init__(tok)
 
 
 class FalseNode(PrimaryNode):
+    staticType: str = "boolean"
+
     def __init__(self, tok: Token) -> None:
         super().__init__(tok)
 
 
 class NilNode(PrimaryNode):
+    staticType: str = "nil"
+
     def __init__(self, tok: Token) -> None:
         super().__init__(tok)
 
 
 class NumberNode(PrimaryNode):
+    staticType: str = "number"
+
     def __init__(self, tok: Token) -> None:
         super().__init__(tok)
 
 
 class StringNode(PrimaryNode):
+    staticType: str = "string"
+
     def __init__(self, tok: Token) -> None:
         super().__init__(tok)
 
@@ -275,6 +289,8 @@ class IdentifierNode(PrimaryNode):
 
 
 class ArrayNode(ASTNode):
+    staticType: str = "array"
+
     def __init__(self, l: List[ASTNode]) -> None:
         self.elements: List[ASTNode] = l
 
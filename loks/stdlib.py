@@ -1,4 +1,4 @@
-from .types import Nil, String, Number, Array, Boolean
+from .types import Nil, String, Number, Array, Boolean, NIL, FALSE, makeNumber, makeBoolean, TypeTag
 from .error import TypeErr, ValueErr
 from typing import Union
 
@@ -6,21 +6,21 @@ from typing import Union
 def loks_print(argList: list) -> Nil:
     output: str = str(argList[0])
 
-    if type(argList[0]).__name__ == "String":
+    if argList[0].tag == TypeTag.STRING:
         output = output[1:-1]
 
     print(output, end='')
-    return Nil()
+    return NIL
 
 
 def loks_println(argList: list) -> Nil:
     output: str = str(argList[0])
 
-    if type(argList[0]).__name__ == "String":
+    if argList[0].tag == TypeTag.STRING:
         output = output[1:-1]
 
     print(output)
-    return Nil()
+    return NIL
 
 
 def loks_input(argList: list) -> String:
@@ -30,29 +30,26 @@ def loks_input(argList: list) -> String:
 
 def loks_len(el: list) -> Number:
     e: Union[String, Array] = el[0]
-    if type(e).__name__ == "String":
-        return Number(len(e.value))
+    if e.tag == TypeTag.STRING:
+        return makeNumber(len(e.value))
 
-    if type(e).__name__ == "Array":
-        return Number(len(e._arr))
+    if e.tag == TypeTag.ARRAY:
+        return makeNumber(len(e._arr))
 
     raise TypeErr(f"Invalid argument type for len, '{type(e).__name__}'")
 
 
 def loks_int(el: list) -> Number:
     s = el[0].value
-    if type(el[0]).__name__ == "Boolean":
-        if s == "true":
-            s = 1
-        if s == "false":
-            s = 0
+    if el[0].tag == TypeTag.BOOLEAN:
+        s = 1 if s else 0
 
     try:
         int(s)
     except:
         raise ValueErr(f"Invalid literal for conversion to int, '{s}'")
     
-    return Number(int(s))
+    return makeNumber(int(s))
 
 
 def loks_str(el: list) -> String:
@@ -60,24 +57,18 @@ def loks_str(el: list) -> String:
 
 
 def loks_isinteger(el: list) -> Boolean:
-    if type(el[0]).__name__ != "String":
+    if el[0].tag != TypeTag.STRING:
         raise TypeErr("Argument for 'isinteger' must be of type String")
 
-    def getBoolObj(b) -> Boolean:
-        if b:
-            return Boolean("true")
-        else:
-            return Boolean("false")
-
     s = el[0].value
 
     if len(s) == 0:
-        return Boolean("false")
+        return FALSE
     
     if s[0] in ('-', '+'):
-        return getBoolObj(s[1:].isdigit())
+        return makeBoolean(s[1:].isdigit())
 
-    return getBoolObj(s.isdigit())
+    return makeBoolean(s.isdigit())
 
 
 builtinFunctionTable = {
@@ -110,3 +101,14 @@ builtinFunctionIndex = {
     5: "str",
     6: "isinteger"
 }
+
+# type of the value every builtin returns, used by the static type inference
+builtinReturnTypes = {
+    "print" : "nil",
+    "println" : "nil",
+    "input" : "string",
+    "len" : "number",
+    "int" : "number",
+    "str" : "string",
+    "isinteger" : "boolean"
+}
@@ -1,10 +1,30 @@
 from typing import Union, List
 
+
+#
+# Type tag of every value class. The runtimes check types by comparing tags,
+#   the class names are only used in error messages.
+#
+class TypeTag:
+    NUMBER = 0x1
+    STRING = 0x2
+    NIL = 0x3
+    BOOLEAN = 0x4
+    ARRAY = 0x5
+    FUNCTION = 0x6
+
+
 class LObject:
+    __slots__ = ()
+    tag: int = 0
+
     def __repr__(self) -> str:
         return self.__str__()
 
 class Number(LObject):
+    __slots__ = ("value",)
+    tag: int = TypeTag.NUMBER
+
     def __init__(self, val: Union[int, float])-> None:
         self.value = val
 
@@ -12,6 +32,9 @@ class Number(LObject):
         return f"{self.value}"
 
 class Nil(LObject):
+    __slots__ = ("value",)
+    tag: int = TypeTag.NIL
+
     def __init__(self)-> None:
         self.value = "nil"
 
@@ -19,13 +42,19 @@ class Nil(LObject):
         return "nil"
 
 class Boolean(LObject):
-    def __init__(self, val: str)-> None:
+    __slots__ = ("value",)
+    tag: int = TypeTag.BOOLEAN
+
+    def __init__(self, val: bool)-> None:
         self.value = val
 
     def __str__(self) -> str:
-        return f"{self.value}"
+        return "true" if self.value else "false"
 
 class String(LObject):
+    __slots__ = ("value",)
+    tag: int = TypeTag.STRING
+
     def __init__(self, val: str)-> None:
         self.value = val
 
@@ -33,6 +62,9 @@ class String(LObject):
         return f'"{self.value}"'
 
 class Array(LObject):
+    __slots__ = ("_arr",)
+    tag: int = TypeTag.ARRAY
+
     def __init__(self)-> None:
         self._arr: List[LObject] = []
 
@@ -61,6 +93,9 @@ class Array(LObject):
 
 
 class Function(LObject):
+    __slots__ = ("name", "args", "block")
+    tag: int = TypeTag.FUNCTION
+
     def __init__(self, n: str, args: list, b)-> None:
         self.name = n
         self.args = args
@@ -75,3 +110,65 @@ class Function(LObject):
         output = output[:-2] + '>'
         return output
 
+
+
+#
+# Values are never modified after they are created, so the common ones are
+#   shared. Runtime code (VMs, interpreter and stdlib) creates Nil, Boolean
+#   and Number objects through the factory functions below instead of
+#   calling the constructors.
+#
+NIL: Nil = Nil()
+TRUE: Boolean = Boolean(True)
+FALSE: Boolean = Boolean(False)
+
+# range of the preallocated integers
+SMALL_INT_MIN: int = -5
+SMALL_INT_MAX: int = 1023
+
+_smallInts: List[Number] = [Number(i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+def makeNil() -> Nil:
+    return NIL
+
+
+def makeBoolean(b: bool) -> Boolean:
+    return TRUE if b else FALSE
+
+
+def makeNumber(val: Union[int, float]) -> Number:
+    # floats are never cached, 1.0 has to stay a float
+    if type(val) is int and SMALL_INT_MIN <= val <= SMALL_INT_MAX:
+        return _smallInts[val - SMALL_INT_MIN]
+    return Number(val)
+
+
+#
+# Truthiness of a value: false, nil, 0, empty strings and empty arrays are
+#   false, everything else is true.
+#
+def isTruthy(obj: LObject) -> bool:
+    tag: int = obj.tag
+
+    if tag == TypeTag.BOOLEAN:
+        return obj.value
+    elif tag == TypeTag.NUMBER:
+        return obj.value != 0
+    elif tag == TypeTag.NIL:
+        return False
+    elif tag == TypeTag.STRING:
+        return len(obj.value) != 0
+    elif tag == TypeTag.ARRAY:
+        return len(obj._arr) != 0
+
+    return True
+
+
+# '==' for values, values of different types are never equal
+def valuesEqual(l: LObject, r: LObject) -> bool:
+    if l.tag != r.tag:
+        return False
+    if l.tag == TypeTag.ARRAY:
+        return l is r
+    return l.value == r.value
@@ -0,0 +1,111 @@
+#
+# Programs that once ran differently on one of the engines. Each one is run
+#   through loks-interpreter.py with the options of every engine it applies
+#   to, and has to print the expected output.
+#
+# usage: python -m pytest tests
+#
+import os
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# stack VM, stack VM with the JIT, register VM
+COMPILED: List[str] = ["", "-j", "-r"]
+
+
+def run(program: str, option: str, tmp_path) -> str:
+    path = tmp_path / "program.lks"
+    path.write_text(program)
+
+    args: List[str] = [sys.executable, os.path.join(ROOT, "loks-interpreter.py")]
+    if option != "":
+        args.append(option)
+    args.append(str(path))
+
+    # -d waits for Enter once the program finished
+    result = subprocess.run(args, input="\n", capture_output=True, text=True, cwd=ROOT, timeout=60)
+    return result.stdout
+
+
+# return in main is ignored by the VMs, execution continues after it
+RETURN_IN_MAIN_BLOCKS: str = """\
+println("a");
+if (true) { return 0; }
+for (var i = 0; i < 2; i = i + 1) println(i);
+println("b");
+"""
+
+@pytest.mark.parametrize("option", COMPILED)
+def test_returnInMainKeepsBlocksAfterIt(option, tmp_path):
+    assert run(RETURN_IN_MAIN_BLOCKS, option, tmp_path) == "a\n0\n1\nb\n"
+
+
+# the types of main are still those of the code before a return in main
+RETURN_IN_MAIN_TYPES: str = """\
+var x = 1;
+if (len("a") == 1) { x = "s"; return 0; }
+println(x);
+println(x + 1);
+"""
+
+@pytest.mark.parametrize("option", COMPILED)
+def test_returnInMainKeepsTypes(option, tmp_path):
+    assert run(RETURN_IN_MAIN_TYPES, option, tmp_path) == "s\nType Error: Cannot add Number to String\n"
+
+
+# names are resolved through the callers, a tail call can't skip the locals
+#   of the function making it
+TAIL_CALL_LOOKUP: str = """\
+var x = 1;
+fun g() { return x; }
+fun h() { var x = 99; return g(); }
+println(h());
+"""
+
+@pytest.mark.parametrize("option", ["-d", "-c"])
+def test_tailCallKeepsCallerNames(option, tmp_path):
+    assert run(TAIL_CALL_LOOKUP, option, tmp_path).startswith("99\n")
+
+
+NESTED_ARRAY_STORE: str = """\
+var a = [[1, 2], [3, 4]];
+a[1][1] = 9;
+println(a[1][1]);
+"""
+
+@pytest.mark.parametrize("option", COMPILED + ["-c"])
+def test_nestedArrayStore(option, tmp_path):
+    assert run(NESTED_ARRAY_STORE, option, tmp_path) == "9\n"
+
+
+# too deep for the python stack, the closures report it like -d
+DEEP_RECURSION: str = """\
+fun f(n) { if (n == 0) return 0; return 1 + f(n - 1); }
+println(f(100000));
+"""
+
+def test_deepRecursionCrashMessage(tmp_path):
+    assert run(DEEP_RECURSION, "-c", tmp_path).startswith("The interpreter crashed!")
+
+
+# variables declared in a loop keep their value when the condition is checked
+LOOP_VAR_IN_MAIN: str = """\
+var i = 0; while (i < 3) { var w = i * 2; i = i + 1; } println(w);
+"""
+
+LOOP_VAR_IN_FUNCTION: str = """\
+fun f(n) { var k = 0; var t = 0; while (k < n) { t = t + k; var u = t * 3; k = k + 1; } return u; } println(f(5));
+"""
+
+@pytest.mark.parametrize("option", COMPILED)
+def test_loopVarInMain(option, tmp_path):
+    assert run(LOOP_VAR_IN_MAIN, option, tmp_path) == "4\n"
+
+@pytest.mark.parametrize("option", COMPILED)
+def test_loopVarInFunction(option, tmp_path):
+    assert run(LOOP_VAR_IN_FUNCTION, option, tmp_path) == "30\n"